@@ -22,6 +22,22 @@ def update_sys_path():
     dirpath = os.path.abspath(os.path.dirname(__file__))
     sys.path.insert(0, dirpath)
 
+def run_suite(problem_dir, lang='python', **options):
+    """
+    Tests solution of the problem and returns ``SuiteResult`` (see
+    ``porunga.runner``).
+    """
+    from porunga.runner import run_suite
+    return run_suite(problem_dir, lang, **options)
+
+def run_suite_async(problem_dir, lang='python', limit=None, **options):
+    """
+    Returns coroutine testing solution of the problem on the current event
+    loop (see ``porunga.runner``).
+    """
+    from porunga.runner import run_suite_async
+    return run_suite_async(problem_dir, lang, limit, **options)
+
 def get_manager():
     update_sys_path()
     from monolith.cli import ExecutionManager
@@ -32,6 +48,14 @@ def get_manager():
         def get_commands_to_register(self):
             registry = {
                 'test': 'porunga.commands.test.PorungaTestCommand',
+                'bench': 'porunga.commands.bench.PorungaBenchCommand',
+                'complexity': 'porunga.commands.complexity.'
+                    'PorungaComplexityCommand',
+                'stress': 'porunga.commands.stress.PorungaStressCommand',
+                'compare': 'porunga.commands.compare.PorungaCompareCommand',
+                'batch': 'porunga.commands.batch.PorungaBatchCommand',
+                'calibrate': 'porunga.commands.calibrate.'
+                    'PorungaCalibrateCommand',
             }
             commands = dict((name, import_class(path)) for name, path in
                 registry.items())
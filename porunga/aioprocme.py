@@ -0,0 +1,181 @@
+"""
+Commands driven by an ``asyncio`` event loop.
+
+``AsyncCommand`` behaves like ``procme.Command`` (same limits, resource usage
+and killing of the whole process group), but its output is read by
+coroutines, so a single event loop can run hundreds of commands at once
+without a thread per process.
+
+Pipes and exit of the process are watched directly (exit with a pidfd, where
+available) rather than through ``asyncio`` subprocess transports, because
+those reap the process themselves and its resource usage would be lost.
+"""
+import asyncio
+import os
+from porunga.procme import CHUNK_SIZE
+from porunga.procme import Command
+from porunga.procme import STDERR_LIMIT
+from porunga.procme import TimeoutExceeded
+from porunga.procme import monotonic
+from porunga.procme import open_pidfd
+
+
+class AsyncCommand(Command):
+
+    async def iter_raw_output_async(self, chunk_size=CHUNK_SIZE):
+        """
+        Asynchronous iterator of chunked output (as bytes), as soon as
+        command writes it. If iterator is closed (``aclose``) before command
+        finishes, command is killed.
+        """
+        loop = asyncio.get_running_loop()
+        self.start()
+        deadline = None
+        if self.timeout:
+            deadline = self.started + self.timeout
+        ready = asyncio.Queue()
+        watched = {}
+
+        def notify(fd):
+            # readiness is reported once, fd is watched again once handled
+            unwatch(fd)
+            ready.put_nowait(fd)
+
+        def watch(fd, writer=False):
+            watched[fd] = writer
+            if writer:
+                loop.add_writer(fd, notify, fd)
+            else:
+                loop.add_reader(fd, notify, fd)
+
+        def unwatch(fd):
+            if watched.pop(fd):
+                loop.remove_writer(fd)
+            else:
+                loop.remove_reader(fd)
+
+        fd = self.process.stdout.fileno()
+        os.set_blocking(fd, False)
+        watch(fd)
+        errfd = None
+        if self.process.stderr is not None:
+            errfd = self.process.stderr.fileno()
+            os.set_blocking(errfd, False)
+            watch(errfd)
+        infd = None
+        if self.process.stdin is not None:
+            infd = self.process.stdin.fileno()
+            os.set_blocking(infd, False)
+            watch(infd, writer=True)
+            if hasattr(self.input, 'read'):
+                source = self.input
+                pending = memoryview(b'')
+            else:
+                source = None
+                pending = memoryview(self.input)
+        pidfd = open_pidfd(self.process.pid)
+        if pidfd is not None:
+            watch(pidfd)
+        stdout_open = True
+        try:
+            while stdout_open or (pidfd is not None and
+                    self.returncode is None):
+                if deadline is not None and deadline <= monotonic():
+                    raise TimeoutExceeded
+                try:
+                    key = await asyncio.wait_for(ready.get(),
+                        self.get_wait_timeout(deadline))
+                except asyncio.TimeoutError:
+                    self.sample_memory()
+                    continue
+                self.sample_memory()
+                if key == pidfd:
+                    self.reap()
+                    continue
+                if key == infd:
+                    if not pending and source is not None:
+                        pending = memoryview(source.read(chunk_size))
+                        if not pending:
+                            source = None
+                    try:
+                        written = os.write(infd, pending[:chunk_size])
+                    except (BrokenPipeError, BlockingIOError) as err:
+                        written = 0
+                        if isinstance(err, BrokenPipeError):
+                            pending = pending[:0]
+                            source = None
+                    pending = pending[written:]
+                    if not pending and source is None:
+                        self.process.stdin.close()
+                    else:
+                        watch(infd, writer=True)
+                    continue
+                try:
+                    chunk = os.read(key, chunk_size)
+                except BlockingIOError:
+                    watch(key)
+                    continue
+                if not chunk:
+                    if key == fd:
+                        stdout_open = False
+                    continue
+                watch(key)
+                if key == errfd:
+                    missing = STDERR_LIMIT - len(self.error_output)
+                    self.error_output += chunk[:max(missing, 0)]
+                    continue
+                if self.stream is not None:
+                    self.stream.write(chunk)
+                yield chunk
+            await self.wait_async(deadline)
+            self.check_cpu_timeout()
+        except TimeoutExceeded:
+            self.timeouted = True
+            raise
+        finally:
+            for each in list(watched):
+                unwatch(each)
+            if pidfd is not None:
+                os.close(pidfd)
+            self.process.stdout.close()
+            stdin = self.process.stdin
+            if stdin is not None and not stdin.closed:
+                stdin.close()
+            if self.process.stderr is not None:
+                self.process.stderr.close()
+            if self.returncode is None or self.timeouted:
+                # group may still have members even if its leader has exited
+                self.kill()
+            if self.returncode is None:
+                self.reap()
+
+    async def wait_async(self, deadline=None):
+        """
+        Waits for the process to finish (without blocking the event loop)
+        and returns its return code. If ``deadline`` passes in the meantime,
+        ``TimeoutExceeded`` is raised.
+        """
+        if self.returncode is not None:
+            return self.returncode
+        pause = 0.001
+        while not self.reap(os.WNOHANG):
+            self.sample_memory()
+            if deadline is not None:
+                remaining = deadline - monotonic()
+                if remaining <= 0:
+                    raise TimeoutExceeded
+                pause = min(pause, remaining)
+            await asyncio.sleep(pause)
+            pause = min(pause * 2, 0.05)
+        return self.returncode
+
+    async def run_async(self):
+        output = []
+        chunks = self.iter_raw_output_async()
+        try:
+            async for chunk in chunks:
+                output.append(chunk)
+        finally:
+            await chunks.aclose()
+            self.chunks.append(b''.join(output).decode('utf-8', 'replace'))
+        return self.returncode
@@ -0,0 +1,187 @@
+"""
+Calibration of host's speed, so time limits are portable across hosts.
+
+Problems may declare time limit measured on the *reference machine*
+(``time_limit`` in ``porunga.cfg``). It is scaled to the host porunga runs on
+using two measurements:
+
+* speed of CPU bound code - best time of a fixed loop, compared with its time
+  on the reference machine,
+* startup cost of the language - best wall time of running an empty program.
+
+Startup cost is not scaled, it is replaced: the limit is split into startup of
+the reference machine and the rest, which is scaled by relative CPU speed.
+
+Measurements take a while, so they are cached (in the porunga's cache
+directory) until ``porunga calibrate`` is run again: speed of CPU per host and
+startup cost per host, language and version of its interpreter or compiler.
+"""
+import json
+import os
+import platform
+import subprocess
+import time
+from porunga.pinning import time_calibration_loop
+from porunga.procme import monotonic
+from porunga.utils.hashing import text_digest
+from porunga.utils.paths import get_cache_dir
+
+
+CALIBRATION_FILENAME = 'calibration.json'
+
+CPU_LOOPS = 1000000
+CPU_SAMPLES = 5
+STARTUP_SAMPLES = 10
+
+# timings of the reference machine (in seconds)
+REFERENCE_CPU_TIME = 0.06
+REFERENCE_STARTUP = {
+    'python': 0.02,
+    'ruby': 0.05,
+    'java': 0.08,
+    'objc': 0.002,
+    'c': 0.001,
+    'cpp': 0.002,
+}
+
+# empty programs used to measure startup cost ({simplename} is the name of
+# java class)
+EMPTY_PROGRAMS = {
+    'python': '',
+    'ruby': '',
+    'java': 'public class {simplename} {{\n'
+            '    public static void main(String[] args) {{ }}\n'
+            '}}\n',
+    'objc': 'int main(void) {{ return 0; }}\n',
+    'c': 'int main(void) {{ return 0; }}\n',
+    'cpp': 'int main() {{ return 0; }}\n',
+}
+
+
+def get_host():
+    return platform.node() or 'localhost'
+
+
+def measure_cpu(samples=CPU_SAMPLES):
+    """
+    Returns best time of the calibration loop.
+    """
+    return min(time_calibration_loop(CPU_LOOPS) for sample in range(samples))
+
+
+def measure_startup(argv, samples=STARTUP_SAMPLES):
+    """
+    Returns best wall time of running (empty) program given by ``argv``.
+    Raises ``OSError`` if it could not be run or failed.
+    """
+    timings = []
+    with open(os.devnull, 'r+b') as devnull:
+        for sample in range(samples):
+            started = monotonic()
+            returncode = subprocess.call(argv, stdin=devnull, stdout=devnull,
+                stderr=devnull)
+            timings.append(monotonic() - started)
+            if returncode != 0:
+                raise OSError('%s exited with status %s' % (argv[0],
+                    returncode))
+    return min(timings)
+
+
+class Calibration(object):
+    """
+    Speed of the host for given language (``version`` of its interpreter or
+    compiler).
+    """
+
+    def __init__(self, lang, cpu, startup, measured=None, version=''):
+        self.lang = lang
+        self.cpu = cpu
+        self.startup = startup
+        self.measured = measured
+        self.version = version
+
+    @property
+    def cpu_factor(self):
+        """
+        How many times CPU bound code is slower than on the reference machine.
+        """
+        return self.cpu / REFERENCE_CPU_TIME
+
+    def scale(self, limit):
+        """
+        Returns time limit on this host equivalent to ``limit`` on the
+        reference machine.
+        """
+        reference_startup = REFERENCE_STARTUP.get(self.lang, 0.0)
+        return (max(limit - reference_startup, 0.0) * self.cpu_factor +
+            self.startup)
+
+
+
+class CalibrationCache(object):
+    """
+    Calibrations stored in a JSON file. Speed of CPU is keyed by host only,
+    startup cost by host, language and version of its interpreter or compiler.
+    """
+
+    def __init__(self, path=None):
+        self.path = path or get_cache_dir(CALIBRATION_FILENAME)
+
+    def load(self):
+        try:
+            with open(self.path) as afile:
+                data = json.load(afile)
+        except (IOError, OSError, ValueError):
+            return {}
+        return data if isinstance(data, dict) else {}
+
+    def get_cpu_key(self, host=None):
+        return '%s/cpu' % (host or get_host())
+
+    def get_key(self, lang, version='', host=None):
+        return '%s/%s/%s' % (host or get_host(), lang,
+            text_digest(version)[:12])
+
+    def get_cpu(self, host=None):
+        """
+        Returns cached speed of CPU (time of the calibration loop) or
+        ``None`` if there is none.
+        """
+        try:
+            return self.load()[self.get_cpu_key(host)]['cpu']
+        except (KeyError, TypeError):
+            return None
+
+    def get(self, lang, version='', host=None):
+        """
+        Returns cached ``Calibration`` or ``None`` if there is none (or only
+        one of its measurements is cached).
+        """
+        data = self.load()
+        try:
+            cpu = data[self.get_cpu_key(host)]
+            startup = data[self.get_key(lang, version, host)]
+            return Calibration(lang, cpu['cpu'], startup['startup'],
+                startup.get('measured'), version)
+        except (KeyError, TypeError):
+            return None
+
+    def store(self, calibration, host=None):
+        """
+        Stores ``calibration`` (write is atomic, so concurrently run
+        porunga never reads half of the file).
+        """
+        data = self.load()
+        calibration.measured = calibration.measured or time.time()
+        data[self.get_cpu_key(host)] = {'cpu': calibration.cpu,
+            'measured': calibration.measured}
+        data[self.get_key(calibration.lang, calibration.version, host)] = {
+            'startup': calibration.startup, 'version': calibration.version,
+            'measured': calibration.measured}
+        directory = os.path.dirname(self.path)
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        temp = '%s.%s.tmp' % (self.path, os.getpid())
+        with open(temp, 'w') as afile:
+            json.dump(data, afile, indent=2, sort_keys=True)
+        os.rename(temp, self.path)
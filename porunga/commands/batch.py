@@ -0,0 +1,300 @@
+from __future__ import print_function
+
+import collections
+import glob
+import os
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from porunga import pinning
+from porunga import procme
+from porunga.commands.test import PorungaTestCommand
+from porunga.config import ConfigError
+from porunga.discovery import natural_key
+from porunga.engine import LANGUAGES
+from porunga.engine import WINDOW_FACTOR
+from porunga.engine import cpu_count
+from porunga.engine import format_size
+from subprocess import Popen, PIPE
+from monolith.cli import arg
+
+
+BUILD = 'build'
+TEST = 'test'
+
+class BuildError(Exception):
+    pass
+
+
+class ProblemResult(object):
+    """
+    Outcome of a single problem: ``error`` is set if it could not be
+    tested at all, otherwise ``results`` of its tests are collected.
+    """
+
+    def __init__(self, dirname):
+        self.dirname = dirname
+        self.error = None
+        self.pending = 0
+        self.results = []
+
+    @property
+    def fails(self):
+        return sum(1 for info in self.results if not info['success'])
+
+    @property
+    def time(self):
+        return sum(info['time'] for info in self.results)
+
+    @property
+    def max_time(self):
+        return max([info['time'] for info in self.results] or [0.0])
+
+    @property
+    def maxrss(self):
+        return max([info['maxrss'] for info in self.results] or [0])
+
+    @property
+    def status(self):
+        if self.error:
+            return self.error
+        if not self.results:
+            return 'no tests'
+        if self.fails:
+            return '%s failed' % self.fails
+        return 'ok'
+
+
+class PorungaBatchCommand(PorungaTestCommand):
+    """
+    Tests many problems at once. Solutions are compiled (and their test data
+    discovered) concurrently on a bounded pool and test cases of all problems
+    are fed into one shared pool of workers as soon as their problem is
+    built, so the machine is kept busy until the very last test. Only a few
+    builds and test cases per worker are submitted at a time, so thousands
+    of problems are scheduled in linear time.
+    """
+
+    args = PorungaTestCommand.common_args + [
+        arg('-j', '--jobs', type=int, default=None,
+            help='Number of test cases run concurrently (default: number '
+                 'of CPUs)'),
+        arg('--compile-jobs', type=int, default=None,
+            help='Number of solutions compiled concurrently (default: '
+                 'number of CPUs)'),
+        arg('--pin', default=False, action=pinning.PinAction,
+            help='Pin each test to its own CPU (one CPU is left for porunga '
+                 'itself), report noise of timings and re-run timed out '
+                 'tests to confirm the timeout'),
+        arg('--nice', type=int, default=None, metavar='N',
+            help='Add N to niceness of tests'),
+        arg('--no-history', default=False, action='store_true',
+            help='Do not record timings in problems\' histories'),
+        arg('--tag', type=str, default=None,
+            help='Name under which runs are recorded in the histories'),
+    ]
+
+    # set in builder threads while they build a problem
+    building = threading.local()
+
+    def get_label_arg(self):
+        return arg('problems', nargs='+', metavar='PROBLEM',
+            help='Problem directories or glob patterns matching them')
+
+    def handle(self, namespace):
+        self.handle_label(namespace.problems, namespace)
+
+    def handle_label(self, label, namespace):
+        self.namespace = namespace
+        if namespace.lang not in LANGUAGES:
+            self.exit("Wrong language specified")
+        if namespace.case:
+            self.exit("--case can not be used with batch")
+        if namespace.fork_server:
+            self.exit("--fork-server can not be used with batch")
+        dirnames = self.get_problems(label)
+        if not dirnames:
+            self.exit("No problem directories found")
+
+        title = 'Testing %s problems' % len(dirnames)
+        subtitle = '=' * len(title)
+        self.success_continuation(title)
+        self.success_continuation(subtitle)
+        print()
+
+        self.start_pinning()
+        try:
+            calibration = self.calibrate()
+            started = procme.monotonic()
+            problems = self.run_batch(dirnames)
+            wall = procme.monotonic() - started
+            calibration += self.calibrate()
+            self.report(problems, wall)
+            self.report_noise(calibration)
+        finally:
+            self.stop_pinning()
+
+    def get_problems(self, patterns):
+        """
+        Returns problem directories given directly or matched by glob
+        patterns, without duplicates and in natural order.
+        """
+        dirnames = set()
+        for pattern in patterns:
+            paths = glob.glob(pattern) if glob.has_magic(pattern) else [pattern]
+            dirnames.update(os.path.normpath(path) for path in paths
+                            if os.path.isdir(path))
+        return sorted(dirnames, key=natural_key)
+
+    def get_compile_jobs(self):
+        jobs = self.namespace.compile_jobs or cpu_count()
+        return max(jobs, 1)
+
+    def exit(self, message, code=1):
+        # an error found while a problem is built fails only that problem
+        if getattr(self.building, 'active', False):
+            raise BuildError(message)
+        super(PorungaBatchCommand, self).exit(message, code)
+
+    def compile(self, program):
+        proc = Popen([program], stdout=PIPE, stderr=PIPE, shell=True)
+        out, err = proc.communicate()
+        if proc.returncode != 0:
+            lines = err.decode('utf-8', 'replace').strip().splitlines()
+            raise BuildError('compilation error' +
+                (': %s' % lines[0] if lines else ''))
+
+    def build(self, dirname):
+        """
+        Compiles solution of the problem and discovers its test cases.
+        Returns ``(binary, cases)``, where cases are ordered longest first if
+        their timings are known. Raises ``BuildError`` if the problem can not
+        be tested.
+        """
+        lang = self.namespace.lang
+        if not os.path.isfile(self.get_source(dirname, lang)):
+            raise BuildError('no solution')
+        self.building.active = True
+        try:
+            # host is calibrated here (once) if the limit is relative
+            self.get_timeout(dirname)
+            self.get_binary(dirname, lang)
+            binary = self.get_binary_argv(dirname, lang)
+            cases = list(self.schedule_cases(dirname,
+                self.get_test_cases(dirname)))
+        except ConfigError as err:
+            raise BuildError(str(err))
+        finally:
+            self.building.active = False
+        return binary, cases
+
+    def run_batch(self, dirnames):
+        """
+        Builds and tests all problems and returns list of
+        ``ProblemResult``, in order of ``dirnames``.
+        """
+        problems = [ProblemResult(dirname) for dirname in dirnames]
+        unbuilt = collections.deque(problems)
+        cases = collections.deque()
+        finished = queue.Queue()
+        build_window = self.get_compile_jobs() * WINDOW_FACTOR
+        test_window = self.get_jobs() * WINDOW_FACTOR
+        builders = ThreadPoolExecutor(max_workers=self.get_compile_jobs(),
+            thread_name_prefix='compiler')
+        workers = ThreadPoolExecutor(max_workers=self.get_jobs(),
+            thread_name_prefix='worker')
+
+        def submit(pool, kind, problem, function, *args):
+            future = pool.submit(function, *args)
+            future.add_done_callback(lambda future: finished.put((kind,
+                problem, future)))
+
+        builds = tests = 0
+        try:
+            while True:
+                while unbuilt and builds < build_window:
+                    problem = unbuilt.popleft()
+                    submit(builders, BUILD, problem, self.build,
+                        problem.dirname)
+                    builds += 1
+                while cases and tests < test_window:
+                    problem, binary, fin, fout = cases.popleft()
+                    submit(workers, TEST, problem, self.run_test,
+                        problem.dirname, binary, fin, fout)
+                    tests += 1
+                if not builds and not tests:
+                    break
+                kind, problem, future = finished.get()
+                if kind == BUILD:
+                    builds -= 1
+                    cases.extend(self.get_built_cases(problem, future))
+                else:
+                    tests -= 1
+                    problem.pending -= 1
+                    problem.results.append(future.result())
+                if problem.pending == 0:
+                    self.finish_problem(problem)
+        finally:
+            builders.shutdown()
+            workers.shutdown()
+        return problems
+
+    def get_built_cases(self, problem, build):
+        """
+        Returns test cases of a built problem as ``(problem, binary, fin,
+        fout)`` tuples (none if it could not be built).
+        """
+        try:
+            binary, cases = build.result()
+        except (BuildError, IOError, OSError) as err:
+            problem.error = str(err)
+            return []
+        problem.pending = len(cases)
+        return [(problem, binary, fin, fout) for fin, fout in cases]
+
+    def finish_problem(self, problem):
+        if problem.error is None and problem.results:
+            # tests finish in any order
+            problem.results.sort(key=lambda info: natural_key(info['fin']))
+            if not self.namespace.no_history:
+                self.record_history(problem.dirname, problem.results)
+        if problem.error or problem.fails:
+            self.error("%s: %s" % (problem.dirname, problem.status))
+            if self.namespace.verbose:
+                for info in problem.results:
+                    if not info['success']:
+                        self.error_continuation('    %s: %s' % (info['fin'],
+                            info['verdict']))
+        else:
+            self.info("%s: %s (%s tests, %.3fs)" % (problem.dirname,
+                problem.status, len(problem.results), problem.time))
+
+    def report(self, problems, wall):
+        width = max(len('problem'), max(len(problem.dirname)
+            for problem in problems))
+        print()
+        self.info_continuation('%-*s  %6s  %6s  %9s  %9s  %9s  %s' % (width,
+            'problem', 'tests', 'failed', 'time', 'max', 'peak mem',
+            'status'))
+        for problem in problems:
+            row = '%-*s  %6s  %6s  %8.3fs  %8.3fs  %9s  %s' % (width,
+                problem.dirname, len(problem.results), problem.fails,
+                problem.time, problem.max_time, format_size(problem.maxrss),
+                problem.status)
+            if problem.status == 'ok':
+                self.info_continuation(row)
+            else:
+                self.error_continuation(row)
+
+        tests = sum(len(problem.results) for problem in problems)
+        fails = sum(problem.fails for problem in problems)
+        time = sum(problem.time for problem in problems)
+        passed = sum(1 for problem in problems if problem.status == 'ok')
+        print()
+        self.info("Total: %s tests in %.3fs (wall %.3fs)" % (tests, time,
+            wall))
+        if passed == len(problems):
+            self.success('All %s problems passed' % passed)
+        else:
+            self.error('%s out of %s problems failed (%s failed tests)' % (
+                len(problems) - passed, len(problems), fails))
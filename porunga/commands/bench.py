@@ -0,0 +1,103 @@
+from __future__ import print_function
+
+import io
+from porunga import containers
+from porunga.commands.test import PorungaTestCommand
+from porunga.engine import curdir
+from porunga.utils.paths import abspath
+from porunga.utils.stats import summarize
+from monolith.cli import arg
+
+
+class PorungaBenchCommand(PorungaTestCommand):
+    """
+    Runs each test case many times (one after another, so runs do not
+    disturb each other) and reports statistics of measured times. Inputs and
+    expected outputs are loaded into memory before anything is timed.
+    """
+
+    args = PorungaTestCommand.common_args + [
+        arg('-w', '--warmup', type=int, default=1,
+            help='Number of untimed runs of each test case (default: 1)'),
+        arg('-r', '--repeat', type=int, default=10,
+            help='Number of timed runs of each test case (default: 10)'),
+    ]
+
+    def handle_label(self, label, namespace):
+        self.namespace = namespace
+        dirname = label or abspath(curdir())
+        self.set_problem(dirname)
+        if namespace.repeat < 1:
+            self.exit("At least one timed run is required")
+
+        title = 'Benchmarking %s' % dirname
+        subtitle = '=' * len(title)
+        self.success_continuation(title)
+        self.success_continuation(subtitle)
+        print()
+
+        binary = self.get_binary(dirname, namespace.lang)
+        self.info("Binary: %s" % binary)
+        self.info("Runs: %d warm-up, %d timed (%s time)" % (namespace.warmup,
+            namespace.repeat, 'cpu' if namespace.cpu_time else 'wall'))
+        print()
+        binary = self.get_binary_argv(dirname, namespace.lang)
+        if namespace.fork_server:
+            self.start_fork_server(dirname, binary)
+        try:
+            self.run_benchmarks(dirname, binary)
+        finally:
+            self.stop_fork_server()
+
+    def run_benchmarks(self, dirname, binary):
+        namespace = self.namespace
+        cases = [(fin, self.preload(fin), self.preload(fout))
+                 for fin, fout in self.get_test_cases(dirname)]
+        suite = [0.0] * namespace.repeat
+        fails = 0
+        for fin, data, expected in cases:
+            self.info("Benchmarking %s ... " % fin, newline=False)
+            timings = self.bench(binary, data, expected)
+            if timings is None:
+                fails += 1
+                self.error_continuation('Fail')
+                continue
+            for run, timing in enumerate(timings):
+                suite[run] += timing
+            self.success_continuation(self.format_summary(timings))
+
+        print()
+        if fails:
+            self.error('%s out of %s tests failed' % (fails, len(cases)))
+        elif cases:
+            self.success('Suite: %s' % self.format_summary(suite))
+
+    def preload(self, path):
+        try:
+            with containers.open_test_file(path) as afile:
+                return afile.read()
+        except (IOError, OSError):
+            return None
+
+    def bench(self, binary, data, expected):
+        """
+        Runs ``binary`` on given input ``data`` and returns list of measured
+        times or ``None`` if output was wrong in any of the runs.
+        """
+        if data is None or expected is None:
+            return None
+        timings = []
+        for run in range(self.namespace.warmup + self.namespace.repeat):
+            comparator = self.get_comparator(io.BytesIO(expected))
+            runinfo = self.run_test_command(binary, comparator=comparator,
+                input=data)
+            if (runinfo['timeouted'] or runinfo['memory_exceeded'] or
+                    runinfo['returncode'] != 0 or not comparator.finish()):
+                return None
+            if run >= self.namespace.warmup:
+                timings.append(self.get_measured_time(runinfo))
+        return timings
+
+    def format_summary(self, timings):
+        return ('min %(min).3fs median %(median).3fs mean %(mean).3fs '
+            'p95 %(p95).3fs stddev %(stddev).3fs' % summarize(timings))
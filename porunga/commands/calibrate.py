@@ -0,0 +1,50 @@
+from __future__ import print_function
+
+from porunga.calibration import REFERENCE_STARTUP
+from porunga.calibration import get_host
+from porunga.commands.test import PorungaTestCommand
+from porunga.engine import LANGUAGES
+from monolith.cli import arg
+from monolith.cli import SingleLabelCommand
+
+
+class PorungaCalibrateCommand(PorungaTestCommand):
+    """
+    Measures speed of this host for given languages (CPU speed and startup
+    cost of an empty program) and caches it. Relative time limits of problems
+    (``time_limit`` in problem's configuration) are scaled using these
+    measurements; they are measured automatically the first time they are
+    needed, this command measures them again.
+    """
+
+    args = SingleLabelCommand.args + [
+        arg('-q', '--quiet', default=False, action='store_true'),
+    ]
+
+    def get_label_arg(self):
+        return arg('langs', nargs='*', metavar='LANG',
+            help='Languages to calibrate: %s (default: %s)' % (
+                ', '.join(sorted(LANGUAGES)), self.default_language))
+
+    def handle(self, namespace):
+        self.handle_label(namespace.langs, namespace)
+
+    def handle_label(self, label, namespace):
+        self.namespace = namespace
+        langs = label or [self.default_language]
+        for lang in langs:
+            if lang not in LANGUAGES:
+                self.exit("Wrong language specified: %s" % lang)
+
+        title = 'Calibrating %s' % get_host()
+        subtitle = '=' * len(title)
+        self.success_continuation(title)
+        self.success_continuation(subtitle)
+        print()
+
+        for lang in langs:
+            calibration = self.get_calibration(lang, recalibrate=True)
+            self.info("%s: CPU x%.2f (loop %.3fs), startup %.1fms "
+                "(reference %.1fms)" % (lang, calibration.cpu_factor,
+                calibration.cpu, calibration.startup * 1000,
+                REFERENCE_STARTUP.get(lang, 0.0) * 1000))
@@ -0,0 +1,233 @@
+from __future__ import print_function
+
+import hashlib
+import os
+from porunga import containers
+from porunga.commands.test import PorungaTestCommand
+from porunga.comparators import Stripper
+from porunga.engine import curdir
+from porunga.utils.paths import abspath
+from porunga.utils.stats import bootstrap_ratio
+from porunga.utils.stats import mann_whitney_u
+from porunga.utils.stats import median
+from monolith.cli import arg
+
+
+COMPARISON_WIDTH = 30
+
+
+class OutputDigest(object):
+    """
+    Comparator-like object which only computes digest of the output (with
+    leading and trailing whitespace stripped, as ``ExactComparator`` does).
+    """
+
+    def __init__(self):
+        self.stripper = Stripper()
+        self.digest = hashlib.sha1()
+
+    def feed(self, chunk):
+        self.digest.update(self.stripper.feed(chunk))
+        return True
+
+    def hexdigest(self):
+        return self.digest.hexdigest()
+
+
+def get_expected_digest(fout):
+    digest = OutputDigest()
+    try:
+        with containers.open_test_file(fout) as afile:
+            for chunk in iter(lambda: afile.read(64 * 1024), b''):
+                digest.feed(chunk)
+    except (IOError, OSError):
+        return None
+    return digest.hexdigest()
+
+
+class PorungaCompareCommand(PorungaTestCommand):
+    """
+    Compares speed of many solutions of the same problem (possibly written in
+    different languages). Solutions are run one after another on each test
+    case, in rotating order, so that changes of machine's speed affect all of
+    them equally. First solution is the baseline others are compared to.
+    """
+
+    args = PorungaTestCommand.common_args + [
+        arg('-d', '--dir', type=str, default=None, dest='problem',
+            help='Problem directory with test data (default: current '
+                 'directory)'),
+        arg('-w', '--warmup', type=int, default=1,
+            help='Number of untimed runs of each solution on each test case '
+                 '(default: 1)'),
+        arg('-r', '--repeat', type=int, default=10,
+            help='Number of timed runs of each solution on each test case '
+                 '(default: 10)'),
+        arg('--confidence', type=float, default=0.95,
+            help='Confidence level of reported intervals; differences with '
+                 'p-value below 1 - confidence are significant (default: '
+                 '0.95)'),
+    ]
+
+    def get_label_arg(self):
+        return arg('solutions', nargs='+', metavar='SOLUTION',
+            help='Source files of compared solutions')
+
+    def handle(self, namespace):
+        self.handle_label(namespace.problem, namespace)
+
+    def handle_label(self, label, namespace):
+        self.namespace = namespace
+        dirname = label or abspath(curdir())
+        if len(namespace.solutions) < 2:
+            self.exit("At least two solutions are needed")
+        if namespace.repeat < 2:
+            self.exit("At least two timed runs are needed")
+
+        title = 'Comparing solutions of %s' % dirname
+        subtitle = '=' * len(title)
+        self.success_continuation(title)
+        self.success_continuation(subtitle)
+        print()
+
+        programs = []
+        for index, path in enumerate(namespace.solutions):
+            program = self.get_program(path)
+            self.info("%s: %s (%s)" % (self.get_label(index), path,
+                ' '.join(program)))
+            programs.append(program)
+        print()
+
+        servers = [None] * len(programs)
+        try:
+            if namespace.fork_server:
+                servers = [self.start_program_server(path, program)
+                           for path, program in zip(namespace.solutions,
+                                                    programs)]
+            results = self.run_comparison(dirname, programs, servers)
+        finally:
+            self.fork_server = None
+            for server in servers:
+                if server is not None:
+                    server.stop()
+        self.report(results, len(programs))
+
+    def get_label(self, index):
+        return chr(ord('A') + index) if index < 26 else str(index + 1)
+
+    def run_comparison(self, dirname, programs, servers):
+        """
+        Returns list of ``(name, timings, digests, expected)`` for each test
+        case, where ``timings`` is a list of measured times of each solution
+        (``None`` if solution failed) and ``digests`` a list of sets of output
+        digests of each solution.
+        """
+        namespace = self.namespace
+        results = []
+        for fin, fout in self.get_test_cases(dirname):
+            self.info("Running %s ... " % fin, newline=False)
+            try:
+                with containers.open_test_file(fin) as afile:
+                    data = afile.read()
+            except (IOError, OSError):
+                self.error_continuation('in file could not be read')
+                continue
+            timings = [[] for program in programs]
+            digests = [set() for program in programs]
+            for run in range(namespace.warmup + namespace.repeat):
+                for shift in range(len(programs)):
+                    index = (run + shift) % len(programs)
+                    if timings[index] is None:
+                        continue
+                    self.fork_server = servers[index]
+                    digest = OutputDigest()
+                    runinfo = self.run_test_command(programs[index],
+                        comparator=digest, input=data)
+                    if (runinfo['timeouted'] or runinfo['memory_exceeded'] or
+                            runinfo['returncode'] != 0):
+                        timings[index] = None
+                        continue
+                    digests[index].add(digest.hexdigest())
+                    if run >= namespace.warmup:
+                        timings[index].append(self.get_measured_time(runinfo))
+            self.fork_server = None
+            results.append((os.path.relpath(fin, dirname), timings, digests,
+                get_expected_digest(fout)))
+            self.success_continuation('done')
+        return results
+
+    def format_time(self, timings):
+        if timings is None:
+            return 'fail'
+        return '%.3fs' % median(timings)
+
+    def format_comparison(self, baseline, timings):
+        """
+        Returns speed-up of ``timings`` over ``baseline`` (ratio of medians),
+        its confidence interval and p-value of Mann-Whitney test. Significant
+        differences are marked with ``*``.
+        """
+        if baseline is None or timings is None:
+            return '-'
+        confidence = self.namespace.confidence
+        ratio, low, high = bootstrap_ratio(baseline, timings, confidence)
+        u, p = mann_whitney_u(baseline, timings)
+        return 'x%.2f [%.2f, %.2f] p=%.3f%s' % (ratio, low, high, p,
+            ' *' if p < 1 - confidence else '  ')
+
+    def get_flags(self, digests, expected):
+        flags = []
+        outputs = set()
+        for index, solution_digests in enumerate(digests):
+            outputs.update(solution_digests)
+            if len(solution_digests) > 1:
+                flags.append('%s nondeterministic' % self.get_label(index))
+            elif expected is not None and solution_digests and (
+                    expected not in solution_digests):
+                flags.append('%s wrong' % self.get_label(index))
+        if len(outputs) > 1:
+            flags.insert(0, 'outputs differ')
+        return flags
+
+    def report(self, results, count):
+        if not results:
+            self.error('No test cases found')
+            return
+        names = [self.get_label(index) for index in range(count)]
+        width = max(len('suite'), max(len(result[0]) for result in results))
+        header = ['%-*s' % (width, 'test')] + ['%9s' % name for name in names]
+        header += ['%-*s' % (COMPARISON_WIDTH, '%s vs A' % name)
+                   for name in names[1:]]
+        print()
+        self.info_continuation('  '.join(header).rstrip())
+
+        suite = [[0.0] * self.namespace.repeat for index in range(count)]
+        differ = 0
+        for fin, timings, digests, expected in results:
+            row = ['%-*s' % (width, fin)]
+            row += ['%9s' % self.format_time(timing) for timing in timings]
+            row += ['%-*s' % (COMPARISON_WIDTH, self.format_comparison(
+                timings[0], timing)) for timing in timings[1:]]
+            for index, timing in enumerate(timings):
+                if timing is None or suite[index] is None:
+                    suite[index] = None
+                else:
+                    suite[index] = [total + value for total, value
+                                    in zip(suite[index], timing)]
+            flags = self.get_flags(digests, expected)
+            if flags:
+                differ += 1
+                self.error_continuation('  '.join(row) + '  ! ' +
+                    ', '.join(flags))
+            else:
+                self.info_continuation('  '.join(row).rstrip())
+
+        row = ['%-*s' % (width, 'suite')]
+        row += ['%9s' % self.format_time(timing) for timing in suite]
+        row += ['%-*s' % (COMPARISON_WIDTH, self.format_comparison(
+            suite[0], timing)) for timing in suite[1:]]
+        self.success_continuation('  '.join(row).rstrip())
+        print()
+        if differ:
+            self.error('Outputs differ on %d out of %d tests' % (differ,
+                len(results)))
@@ -0,0 +1,178 @@
+from __future__ import print_function
+
+import csv
+from porunga import containers
+from porunga import procme
+from porunga.commands.stress import HELPER_TIMEOUT
+from porunga.commands.test import PorungaTestCommand
+from porunga.engine import curdir
+from porunga.engine import decode
+from porunga.utils.paths import abspath
+from porunga.utils.stats import fit_complexity
+from monolith.cli import arg
+from subprocess import PIPE
+
+
+class PorungaComplexityCommand(PorungaTestCommand):
+    """
+    Estimates how running time of the solution grows with input size. Inputs
+    are either produced by a generator program (run with size and seed as
+    arguments) or are existing test inputs (then input size is the size of
+    file, in bytes). Measured times are fitted against common complexity
+    classes.
+    """
+
+    args = PorungaTestCommand.common_args + [
+        arg('-g', '--generator', type=str, default=None,
+            help='Program generating input of size given as its first '
+                 'argument (second argument is a seed). If not given, test '
+                 'inputs are used'),
+        arg('--sizes', type=str, default=None,
+            help='Comma separated input sizes passed to the generator'),
+        arg('--min-size', type=int, default=1000,
+            help='Smallest input size passed to the generator (default: '
+                 '1000)'),
+        arg('--max-size', type=int, default=100000,
+            help='Biggest input size passed to the generator (default: '
+                 '100000)'),
+        arg('--steps', type=int, default=8,
+            help='Number of input sizes between --min-size and --max-size '
+                 '(default: 8)'),
+        arg('-r', '--repeat', type=int, default=3,
+            help='Number of runs for each input, fastest is taken (default: '
+                 '3)'),
+        arg('--table', type=str, default=None, metavar='PATH',
+            help='Write CSV table with measured and fitted times to given '
+                 'file'),
+        arg('--helper-timeout', type=float, default=HELPER_TIMEOUT,
+            metavar='SECONDS',
+            help='Stop if the generator runs for more than given value '
+                 '(default: %s)' % HELPER_TIMEOUT),
+    ]
+
+    def handle_label(self, label, namespace):
+        self.namespace = namespace
+        dirname = label or abspath(curdir())
+        self.set_problem(dirname)
+
+        title = 'Estimating complexity of %s' % dirname
+        subtitle = '=' * len(title)
+        self.success_continuation(title)
+        self.success_continuation(subtitle)
+        print()
+
+        binary = self.get_binary(dirname, namespace.lang)
+        self.info("Binary: %s" % binary)
+        binary = self.get_binary_argv(dirname, namespace.lang)
+        if namespace.generator:
+            generator = self.get_program(namespace.generator)
+            self.info("Generator: %s" % ' '.join(generator))
+            inputs = self.iter_generated_inputs(generator)
+        else:
+            inputs = self.iter_test_inputs(dirname)
+        print()
+
+        if namespace.fork_server:
+            self.start_fork_server(dirname, binary)
+        try:
+            sizes, times = self.measure(binary, inputs)
+        finally:
+            self.stop_fork_server()
+        if len(sizes) < 3:
+            self.exit("At least 3 inputs of different sizes are needed")
+
+        fits = fit_complexity(sizes, times)
+        self.report(sizes, times, fits)
+        if namespace.table:
+            self.write_table(namespace.table, sizes, times, fits)
+
+    def get_sizes(self):
+        namespace = self.namespace
+        if namespace.sizes:
+            return [int(size) for size in namespace.sizes.split(',')]
+        steps = max(namespace.steps, 2)
+        ratio = (float(namespace.max_size) / namespace.min_size) ** (
+            1.0 / (steps - 1))
+        sizes = [int(round(namespace.min_size * ratio ** step))
+                 for step in range(steps)]
+        return sorted(set(sizes))
+
+    def get_helper_timeout(self):
+        return getattr(self.namespace, 'helper_timeout', HELPER_TIMEOUT)
+
+    def iter_generated_inputs(self, generator):
+        """
+        Yields ``(size, input)`` produced by the generator (limited by
+        ``--helper-timeout``).
+        """
+        timeout = self.get_helper_timeout()
+        for seed, size in enumerate(self.get_sizes()):
+            command = procme.Command(generator + [str(size), str(seed)],
+                stderr=PIPE, timeout=timeout)
+            try:
+                data = b''.join(command.iter_raw_output())
+            except procme.TimeoutExceeded:
+                self.exit("Generator timed out after %.1fs for size %d" % (
+                    timeout, size))
+            if command.returncode != 0:
+                self.exit("Generator failed for size %d:\n%s" % (size,
+                    decode(command.error_output)))
+            yield size, data
+
+    def iter_test_inputs(self, dirname):
+        """
+        Yields ``(size, input)`` for test inputs, ordered by size.
+        """
+        fins = [fin for fin, fout in self.get_test_cases(dirname)]
+        inputs = []
+        for fin in fins:
+            with containers.open_test_file(fin) as afile:
+                data = afile.read()
+            inputs.append((len(data), data))
+        for size, data in sorted(inputs, key=lambda item: item[0]):
+            if size:
+                yield size, data
+
+    def measure(self, binary, inputs):
+        """
+        Returns lists of sizes and best times measured for them.
+        """
+        sizes = []
+        times = []
+        for size, data in inputs:
+            self.info("Size %d ... " % size, newline=False)
+            timings = []
+            for run in range(max(self.namespace.repeat, 1)):
+                runinfo = self.run_test_command(binary, input=data)
+                if (runinfo['timeouted'] or runinfo['memory_exceeded'] or
+                        runinfo['returncode'] != 0):
+                    self.error_continuation('Fail')
+                    break
+                timings.append(self.get_measured_time(runinfo))
+            else:
+                sizes.append(size)
+                times.append(min(timings))
+                self.success_continuation('%.3fs' % times[-1])
+        return sizes, times
+
+    def report(self, sizes, times, fits):
+        best = fits[0]
+        print()
+        self.info_continuation('n\ttime\t%s' % best['name'])
+        for size, time in zip(sizes, times):
+            self.info_continuation('%d\t%.6f\t%.6f' % (size, time,
+                best['a'] + best['b'] * best['func'](size)))
+        print()
+        for fit in fits:
+            self.info('%-12s confidence %5.1f%%' % (fit['name'],
+                fit['confidence'] * 100))
+        self.success('Best fit: %s (confidence %.1f%%)' % (best['name'],
+            best['confidence'] * 100))
+
+    def write_table(self, path, sizes, times, fits):
+        with open(path, 'w') as afile:
+            writer = csv.writer(afile)
+            writer.writerow(['n', 'time'] + [fit['name'] for fit in fits])
+            for size, time in zip(sizes, times):
+                writer.writerow([size, '%.6f' % time] + ['%.6f' % (fit['a'] +
+                    fit['b'] * fit['func'](size)) for fit in fits])
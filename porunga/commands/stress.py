@@ -0,0 +1,246 @@
+from __future__ import print_function
+
+import io
+import itertools
+import os
+import threading
+from porunga import procme
+from porunga.commands.test import PorungaTestCommand
+from porunga.engine import curdir
+from porunga.engine import decode
+from porunga.forkserver import ForkServerCommand
+from porunga.utils.paths import abspath
+from porunga.utils.paths import joinpath
+from porunga.verdicts import VERDICT_OK
+from monolith.cli import arg
+from subprocess import PIPE
+
+
+STRESS_CASE_PATTERN = 'stress%03d'
+
+# generator and reference solution are killed after running that long
+HELPER_TIMEOUT = 10.0
+
+
+class StressError(Exception):
+    """
+    Raised if generator or reference solution fails or times out.
+    """
+
+
+class PorungaStressCommand(PorungaTestCommand):
+    """
+    Runs solution on random inputs produced by a generator (called with
+    successive seeds) and compares its output with output of a reference
+    (i.e. brute force) solution. Cases are run concurrently and everything
+    is kept in memory; only the first failing case is saved within
+    ``testdata/``.
+    """
+    generator_server = None
+    brute_server = None
+
+    args = PorungaTestCommand.common_args + [
+        arg('-g', '--generator', type=str, required=True,
+            help='Program generating input for seed given as its first '
+                 'argument'),
+        arg('-b', '--brute', type=str, required=True,
+            help='Reference solution which output is expected'),
+        arg('-n', '--count', type=int, default=0,
+            help='Number of cases to run. By default cases are run until '
+                 'a failing one is found'),
+        arg('-s', '--seed', type=int, default=1,
+            help='First seed passed to the generator (default: 1)'),
+        arg('-j', '--jobs', type=int, default=None,
+            help='Number of cases run concurrently (default: number of '
+                 'CPUs)'),
+        arg('--helper-timeout', type=float, default=HELPER_TIMEOUT,
+            metavar='SECONDS',
+            help='Stop if the generator or the reference solution runs for '
+                 'more than given value (default: %s)' % HELPER_TIMEOUT),
+    ]
+
+    def handle_label(self, label, namespace):
+        self.namespace = namespace
+        dirname = label or abspath(curdir())
+        self.set_problem(dirname)
+
+        title = 'Stress testing %s' % dirname
+        subtitle = '=' * len(title)
+        self.success_continuation(title)
+        self.success_continuation(subtitle)
+        print()
+
+        binary = self.get_binary(dirname, namespace.lang)
+        self.info("Binary: %s" % binary)
+        binary = self.get_binary_argv(dirname, namespace.lang)
+        generator = self.get_program(namespace.generator)
+        self.info("Generator: %s" % ' '.join(generator))
+        brute = self.get_program(namespace.brute)
+        self.info("Reference: %s" % ' '.join(brute))
+        print()
+
+        if namespace.fork_server:
+            self.start_fork_server(dirname, binary)
+            self.generator_server = self.start_program_server(
+                namespace.generator, generator)
+            self.brute_server = self.start_program_server(namespace.brute,
+                brute)
+        try:
+            started = procme.monotonic()
+            count, failure = self.stress(binary, generator, brute)
+            elapsed = procme.monotonic() - started
+        finally:
+            self.stop_fork_server()
+            for server in (self.generator_server, self.brute_server):
+                if server is not None:
+                    server.stop()
+
+        speed = count / elapsed if elapsed else 0.0
+        self.info("%d cases in %.1fs (%.1f cases/s)" % (count, elapsed,
+            speed))
+        if failure is None:
+            self.success('All cases passed')
+            return
+        if 'error' in failure:
+            self.exit(failure['error'])
+        fin, fout = self.save_case(dirname, failure['input'],
+            failure['expected'])
+        self.error('Seed %d failed (%s), case saved as %s' % (
+            failure['seed'], failure['verdict'], fin))
+        self.error_continuation('Output:\n%s\nExpected:\n%s\n' % (
+            failure['output'], decode(failure['expected']).strip()))
+        self.exit('Stress test failed', code=2)
+
+    def stress(self, binary, generator, brute):
+        """
+        Runs cases on ``get_jobs()`` threads until first failure (or until
+        ``--count`` cases are run). Returns number of run cases and the
+        failure (``None`` if all cases passed). If many cases fail at once,
+        the one with the lowest seed is returned.
+        """
+        namespace = self.namespace
+        seeds = itertools.count(namespace.seed)
+        lock = threading.Lock()
+        stop = threading.Event()
+        failures = []
+        counter = [0]
+        last = namespace.seed + namespace.count if namespace.count else None
+
+        def work():
+            while not stop.is_set():
+                with lock:
+                    seed = next(seeds)
+                if last is not None and seed >= last:
+                    return
+                try:
+                    result = self.run_case(binary, generator, brute, seed)
+                except StressError as err:
+                    result = {'seed': seed, 'error': str(err)}
+                with lock:
+                    counter[0] += 1
+                    if result is not None:
+                        failures.append(result)
+                        stop.set()
+
+        threads = [threading.Thread(target=work)
+                   for job in range(self.get_jobs())]
+        for thread in threads:
+            thread.daemon = True
+            thread.start()
+        try:
+            for thread in threads:
+                while thread.is_alive():
+                    thread.join(0.1)
+        except KeyboardInterrupt:
+            stop.set()
+            for thread in threads:
+                thread.join()
+        if not failures:
+            return counter[0], None
+        return counter[0], min(failures, key=lambda failure: failure['seed'])
+
+    def get_helper_timeout(self):
+        return getattr(self.namespace, 'helper_timeout', HELPER_TIMEOUT)
+
+    def run_program(self, program, server, argv=(), input=None):
+        """
+        Runs helper program (limited only by ``--helper-timeout``) and
+        returns its output and finished command. Raises
+        ``procme.TimeoutExceeded`` if it runs for too long.
+        """
+        timeout = self.get_helper_timeout()
+        if server is not None:
+            command = ForkServerCommand(server, program, argv=argv,
+                stderr=PIPE, input=input, timeout=timeout)
+        else:
+            command = procme.Command(program + list(argv), stderr=PIPE,
+                input=input, timeout=timeout)
+        return b''.join(command.iter_raw_output()), command
+
+    def generate(self, generator, seed):
+        try:
+            data, command = self.run_program(generator,
+                self.generator_server, [str(seed)])
+        except procme.TimeoutExceeded:
+            raise StressError("Generator timed out after %.1fs for seed %d"
+                % (self.get_helper_timeout(), seed))
+        if command.returncode != 0:
+            raise StressError("Generator failed for seed %d:\n%s" % (seed,
+                decode(command.error_output)))
+        return data
+
+    def run_reference(self, brute, seed, data):
+        try:
+            expected, command = self.run_program(brute, self.brute_server,
+                input=data)
+        except procme.TimeoutExceeded:
+            raise StressError("Reference solution timed out after %.1fs for "
+                "seed %d" % (self.get_helper_timeout(), seed))
+        if command.returncode != 0:
+            raise StressError("Reference solution failed for seed %d:\n%s"
+                % (seed, decode(command.error_output)))
+        return expected
+
+    def run_case(self, binary, generator, brute, seed):
+        """
+        Runs single case and returns ``None`` if solution's output is the same
+        as reference one or information about the failure otherwise.
+        """
+        data = self.generate(generator, seed)
+        expected = self.run_reference(brute, seed, data)
+        comparator = self.get_comparator(io.BytesIO(expected))
+        runinfo = self.run_test_command(binary, comparator=comparator,
+            input=data)
+        verdict = self.get_verdict(runinfo, matched=comparator.finish())
+        if verdict == VERDICT_OK:
+            return None
+        return {
+            'seed': seed,
+            'verdict': verdict,
+            'input': data,
+            'expected': expected,
+            'output': runinfo['output'],
+        }
+
+    def save_case(self, dirname, data, expected):
+        """
+        Saves case as the first free ``testdata/stressNNN.in/.out`` pair and
+        returns paths of both files.
+        """
+        testdir = joinpath(dirname, 'testdata')
+        if not os.path.isdir(testdir):
+            os.makedirs(testdir)
+        for number in itertools.count(1):
+            name = joinpath(testdir, STRESS_CASE_PATTERN % number)
+            try:
+                fd = os.open(name + '.in', os.O_WRONLY | os.O_CREAT |
+                    os.O_EXCL)
+            except OSError:
+                if os.path.exists(name + '.in'):
+                    continue
+                raise
+            with os.fdopen(fd, 'wb') as afile:
+                afile.write(data)
+            with open(name + '.out', 'wb') as afile:
+                afile.write(expected)
+            return name + '.in', name + '.out'
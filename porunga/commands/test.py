@@ -1,68 +1,43 @@
 from __future__ import print_function
 
-import fnmatch
-import os
 import sys
-from os import walk
-from datetime import datetime
-from glob import glob
-from porunga.utils.backports import get_total_seconds
+from porunga import containers
+from porunga import pinning
+from porunga import procme
+from porunga.comparators import COMPARATORS
+from porunga.config import CONFIG_FILENAME
+from porunga.engine import DEFAULT_LANGUAGE
+from porunga.engine import Engine
+from porunga.engine import LANGUAGES
+from porunga.engine import curdir
+from porunga.engine import decode
+from porunga.engine import format_size
+from porunga.history import HISTORY_FILENAME
+from porunga.history import PREVIOUS_RUN
+from porunga.profiling import PROFILE_DIRNAME
+from porunga.profiling import ProfileError
 from porunga.utils.paths import joinpath
 from porunga.utils.paths import abspath
+from porunga.watch import diff_results
+from porunga.watch import get_watcher
+from porunga.watch import order_cases
+from porunga.verdicts import VERDICT_MEMORY_LIMIT
+from porunga.verdicts import VERDICT_NO_OUTPUT_FILE
+from porunga.verdicts import VERDICT_RUNTIME_ERROR
+from porunga.verdicts import VERDICT_TIMEOUT
 from monolith.cli import arg
 from monolith.cli import SingleLabelCommand
 from subprocess import Popen, PIPE
 from termcolor import colored
 
 
-LANGUAGES = {
-    'python': {
-        'fout': '{name}.py',
-        'prog': 'python {fout}',
-    },
-    'ruby': {
-        'fout': '{name}.rb',
-        'prog': 'ruby {fout}',
-    },
-    'java': {
-        'fin': '{name}.java',
-        'fout': '{simplename}',
-        'prog': 'java -cp {dirname} {fout}',
-        'compiler': 'javac {fin}',
-    },
-    'objc': {
-        'fin': '{name}.m',
-        'fout': '{name}.m.out',
-        'prog': '{fout}',
-        'compiler': 'clang -ObjC -framework Foundation {fin} -o {fout}',
-    },
-    'c': {
-        'fin': '{name}.c',
-        'fout': '{name}.c.out',
-        'prog': '{fout}',
-        'compiler': 'gcc -O2 {fin} -o {fout}',
-    },
-    'cpp': {
-        'fin': '{name}.cpp',
-        'fout': '{name}.cpp.out',
-        'prog': '{fout}',
-        'compiler': 'g++ -O2 {fin} -o {fout}',
-    },
-}
-
-def curdir():
-    return os.path.curdir
-
-
-class PorungaTestCommand(SingleLabelCommand):
-    languages = LANGUAGES
-    default_language = 'python'
-
-    args = SingleLabelCommand.args + [
-        arg('-l', '--lang', type=str, default=default_language,
+class PorungaTestCommand(Engine, SingleLabelCommand):
+    # options shared by all commands which run solutions
+    common_args = SingleLabelCommand.args + [
+        arg('-l', '--lang', type=str, default=DEFAULT_LANGUAGE,
             help='Available languages: %s (default: %s)' %
-                (', '.join((key for key in sorted(languages.keys()))),
-                 default_language) ),
+                (', '.join((key for key in sorted(LANGUAGES.keys()))),
+                 DEFAULT_LANGUAGE) ),
         arg('-a', '--all', default=False, action='store_true'),
         arg('-v', '--verbose', default=False, action='store_true'),
         arg('-q', '--quiet', default=False, action='store_true'),
@@ -70,11 +45,86 @@ class PorungaTestCommand(SingleLabelCommand):
         arg('-t', '--timeout', type=float, default=0.0,
             help='Fail test if it is run for more than given value (in '
                  'seconds). By default there is no timeout'),
+        arg('--cpu-time', default=False, action='store_true',
+            help='Apply --timeout to CPU time (user + system) of the '
+                 'solution instead of wall time'),
+        arg('-m', '--memory-limit', type=float, default=0.0,
+            help='Fail test if it uses more memory than given value (in '
+                 'MB). By default there is no memory limit'),
+        arg('--fork-server', default=False, action='store_true',
+            help='Start Python interpreter once and fork it for each test '
+                 'instead of starting new one (only for python)'),
+        arg('--no-cache', default=False, action='store_true',
+            help='Always compile and scan test data, do not use '
+                 'compilation cache nor cached listings of test data'),
+        arg('--cache-size', type=int, default=512,
+            help='Maximum size of compilation cache, in MB (default: 512)'),
+        arg('--comparator', type=str, default=None,
+            choices=sorted(COMPARATORS),
+            help='How output is compared with expected one: exact (default), '
+                 'tokens (any whitespace between tokens) or numeric (numbers '
+                 'may differ by --absolute-error or --relative-error). '
+                 'Overrides comparator set in %s file of the problem'
+                 % CONFIG_FILENAME),
+        arg('--absolute-error', type=float, default=None, metavar='EPS',
+            help='Absolute error allowed by numeric comparator (default: '
+                 '1e-6)'),
+        arg('--relative-error', type=float, default=None, metavar='EPS',
+            help='Relative error allowed by numeric comparator (default: '
+                 '1e-6)'),
+    ]
+
+    args = common_args + [
+        arg('-j', '--jobs', type=int, default=None,
+            help='Number of test cases run concurrently (default: number '
+                 'of CPUs)'),
+        arg('--pin', default=False, action=pinning.PinAction,
+            help='Pin each test to its own CPU (one CPU is left for porunga '
+                 'itself), report noise of timings and re-run timed out '
+                 'tests to confirm the timeout'),
+        arg('--nice', type=int, default=None, metavar='N',
+            help='Add N to niceness of tests'),
+        arg('--failed-first', default=False, action='store_true',
+            help='Run tests which failed last time before other ones'),
+        arg('--fail-fast', default=False, action='store_true',
+            help='Stop at the first failed test'),
+        arg('--no-history', default=False, action='store_true',
+            help='Do not record timings of this run in the problem\'s '
+                 'history (%s file)' % HISTORY_FILENAME),
+        arg('--tag', type=str, default=None,
+            help='Name under which this run is recorded in the history, so '
+                 'it can be used with --compare later'),
+        arg('--compare', type=str, default=None, metavar='RUN',
+            help='Compare timings with the latest run of the same language '
+                 'recorded with given tag (or with "%s" run) and fail if any '
+                 'test got slower' % PREVIOUS_RUN),
+        arg('--threshold', type=float, default=0.1,
+            help='Relative slowdown reported as a regression by --compare '
+                 '(default: 0.1)'),
+        arg('--noise', type=float, default=0.01,
+            help='Slowdowns below that value (in seconds) are never reported '
+                 'by --compare (default: 0.01)'),
+        arg('--profile', default=False, action='store_true',
+            help='Profile the solution (python and c/c++ only) on all tests '
+                 'and report functions it spends most time in. Raw data are '
+                 'kept in %s directory' % PROFILE_DIRNAME),
+        arg('--profile-top', type=int, default=20, metavar='N',
+            help='Number of functions reported by --profile (default: 20)'),
+        arg('--report', action='append', default=None,
+            metavar='FORMAT:PATH',
+            help='Write results to a file in given format: jsonl (JSON '
+                 'object per test), junit (JUnit XML) or trace (Chrome trace '
+                 'timeline). May be given many times'),
+        arg('--watch', default=False, action='store_true',
+            help='Keep watching the solution and test data; re-run the '
+                 'suite (failed and slowest tests first) after the solution '
+                 'changes and only changed tests after test data change'),
     ]
 
     def handle_label(self, label, namespace):
         self.namespace = namespace
         dirname = label or abspath(curdir())
+        self.set_problem(dirname)
 
         title = 'Testing %s' % dirname
         subtitle = '=' * len(title)
@@ -82,149 +132,250 @@ class PorungaTestCommand(SingleLabelCommand):
         self.success_continuation(subtitle)
         print()
 
-        binary = self.get_binary(dirname, namespace.lang)
-        self.info("Binary: %s" % binary)
+        binary, cases = self.prepare_suite(dirname)
+        self.report_binary(self.suite['binary'])
+        self.report_time_limit(dirname)
         print()
+        try:
+            cases = self.start_suite(dirname, binary, cases)
+            results = self.run_suite(dirname, binary, cases)
+            if getattr(namespace, 'watch', False):
+                self.watch(dirname, binary, results)
+        finally:
+            self.stop_suite()
+
+    def report_time_limit(self, dirname):
+        timeout = self.get_timeout(dirname)
+        if timeout is None:
+            return
+        kind = 'CPU time' if getattr(self.namespace, 'cpu_time',
+            False) else 'wall time'
+        config = self.get_problem_config(dirname)
+        if self.namespace.timeout or 'time_limit' not in config:
+            self.info("Time limit: %.3fs of %s" % (timeout, kind))
+            return
+        calibration = self.get_calibration(self.namespace.lang)
+        self.info("Time limit: %.3fs of %s (%.3fs on reference machine; "
+            "CPU x%.2f, startup %.1fms)" % (timeout, kind,
+            config['time_limit'], calibration.cpu_factor,
+            calibration.startup * 1000))
+
+    def report_binary(self, binary):
+        if self.cache_status:
+            self.info("Binary: %s (cache %s)" % (binary, self.cache_status))
+        else:
+            self.info("Binary: %s" % binary)
+
+    def report_noise(self, timings):
+        if not timings:
+            return
+        self.info("Timing noise: %.1f%% (deviation of calibration loop, %s "
+            "runs on %s CPUs)" % (pinning.get_noise(timings) * 100,
+            len(timings), len(self.cpu_pool.cpus)))
 
-        time = 0
+    def report_profile(self):
+        try:
+            rows = self.profiler.collect()
+        except (ProfileError, IOError, OSError) as err:
+            self.error("Could not collect profile: %s" % err)
+            return
+        print()
+        if not rows:
+            self.error("No profile data collected")
+            return
+        self.info("Profile of all tests (timings include profiler overhead, "
+            "raw data in %s):" % self.profiler.directory)
+        self.info_continuation('%10s %10s %10s  %s' % ('self', 'total',
+            'calls', 'function'))
+        for own, total, calls, name in rows[:self.namespace.profile_top]:
+            self.info_continuation('%9.3fs %10s %10s  %s' % (own,
+                '-' if total is None else '%.3fs' % total,
+                '-' if calls is None else calls, name))
+
+    def run_suite(self, dirname, binary, cases=None, record=True):
+        """
+        Runs all test cases of the problem (or given ``cases``), prints the
+        summary and returns list of results. History is recorded only if
+        ``record`` is set.
+        """
+        time = utime = stime = maxrss = 0
         total = 0
         fails = 0
-        for fin, fout in self.get_test_cases(dirname):
+        results = []
+        if cases is None:
+            cases = self.schedule_cases(dirname, self.get_test_cases(dirname))
+        calibration = self.calibrate()
+        for info in self.iter_suite(dirname, binary, cases):
+            results.append(info)
             total += 1
-            info = self.test(dirname, binary, fin, fout)
             time += info['time']
+            utime += info['utime']
+            stime += info['stime']
+            maxrss = max(maxrss, info['maxrss'])
             if not info['success']:
                 fails += 1
 
+        calibration += self.calibrate()
+
         print()
-        self.info("Total time: %.3fs" % time)
+        self.info("Total time: %.3fs (user %.3fs, sys %.3fs, peak mem %s)" % (
+            time, utime, stime, format_size(maxrss)))
+        self.report_noise(calibration)
         if fails == 0:
             self.success('All %s tests passed' % total)
+        elif getattr(self.namespace, 'fail_fast', False):
+            self.error('Stopped after the first failed test (%s tests run)'
+                % total)
         else:
             self.error('%s out of %s tests failed' % (fails, total))
-
-    def get_binary(self, dirname, lang):
-        dirname = dirname.rstrip('/\\')
-        if lang in LANGUAGES:
-            data = {'dirname': dirname}
-            info = LANGUAGES[lang]
-            simplename = data['simplename'] = os.path.split(dirname)[1] # dirname
-            name = joinpath(dirname, simplename)
-            data['name'] = name
-            fin = info['fin'].format(**data) if 'fin' in info else ''
-            data['fin'] = fin
-            fout = info['fout'].format(**data)
-            data['fout'] = fout
-            if 'compiler' in info:
-                program = info['compiler'].format(**data)
-                self.compile(program)
-            return info['prog'].format(**data)
-        else:
-            self.exit("Wrong language specified")
-
-    def run_test_command(self, cmd):
-        if not self.namespace.timeout:
-            process = Popen(cmd, stdout=PIPE, stderr=PIPE, shell=True)
-            out, err = process.communicate()
-            return {
-                'output': out.strip(),
-                'returncode': process.returncode,
-                'timeouted': False,
-            }
+        self.close_reports()
+        if self.profiler is not None:
+            # profiled timings are not comparable with regular ones
+            self.report_profile()
+        elif record:
+            self.record_history(dirname, results)
+        return results
+
+    def watch(self, dirname, binary, results):
+        """
+        Waits for changes of the solution or test data and re-runs affected
+        tests until interrupted. Each iteration ends with a diff of verdicts
+        and timings against the previous one.
+        """
+        previous = dict((info['fin'], info) for info in results)
+        testdir = joinpath(dirname, 'testdata')
+        watcher = get_watcher({dirname: False, testdir: True})
+        try:
+            while True:
+                print()
+                self.info("Watching %s for changes (press Ctrl+C to stop)"
+                    % dirname)
+                rebuild = cases = removed = None
+                while not (rebuild or cases or removed):
+                    changed = watcher.wait()
+                    rebuild, cases, removed = self.get_watched_cases(dirname,
+                        changed, previous)
+                try:
+                    binary = self.run_watch_iteration(dirname, binary,
+                        rebuild, cases, removed, previous)
+                except SystemExit:
+                    # compilation errors and regressions end the iteration
+                    # only
+                    pass
+        except KeyboardInterrupt:
+            print()
+        finally:
+            watcher.close()
+
+    def get_watched_cases(self, dirname, changed, previous):
+        """
+        Returns ``(rebuild, cases, removed)`` for set of ``changed`` paths:
+        whether the solution has to be rebuilt, test cases to re-run (all of
+        them if solution or an archive changed, otherwise those which input
+        or output changed) and names of inputs which are gone.
+        """
+        rebuild = self.get_source(dirname, self.namespace.lang) in changed
+        archives = [joinpath(dirname, containers.ARCHIVE_NAME + suffix)
+                    for suffix in containers.ZIP_SUFFIXES +
+                    containers.TAR_SUFFIXES]
+        everything = rebuild or any(path in changed for path in archives)
+        cases = list(self.get_test_cases(dirname))
+        fins = set(fin for fin, fout in cases)
+        removed = sorted(fin for fin in previous if fin not in fins)
+        if not everything:
+            cases = [(fin, fout) for fin, fout in cases
+                     if fin in changed or fout in changed]
+        return rebuild, order_cases(cases, previous), removed
+
+    def run_watch_iteration(self, dirname, binary, rebuild, cases, removed,
+            previous):
+        """
+        Rebuilds the solution if needed, re-runs given ``cases``, updates
+        ``previous`` results and returns (possibly rebuilt) binary.
+        """
+        print()
+        if rebuild:
+            self.info("Solution changed, rebuilding")
+            self.stop_fork_server()
+            started = procme.monotonic()
+            self.suite['binary'] = self.get_binary(dirname, self.namespace.lang)
+            self.suite['compile'] = (started, procme.monotonic())
+            self.suite['started'] = started
+            self.report_binary(self.suite['binary'])
+            binary = self.get_binary_argv(dirname, self.namespace.lang)
+            if self.namespace.fork_server:
+                self.start_fork_server(dirname, binary)
         else:
-            from porunga import procme
-            command = procme.Command(cmd, shell=True, timeout=self.namespace.timeout)
-            try:
-                command.run()
-                timeouted = False
-            except procme.TimeoutExceeded:
-                timeouted = True
-            return {
-                'output': command.output.strip(),
-                'returncode': command.returncode,
-                'timeouted': timeouted,
-            }
-
-
-    def test(self, dirname, binary, fin, fout):
+            self.info("Test data changed, re-running %s tests" % len(cases))
+            self.suite['compile'] = None
+            self.suite['started'] = procme.monotonic()
+        results = []
+        if cases:
+            print()
+            self.open_reports()
+            if self.profiler is not None:
+                self.start_profiler(dirname, self.namespace.lang)
+            results = self.run_suite(dirname, binary, cases, record=rebuild)
+        self.report_watch_diff(previous, results, removed)
+        for fin in removed:
+            del previous[fin]
+        previous.update((info['fin'], info) for info in results)
+        return binary
+
+    def report_watch_diff(self, previous, results, removed):
+        lines = diff_results(previous, results, self.namespace.threshold,
+            self.namespace.noise)
+        lines += ['%s: removed' % fin for fin in removed]
+        print()
+        if not lines:
+            self.info("No changes since previous run")
+            return
+        self.info("Changes since previous run:")
+        for line in lines:
+            self.info_continuation('    %s' % line)
+
+    def format_usage(self, info):
+        return '(user %.3fs, sys %.3fs, mem %s)' % (info['utime'],
+            info['stime'], format_size(info['maxrss']))
+
+    def report_test_header(self, fin):
         self.info("Testing %s ... " % fin, newline=False)
-        start = datetime.now()
-        cmd = 'cat %s | %s' % (fin, binary)
-        runinfo = self.run_test_command(cmd)
-        output = runinfo['output']
-        returncode = runinfo['returncode']
-        timeouted = runinfo['timeouted']
-
-        timedelta = datetime.now() - start
 
-        try:
-            expected = open(fout).read().strip()
-            fout_read = True
-        except IOError:
-            expected = '[File could not be read]'
-            fout_read = False
-
-        success = output == expected and returncode == 0 and fout_read
-        if success:
-            self.success_continuation('OK [%.3f]s' % get_total_seconds(timedelta))
+    def report_test(self, info):
+        if info['success']:
+            self.success_continuation('OK [%.3f]s %s%s' % (info['time'],
+                self.format_usage(info), ' (timed out at first run)'
+                if info.get('retried') else ''))
         else:
             self.error_continuation('Fail')
             if self.namespace.verbose:
-                if timeouted:
-                    msg = "    Program timeouted after %.1fs" % self.namespace.timeout
-                elif returncode != 0:
-                    msg = "    Program returned with code %d:\n%s" % (
-                        returncode, output)
-                elif not fout_read:
-                    msg = "    out file could not be read (%r)" % fout
+                verdict = info['verdict']
+                if verdict == VERDICT_TIMEOUT:
+                    msg = "    Program timeouted after %.3fs (%s)%s" % (
+                        self.get_timeout(), self.format_usage(info),
+                        ', confirmed by re-run' if info.get('retried') else '')
+                elif verdict == VERDICT_MEMORY_LIMIT:
+                    msg = "    Memory limit exceeded (limit %s, peak %s)" % (
+                        format_size(self.get_memory_limit()),
+                        format_size(info['maxrss']))
+                elif info['aborted']:
+                    msg = "    Output differs at %s\n" % info['mismatch']
+                elif verdict == VERDICT_RUNTIME_ERROR:
+                    msg = "    Program returned with code %d:\n%s\n%s" % (
+                        info['returncode'], info['output'], info['errors'])
+                elif verdict == VERDICT_NO_OUTPUT_FILE:
+                    msg = "    out file could not be read (%r)" % info['fout']
                 else:
-                    msg = "    Result was:\n%s\n but expected:\n%s\n" % (
-                        output, expected)
+                    msg = ("    Output differs at %s\n    Result was:\n%s\n"
+                        " but expected:\n%s\n" % (info['mismatch'],
+                        info['output'], info['expected']))
                 self.error_continuation(msg)
 
-        return {
-            'success': success,
-            'time': get_total_seconds(timedelta),
-        }
-
-    def get_test_cases_for_suffix(self, dirname, in_suffix):
-        testdir = joinpath(dirname, 'testdata')
-
-        suffix = '*.%s' % in_suffix
-        if self.namespace.all:
-            fins = []
-            for topdir, dirnames, filenames in walk(testdir):
-                fins.extend([joinpath(topdir, filename) for filename
-                                in fnmatch.filter(filenames, suffix)])
-        else:
-            fins = glob(joinpath(testdir, suffix))
-        return fins
-
-    def get_fout_name(self, fin):
-        splitted = fin.split('.')
-        if not splitted:
-            return None
-        suffix = splitted[-1]
-        if suffix == 'in':
-            return '.'.join(splitted[:-1] + ['out'])
-        elif suffix == 'IN':
-            return '.'.join(splitted[:-1] + ['OUT'])
-
-    def get_test_cases(self, dirname):
-        if getattr(self.namespace, 'case', False):
-            fins = [self.namespace.case]
-        else:
-            lower = list(self.get_test_cases_for_suffix(dirname, 'in'))
-            upper = list(self.get_test_cases_for_suffix(dirname, 'IN'))
-            fins = set(lower + upper)
-        return [(fin, self.get_fout_name(fin)) for fin in fins
-                if self.get_fout_name(fin)]
-
     def compile(self, program):
         proc = Popen([program], stdout=PIPE, stderr=PIPE, shell=True)
         out, err = proc.communicate()
         if proc.returncode != 0:
-            sys.stderr.write(err)
+            sys.stderr.write(decode(err))
             self.exit("Error: compilation error! Tried command: %r" % program)
 
     def log(self, message, newline=True):
@@ -261,5 +412,3 @@ class PorungaTestCommand(SingleLabelCommand):
             sys.stderr.write(colored(message, 'red'))
             sys.stderr.write('\n')
         sys.exit(code)
-
-
@@ -0,0 +1,378 @@
+"""
+Comparators check program's output against expected one while the program is
+still running. Output is fed chunk by chunk and expected file is read only as
+far as needed, so memory usage does not depend on output size and mismatch is
+known as soon as the first differing byte is written.
+
+* ``exact`` - output must be the same, except for leading and trailing
+  whitespace,
+* ``tokens`` - output must consist of the same tokens (separated by any
+  whitespace),
+* ``numeric`` - as ``tokens``, but numbers may differ by given absolute or
+  relative error. Blocks of tokens written exactly as expected are not
+  parsed at all. If ``numpy`` is installed, other blocks are converted to
+  arrays in a single call per block and compared at once; parsing then
+  dominates (about 0.3us per number, a bit faster than parsing the raw
+  buffer with ``numpy.fromstring`` or ``numpy.loadtxt``).
+"""
+import itertools
+import re
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+CHUNK_SIZE = 64 * 1024
+SNIPPET_SIZE = 32
+WHITESPACE = b' \t\n\r\x0b\x0c'
+TOKEN = re.compile(br'[^ \t\n\r\x0b\x0c]+')
+
+# blocks shorter than that are compared without numpy
+NUMPY_MIN_TOKENS = 64
+
+NAN = float('nan')
+
+
+class Mismatch(object):
+    """
+    Describes first difference between output and expected output. Position
+    (``offset``, ``line`` and ``column``) is given for expected output file.
+    """
+
+    def __init__(self, offset, line, column, output, expected):
+        self.offset = offset
+        self.line = line
+        self.column = column
+        self.output = output
+        self.expected = expected
+
+    def __str__(self):
+        return 'line %d, column %d (byte %d): got %r but expected %r' % (
+            self.line, self.column, self.offset, self.output, self.expected)
+
+
+class Stripper(object):
+    """
+    Strips leading and trailing whitespace of a stream fed chunk by chunk.
+    Whitespace is held back until it is followed by some other character, so
+    trailing whitespace is never emitted.
+    """
+
+    def __init__(self):
+        self.started = False
+        self.pending = b''
+        self.skipped = b''
+
+    def feed(self, chunk):
+        if not self.started:
+            stripped = chunk.lstrip(WHITESPACE)
+            if not stripped:
+                self.skipped += chunk
+                return b''
+            self.skipped += chunk[:len(chunk) - len(stripped)]
+            self.started = True
+            chunk = stripped
+        data = self.pending + chunk
+        content = data.rstrip(WHITESPACE)
+        self.pending = data[len(content):]
+        return content
+
+
+class Position(object):
+    """
+    Tracks offset, line and column within a stream.
+    """
+
+    def __init__(self):
+        self.offset = 0
+        self.line = 1
+        self.column = 1
+
+    def advance(self, data):
+        self.offset += len(data)
+        newlines = data.count(b'\n')
+        if newlines:
+            self.line += newlines
+            self.column = len(data) - data.rfind(b'\n')
+        else:
+            self.column += len(data)
+
+
+class ExactComparator(object):
+    """
+    Checks if output is same as expected one, ignoring leading and trailing
+    whitespace.
+    """
+
+    def __init__(self, expected, chunk_size=CHUNK_SIZE):
+        self.expected = expected
+        self.chunk_size = chunk_size
+        self.output_stripper = Stripper()
+        self.expected_stripper = Stripper()
+        self.expected_buffer = b''
+        self.expected_exhausted = False
+        self.position = None
+        self.mismatch = None
+
+    @property
+    def failed(self):
+        return self.mismatch is not None
+
+    def read_expected(self):
+        """
+        Reads more of the expected output into the buffer. Returns ``False``
+        if there is nothing more to read.
+        """
+        while not self.expected_buffer and not self.expected_exhausted:
+            chunk = self.expected.read(self.chunk_size)
+            if not chunk:
+                self.expected_exhausted = True
+                break
+            self.expected_buffer = self.expected_stripper.feed(chunk)
+        if self.position is None and self.expected_stripper.started:
+            self.position = Position()
+            self.position.advance(self.expected_stripper.skipped)
+        return bool(self.expected_buffer)
+
+    def fail(self, output):
+        if self.position is None:
+            self.position = Position()
+            self.position.advance(self.expected_stripper.skipped)
+        self.mismatch = Mismatch(self.position.offset, self.position.line,
+            self.position.column, output[:SNIPPET_SIZE],
+            self.expected_buffer[:SNIPPET_SIZE])
+
+    def feed(self, chunk):
+        """
+        Compares next ``chunk`` of the output. Returns ``False`` once the
+        output is known to differ from expected.
+        """
+        if self.failed:
+            return False
+        data = self.output_stripper.feed(chunk)
+        while data:
+            if not self.read_expected():
+                self.fail(data)
+                return False
+            size = min(len(data), len(self.expected_buffer))
+            if data[:size] != self.expected_buffer[:size]:
+                index = 0
+                while data[index] == self.expected_buffer[index]:
+                    index += 1
+                self.position.advance(data[:index])
+                self.expected_buffer = self.expected_buffer[index:]
+                self.fail(data[index:])
+                return False
+            self.position.advance(data[:size])
+            data = data[size:]
+            self.expected_buffer = self.expected_buffer[size:]
+        return True
+
+    def finish(self):
+        """
+        Should be called once whole output was fed. Returns ``True`` if output
+        is same as expected.
+        """
+        if self.failed:
+            return False
+        if self.read_expected():
+            self.fail(b'')
+            return False
+        return True
+
+
+def to_float(token):
+    try:
+        return float(token)
+    except ValueError:
+        return NAN
+
+
+def parse_floats(tokens):
+    """
+    Returns numpy array of ``tokens`` converted to floats. Tokens are parsed
+    at once; only if some of them are not numbers, they are parsed one by one
+    and these become NaN.
+    """
+    try:
+        return numpy.array(tokens, dtype=numpy.float64)
+    except ValueError:
+        return numpy.fromiter(map(to_float, tokens), numpy.float64,
+            len(tokens))
+
+
+def split_tokens(data, final=False):
+    """
+    Returns ``(tokens, rest)`` - complete tokens of ``data`` and its tail,
+    which may be a beginning of a token continued in the next chunk (unless
+    it is the ``final`` chunk).
+    """
+    tokens = data.split()
+    if final or not tokens or data[-1:] in WHITESPACE:
+        return tokens, b''
+    rest = tokens.pop()
+    return tokens, data[len(data) - len(rest):]
+
+
+class TokenComparator(object):
+    """
+    Checks if output consists of the same tokens as expected one. Expected
+    output is read in blocks, position of a mismatch is found only once it
+    happens.
+    """
+
+    def __init__(self, expected, chunk_size=CHUNK_SIZE):
+        self.expected = expected
+        self.chunk_size = chunk_size
+        self.output_rest = b''
+        self.expected_rest = b''
+        self.expected_exhausted = False
+        # current block of expected output, its tokens and position
+        self.block = b''
+        self.tokens = []
+        self.index = 0
+        self.block_position = Position()
+        self.mismatch = None
+
+    @property
+    def failed(self):
+        return self.mismatch is not None
+
+    def read_expected(self):
+        """
+        Reads next block of expected tokens. Returns ``False`` if there is
+        nothing more to read.
+        """
+        while self.index == len(self.tokens):
+            if self.expected_exhausted:
+                return False
+            chunk = self.expected.read(self.chunk_size)
+            if not chunk:
+                self.expected_exhausted = True
+            data = self.expected_rest + chunk
+            tokens, self.expected_rest = split_tokens(data, not chunk)
+            self.block_position.advance(self.block)
+            self.block = data[:len(data) - len(self.expected_rest)]
+            self.tokens = tokens
+            self.index = 0
+        return True
+
+    def find_mismatch(self, output, expected):
+        """
+        Returns index of the first token of ``output`` which does not match
+        token of ``expected`` (lists of the same length) or ``None``.
+        """
+        if output == expected:
+            return None
+        for index, (token, expected_token) in enumerate(zip(output,
+                expected)):
+            if token != expected_token:
+                return index
+
+    def fail(self, output):
+        position = Position()
+        position.offset = self.block_position.offset
+        position.line = self.block_position.line
+        position.column = self.block_position.column
+        expected = b''
+        match = next(itertools.islice(TOKEN.finditer(self.block), self.index,
+            None), None)
+        if match is not None:
+            position.advance(self.block[:match.start()])
+            expected = match.group()
+        else:
+            position.advance(self.block)
+        self.mismatch = Mismatch(position.offset, position.line,
+            position.column, output[:SNIPPET_SIZE], expected[:SNIPPET_SIZE])
+
+    def compare(self, tokens):
+        start = 0
+        while start < len(tokens):
+            if not self.read_expected():
+                self.fail(tokens[start])
+                return False
+            size = min(len(tokens) - start, len(self.tokens) - self.index)
+            index = self.find_mismatch(tokens[start:start + size],
+                self.tokens[self.index:self.index + size])
+            if index is not None:
+                self.index += index
+                self.fail(tokens[start + index])
+                return False
+            start += size
+            self.index += size
+        return True
+
+    def feed(self, chunk):
+        if self.failed:
+            return False
+        tokens, self.output_rest = split_tokens(self.output_rest + chunk)
+        return self.compare(tokens)
+
+    def finish(self):
+        if self.failed:
+            return False
+        tokens, self.output_rest = split_tokens(self.output_rest, final=True)
+        if not self.compare(tokens):
+            return False
+        if self.read_expected():
+            self.fail(b'')
+            return False
+        return True
+
+
+class NumericComparator(TokenComparator):
+    """
+    Same as ``TokenComparator``, but tokens which are numbers match if they
+    differ by at most ``absolute`` or at most ``relative`` error (relative to
+    the expected number).
+    """
+
+    def __init__(self, expected, chunk_size=CHUNK_SIZE, absolute=1e-6,
+            relative=1e-6):
+        super(NumericComparator, self).__init__(expected, chunk_size)
+        self.absolute = absolute
+        self.relative = relative
+
+    def is_close(self, token, expected):
+        if token == expected:
+            return True
+        try:
+            value = float(token)
+            expected_value = float(expected)
+        except ValueError:
+            return False
+        return abs(value - expected_value) <= max(self.absolute,
+            self.relative * abs(expected_value))
+
+    def find_mismatch(self, output, expected):
+        if output == expected:
+            return None
+        if numpy is not None and len(output) >= NUMPY_MIN_TOKENS:
+            candidates = self.get_candidates(output, expected)
+        else:
+            candidates = range(len(output))
+        for index in candidates:
+            if not self.is_close(output[index], expected[index]):
+                return index
+
+    def get_candidates(self, output, expected):
+        """
+        Returns indexes of tokens which numpy considers different. They are
+        checked once again one by one, as i.e. equal infinities or words
+        (which are NaN) are not close for numpy.
+        """
+        values = parse_floats(output)
+        expected_values = parse_floats(expected)
+        with numpy.errstate(invalid='ignore'):
+            close = numpy.abs(values - expected_values) <= numpy.maximum(
+                self.absolute, self.relative * numpy.abs(expected_values))
+        return numpy.flatnonzero(~close).tolist()
+
+
+COMPARATORS = {
+    'exact': ExactComparator,
+    'tokens': TokenComparator,
+    'numeric': NumericComparator,
+}
@@ -0,0 +1,173 @@
+"""
+Content addressed cache of compiled solutions.
+
+Artifacts are stored under a key computed from the source file contents,
+compiler command and compiler version, so unchanged solutions are never
+compiled twice. Cache size is bounded - least recently used entries are
+evicted first.
+"""
+import glob
+import os
+import shlex
+import shutil
+import subprocess
+import tempfile
+import time
+from porunga.utils.hashing import file_digest
+from porunga.utils.hashing import text_digest
+from porunga.utils.paths import get_cache_dir
+from porunga.utils.paths import joinpath
+
+
+DEFAULT_MAX_SIZE = 512 * 1024 * 1024
+
+# entries being stored, never evicted
+TMP_SUFFIX = '.tmp'
+
+# entries being stored for longer than that (in seconds) were left behind by
+# crashed runs and are removed
+TMP_GRACE_PERIOD = 60 * 60
+
+_compiler_versions = {}
+
+
+def get_compiler_version(program):
+    """
+    Returns version information of the compiler used by ``program`` command
+    (empty string if it cannot be found).
+    """
+    compiler = shlex.split(program)[0]
+    if compiler not in _compiler_versions:
+        version = ''
+        for flag in ('--version', '-version'):
+            try:
+                proc = subprocess.Popen([compiler, flag],
+                    stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+            except OSError:
+                break
+            out = proc.communicate()[0]
+            if proc.returncode == 0:
+                version = out.decode('utf-8', 'replace').strip()
+                break
+        _compiler_versions[compiler] = version
+    return _compiler_versions[compiler]
+
+
+class CompileCache(object):
+
+    def __init__(self, directory=None, max_size=DEFAULT_MAX_SIZE):
+        self.directory = directory or get_cache_dir('compile')
+        self.max_size = max_size
+
+    def get_key(self, source, program):
+        """
+        Returns cache key for given ``source`` file compiled with ``program``
+        command or ``None`` if source cannot be read.
+        """
+        try:
+            digest = file_digest(source)
+        except (IOError, OSError):
+            return None
+        return text_digest(digest, program, get_compiler_version(program))
+
+    def get_entry_path(self, key):
+        return joinpath(self.directory, key)
+
+    def restore(self, key, dirname):
+        """
+        Copies artifacts stored under ``key`` into ``dirname``. Returns
+        ``True`` on cache hit and ``False`` otherwise.
+        """
+        entry = self.get_entry_path(key)
+        try:
+            filenames = os.listdir(entry)
+        except OSError:
+            return False
+        if not filenames:
+            return False
+        try:
+            for filename in filenames:
+                shutil.copy2(joinpath(entry, filename),
+                    joinpath(dirname, filename))
+            os.utime(entry, None)
+        except (IOError, OSError):
+            return False
+        return True
+
+    def store(self, key, patterns):
+        """
+        Stores files matching given glob ``patterns`` under ``key`` and evicts
+        old entries if cache grew too big. Errors are silently ignored, cache
+        is only an optimization.
+        """
+        entry = self.get_entry_path(key)
+        try:
+            if not os.path.isdir(self.directory):
+                os.makedirs(self.directory)
+            # unique per call, entry may be stored by many threads at once
+            tmp = tempfile.mkdtemp(prefix=key + '-', suffix=TMP_SUFFIX,
+                dir=os.path.dirname(entry))
+        except OSError:
+            return
+        try:
+            for pattern in patterns:
+                for path in glob.glob(pattern):
+                    shutil.copy2(path, tmp)
+            if os.path.isdir(entry):
+                shutil.rmtree(entry)
+            os.rename(tmp, entry)
+        except (IOError, OSError):
+            shutil.rmtree(tmp, ignore_errors=True)
+            return
+        self.evict()
+
+    def get_entries(self):
+        """
+        Returns list of ``(last_used, size, path)`` of all cache entries,
+        except those being stored.
+        """
+        entries = []
+        try:
+            names = os.listdir(self.directory)
+        except OSError:
+            return entries
+        for name in names:
+            if name.endswith(TMP_SUFFIX):
+                continue
+            path = joinpath(self.directory, name)
+            try:
+                size = sum(os.path.getsize(joinpath(path, filename))
+                    for filename in os.listdir(path))
+                entries.append((os.path.getmtime(path), size, path))
+            except OSError:
+                continue
+        return entries
+
+    def remove_stale(self):
+        """
+        Removes entries left behind by runs which crashed while storing them.
+        """
+        try:
+            names = os.listdir(self.directory)
+        except OSError:
+            return
+        deadline = time.time() - TMP_GRACE_PERIOD
+        for name in names:
+            if not name.endswith(TMP_SUFFIX):
+                continue
+            path = joinpath(self.directory, name)
+            try:
+                if os.path.getmtime(path) < deadline:
+                    shutil.rmtree(path)
+            except OSError:
+                continue
+
+    def evict(self):
+        self.remove_stale()
+        entries = sorted(self.get_entries())
+        total = sum(size for used, size, path in entries)
+        for used, size, path in entries:
+            if total <= self.max_size:
+                break
+            shutil.rmtree(path, ignore_errors=True)
+            total -= size
@@ -0,0 +1,64 @@
+"""
+Per-problem configuration, kept in ``porunga.cfg`` file of the problem::
+
+    [problem]
+    comparator = numeric
+    absolute_error = 1e-6
+    relative_error = 1e-6
+    time_limit = 1.5
+
+``time_limit`` is given in seconds of the reference machine, it is scaled to
+the host tests are run on (see ``porunga.calibration``).
+
+Command line options take precedence over the configuration.
+"""
+import os
+from configparser import ConfigParser
+from configparser import Error as ParserError
+from porunga.utils.paths import joinpath
+
+
+CONFIG_FILENAME = 'porunga.cfg'
+SECTION = 'problem'
+
+OPTIONS = {
+    'comparator': str,
+    'absolute_error': float,
+    'relative_error': float,
+    'time_limit': float,
+}
+
+
+class ConfigError(Exception):
+    pass
+
+
+def get_config_path(dirname):
+    return joinpath(dirname, CONFIG_FILENAME)
+
+
+def load_config(dirname):
+    """
+    Returns dictionary of options set in problem's configuration (empty if
+    there is none). Raises ``ConfigError`` if the file is invalid.
+    """
+    path = get_config_path(dirname)
+    if not os.path.isfile(path):
+        return {}
+    parser = ConfigParser()
+    try:
+        parser.read(path)
+    except ParserError as err:
+        raise ConfigError('Could not parse %s: %s' % (path, err))
+    if not parser.has_section(SECTION):
+        return {}
+    config = {}
+    for name, value in parser.items(SECTION):
+        if name not in OPTIONS:
+            raise ConfigError('Unknown option %r in %s' % (name, path))
+        try:
+            config[name] = OPTIONS[name](value)
+        except ValueError:
+            raise ConfigError('Invalid value of %r in %s: %r' % (name, path,
+                value))
+    return config
@@ -0,0 +1,328 @@
+"""
+Test data kept in compressed files and archives.
+
+Inputs and outputs may be compressed (``test01.in.gz``, ``.xz``, ``.bz2`` and,
+if ``zstandard`` package is installed, ``.zst``) and may be kept within
+``testdata.zip`` or ``testdata.tar`` (possibly compressed) archive next to
+``testdata/`` directory. Archive members are referred to by paths within
+the archive, i.e. ``foobar/testdata.zip/test01.in``.
+
+Files are not extracted - ``open_test_file`` returns a stream which
+decompresses data as it is read; members of uncompressed tar archives are
+read in place. The exception are members of compressed tar archives, which
+can only be read in order: once any member is needed all of them are
+extracted in a single pass to a temporary directory, removed when the
+archive is closed (at exit at the latest). Use zip (or tar of compressed
+files) to keep huge test data off disk.
+"""
+import atexit
+import bz2
+import gzip
+import io
+import lzma
+import mmap
+import os
+import shutil
+import tarfile
+import tempfile
+import threading
+import zipfile
+from porunga.discovery import COMPRESSION_SUFFIXES
+from porunga.discovery import INPUT_SUFFIXES
+from porunga.discovery import natural_key
+from porunga.utils.paths import joinpath
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+ARCHIVE_NAME = 'testdata'
+
+ZIP_SUFFIXES = ('.zip',)
+TAR_SUFFIXES = ('.tar', '.tar.gz', '.tgz', '.tar.xz', '.tar.bz2')
+
+_archives = {}
+_archives_lock = threading.Lock()
+
+
+def open_zstd(fileobj):
+    if zstandard is None:
+        raise IOError('zstandard package is required to read .zst files')
+    return zstandard.ZstdDecompressor().stream_reader(fileobj,
+        closefd=True)
+
+
+DECOMPRESSORS = {
+    '.gz': lambda fileobj: gzip.GzipFile(fileobj=fileobj),
+    '.xz': lambda fileobj: lzma.LZMAFile(fileobj),
+    '.bz2': lambda fileobj: bz2.BZ2File(fileobj),
+    '.zst': open_zstd,
+}
+
+
+def split_compression(path):
+    """
+    Returns ``(path, suffix)`` where ``suffix`` is compression suffix of
+    ``path`` (or empty string if it is not compressed) and ``path`` is
+    stripped of it.
+    """
+    base, suffix = os.path.splitext(path)
+    if suffix in COMPRESSION_SUFFIXES:
+        return base, suffix
+    return path, ''
+
+
+class ZipArchive(object):
+
+    def __init__(self, path):
+        self.path = path
+        self.zipfile = zipfile.ZipFile(path)
+        self.names = [info.filename for info in self.zipfile.infolist()
+                      if not info.filename.endswith('/')]
+
+    def open(self, member):
+        return self.zipfile.open(member)
+
+    def close(self):
+        self.zipfile.close()
+
+
+class MemberStream(io.RawIOBase):
+    """
+    Readable stream of ``size`` bytes of ``afile`` starting at ``offset``.
+    File is closed once the stream is closed.
+    """
+
+    def __init__(self, afile, offset, size):
+        self.afile = afile
+        self.afile.seek(offset)
+        self.remaining = size
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        data = self.afile.read(min(len(buffer), self.remaining))
+        self.remaining -= len(data)
+        buffer[:len(data)] = data
+        return len(data)
+
+    def close(self):
+        self.afile.close()
+        super(MemberStream, self).close()
+
+
+class TarArchive(object):
+
+    def __init__(self, path):
+        self.path = path
+        self.compressed = not path.endswith('.tar')
+        self.tarfile = tarfile.open(path)
+        self.members = dict((info.name, info) for info in self.tarfile
+                            if info.isfile())
+        self.names = list(self.members)
+        self.directory = None
+        self.paths = {}
+        self.lock = threading.Lock()
+
+    def extract(self):
+        """
+        Extracts all members, in order they are kept in the archive, unless
+        it has already been done.
+        """
+        with self.lock:
+            if self.directory is not None:
+                return
+            directory = tempfile.mkdtemp(prefix='porunga-tar-')
+            paths = {}
+            try:
+                for index, info in enumerate(self.tarfile.getmembers()):
+                    if not info.isfile():
+                        continue
+                    # members are not trusted, their names are never used
+                    paths[info.name] = joinpath(directory, str(index))
+                    source = self.tarfile.extractfile(info)
+                    with open(paths[info.name], 'wb') as target:
+                        shutil.copyfileobj(source, target)
+            except (IOError, OSError, tarfile.TarError) as err:
+                shutil.rmtree(directory, ignore_errors=True)
+                raise IOError('Could not extract %r: %s' % (self.path, err))
+            self.tarfile.close()
+            self.directory = directory
+            self.paths = paths
+
+    def open(self, member):
+        info = self.members[member]
+        if self.compressed:
+            self.extract()
+            return open(self.paths[member], 'rb')
+        if info.issparse():
+            raise IOError('Sparse member %r of %r is not supported' % (
+                member, self.path))
+        # each member gets its own file, so it can be read from any thread
+        return MemberStream(open(self.path, 'rb'), info.offset_data,
+            info.size)
+
+    def close(self):
+        with self.lock:
+            self.tarfile.close()
+            if self.directory is not None:
+                shutil.rmtree(self.directory, ignore_errors=True)
+                self.directory = None
+
+
+def get_archive(path):
+    """
+    Returns (cached) ``ZipArchive`` or ``TarArchive`` for given path or
+    ``None`` if it is not a supported archive. Archives cached for previous
+    versions of the file are closed.
+    """
+    if path.endswith(ZIP_SUFFIXES):
+        cls = ZipArchive
+    elif path.endswith(TAR_SUFFIXES):
+        cls = TarArchive
+    else:
+        return None
+    key = (path, os.stat(path).st_mtime_ns)
+    with _archives_lock:
+        if key not in _archives:
+            for stale in [each for each in _archives if each[0] == path]:
+                _archives.pop(stale).close()
+            _archives[key] = cls(path)
+        return _archives[key]
+
+
+@atexit.register
+def close_archives():
+    """
+    Closes all cached archives.
+    """
+    with _archives_lock:
+        while _archives:
+            _archives.popitem()[1].close()
+
+
+def find_archive(path):
+    """
+    Returns ``(archive, member)`` if ``path`` points to a member of an
+    archive or ``(None, None)`` otherwise.
+    """
+    head, member = os.path.split(path)
+    while head and head != os.path.dirname(head):
+        if os.path.isfile(head):
+            archive = get_archive(head)
+            if archive is None:
+                break
+            return archive, member
+        head, tail = os.path.split(head)
+        member = '%s/%s' % (tail, member)
+    return None, None
+
+
+def is_plain(path):
+    """
+    Tells if ``path`` is a regular, uncompressed file, which can be given to
+    a program as is.
+    """
+    return not split_compression(path)[1] and os.path.isfile(path)
+
+
+def exists(path):
+    if os.path.isfile(path):
+        return True
+    archive, member = find_archive(path)
+    return archive is not None and member in archive.names
+
+
+def preload(path):
+    """
+    Asks the kernel to read file at ``path`` into page cache in background,
+    so the test does not wait for the disk. Archive members (and systems
+    without ``posix_fadvise``) are skipped, errors are ignored.
+    """
+    if not hasattr(os, 'posix_fadvise') or not os.path.isfile(path):
+        return
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_WILLNEED)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+def open_raw(path):
+    if os.path.isfile(path):
+        return open(path, 'rb')
+    archive, member = find_archive(path)
+    if archive is None:
+        raise IOError('No such file: %r' % path)
+    try:
+        return archive.open(member)
+    except KeyError:
+        raise IOError('No such member of %r: %r' % (archive.path, member))
+
+
+def open_mapped(path):
+    """
+    Returns memory map of a regular file (map has file-like ``read``).
+    """
+    with open(path, 'rb') as afile:
+        try:
+            return mmap.mmap(afile.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            # empty files can not be mapped
+            return io.BytesIO(b'')
+
+
+def open_test_file(path):
+    """
+    Returns binary stream for reading test file - memory mapped regular
+    file, decompressing stream or stream of archive's member.
+    """
+    if is_plain(path):
+        return open_mapped(path)
+    base, compression = split_compression(path)
+    stream = open_raw(path)
+    if not compression:
+        return stream
+    try:
+        return DECOMPRESSORS[compression](stream)
+    except Exception:
+        stream.close()
+        raise
+
+
+def get_archive_paths(dirname):
+    """
+    Returns paths of test data archives of the problem.
+    """
+    names = [ARCHIVE_NAME + suffix for suffix in ZIP_SUFFIXES + TAR_SUFFIXES]
+    return [joinpath(dirname, name) for name in names
+            if os.path.isfile(joinpath(dirname, name))]
+
+
+def iter_archive_inputs(dirname, recursive=False):
+    """
+    Yields paths of test inputs kept within problem's archives, in natural
+    order. Unless ``recursive``, only members kept at the top of archive (or
+    within its ``testdata/`` directory) are considered.
+    """
+    for path in get_archive_paths(dirname):
+        archive = get_archive(path)
+        names = []
+        for name in archive.names:
+            if not name.endswith(INPUT_SUFFIXES):
+                continue
+            relative = name
+            if relative.startswith(ARCHIVE_NAME + '/'):
+                relative = relative[len(ARCHIVE_NAME) + 1:]
+            if recursive or '/' not in relative:
+                names.append(name)
+        for name in sorted(names, key=natural_key):
+            yield '%s/%s' % (path, name)
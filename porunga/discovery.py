@@ -0,0 +1,121 @@
+"""
+Discovery of test cases.
+
+Test inputs (``*.in`` and ``*.IN`` files, possibly compressed) are found with
+``os.scandir`` and yielded lazily, directory by directory, so tests may be
+run before the whole tree is walked. Within a directory inputs are yielded
+in natural order (``test2.in`` before ``test10.in``), subdirectories are
+visited afterwards (in the same order).
+
+Listings of directories may be kept in a ``DirectoryIndex``; a directory is
+scanned again only if its modification time has changed.
+"""
+import json
+import os
+import re
+import tempfile
+from porunga.utils.hashing import text_digest
+from porunga.utils.paths import joinpath
+
+
+COMPRESSION_SUFFIXES = ('.gz', '.xz', '.bz2', '.zst')
+
+INPUT_SUFFIXES = tuple(suffix + compression for suffix in ('.in', '.IN')
+                       for compression in ('',) + COMPRESSION_SUFFIXES)
+
+_digits = re.compile(r'(\d+)')
+
+
+def natural_key(name):
+    """
+    Returns sort key for ``name`` under which numbers within names are
+    compared by their values.
+    """
+    parts = _digits.split(name)
+    parts[1::2] = [int(part) for part in parts[1::2]]
+    return parts
+
+
+def scan_directory(path):
+    """
+    Returns ``(inputs, subdirs)`` - names of test inputs and subdirectories
+    of ``path``, both in natural order.
+    """
+    inputs = []
+    subdirs = []
+    for entry in os.scandir(path):
+        if entry.is_dir():
+            subdirs.append(entry.name)
+        elif entry.name.endswith(INPUT_SUFFIXES) and entry.is_file():
+            inputs.append(entry.name)
+    inputs.sort(key=natural_key)
+    subdirs.sort(key=natural_key)
+    return inputs, subdirs
+
+
+class DirectoryIndex(object):
+    """
+    Persistent listings of directories within the ``root`` test data
+    directory, kept in a JSON file within ``cachedir``.
+    """
+
+    def __init__(self, cachedir, root):
+        self.path = joinpath(cachedir, '%s.json' % text_digest(
+            os.path.abspath(root), *INPUT_SUFFIXES))
+        self.changed = False
+        try:
+            with open(self.path) as afile:
+                self.listings = json.load(afile)
+        except (IOError, OSError, ValueError):
+            self.listings = {}
+
+    def list_directory(self, path):
+        """
+        Same as ``scan_directory`` but uses listing from the index if
+        directory was not modified since it was indexed.
+        """
+        mtime = os.stat(path).st_mtime_ns
+        listing = self.listings.get(path)
+        if listing is not None and listing[0] == mtime:
+            return listing[1], listing[2]
+        inputs, subdirs = scan_directory(path)
+        self.listings[path] = [mtime, inputs, subdirs]
+        self.changed = True
+        return inputs, subdirs
+
+    def save(self):
+        if not self.changed:
+            return
+        dirname = os.path.dirname(self.path)
+        try:
+            if not os.path.isdir(dirname):
+                os.makedirs(dirname)
+            fd, temppath = tempfile.mkstemp(dir=dirname, suffix='.tmp')
+            with os.fdopen(fd, 'w') as afile:
+                json.dump(self.listings, afile)
+            os.rename(temppath, self.path)
+        except (IOError, OSError):
+            return
+        self.changed = False
+
+
+def iter_test_inputs(testdir, recursive=False, index=None):
+    """
+    Yields paths of test inputs within ``testdir`` (and, if ``recursive``,
+    its subdirectories). Once all directories are walked ``index`` (if
+    given) is saved.
+    """
+    list_directory = index.list_directory if index else scan_directory
+    pending = [testdir]
+    while pending:
+        path = pending.pop()
+        try:
+            inputs, subdirs = list_directory(path)
+        except OSError:
+            continue
+        for name in inputs:
+            yield joinpath(path, name)
+        if recursive:
+            pending.extend(joinpath(path, name) for name in reversed(subdirs))
+    if index is not None:
+        index.save()
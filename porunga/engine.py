@@ -0,0 +1,1245 @@
+"""
+Compilation, discovery and execution of test suites.
+
+``Engine`` compiles solutions (through the compilation cache), discovers test
+cases of problems and runs them, sequentially, on a thread pool or on an
+``asyncio`` event loop. It prints nothing: messages go to hooks (``info``,
+``report_test`` and alike) which do nothing here, and fatal errors raise
+``EngineError``. ``porunga test`` (and commands built on it) overrides them
+to print to the terminal and exit, ``porunga.runner`` uses the engine as is.
+
+Options are read from ``namespace`` - the one of ``porunga test``.
+"""
+import asyncio
+import collections
+import itertools
+import multiprocessing
+import os
+import shlex
+import shutil
+import sqlite3
+import tempfile
+import threading
+from porunga import containers
+from porunga import limits
+from porunga import pinning
+from porunga import procme
+from porunga import scheduling
+from porunga.aioprocme import AsyncCommand
+from porunga.calibration import Calibration
+from porunga.calibration import CalibrationCache
+from porunga.calibration import EMPTY_PROGRAMS
+from porunga.calibration import measure_cpu
+from porunga.calibration import measure_startup
+from porunga.comparators import COMPARATORS
+from porunga.compilecache import get_compiler_version
+from porunga.config import ConfigError
+from porunga.config import load_config
+from porunga.discovery import DirectoryIndex
+from porunga.discovery import iter_test_inputs
+from porunga.forkserver import ForkServer
+from porunga.forkserver import ForkServerCommand
+from porunga.history import History
+from porunga.history import find_regressions
+from porunga.history import get_history_path
+from porunga.pch import HeaderCache
+from porunga.pch import get_first_include
+from porunga.profiling import PROFILE_DIRNAME
+from porunga.profiling import PROFILERS
+from porunga.reports import open_report
+from porunga.utils.hashing import file_digest
+from porunga.utils.paths import joinpath
+from porunga.utils.paths import abspath
+from porunga.utils.paths import get_cache_dir
+from porunga.verdicts import VERDICT_MEMORY_LIMIT
+from porunga.verdicts import VERDICT_NO_OUTPUT_FILE
+from porunga.verdicts import VERDICT_OK
+from porunga.verdicts import VERDICT_RUNTIME_ERROR
+from porunga.verdicts import VERDICT_TIMEOUT
+from porunga.verdicts import VERDICT_WRONG_ANSWER
+from concurrent.futures import ThreadPoolExecutor
+from shlex import quote
+from subprocess import Popen, PIPE
+
+
+LANGUAGES = {
+    'python': {
+        'fout': '{name}.py',
+        'prog': 'python {fout}',
+        'profiler': 'cprofile',
+    },
+    'ruby': {
+        'fout': '{name}.rb',
+        'prog': 'ruby {fout}',
+    },
+    'java': {
+        'fin': '{name}.java',
+        'fout': '{simplename}',
+        'prog': 'java -cp {dirname} {fout}',
+        'compiler': 'javac {fin}',
+        'artifacts': ['{name}.class', '{name}$*.class'],
+    },
+    'objc': {
+        'fin': '{name}.m',
+        'fout': '{name}.m.out',
+        'prog': '{fout}',
+        'compiler': 'clang -ObjC -framework Foundation {fin} -o {fout}',
+        'artifacts': ['{fout}'],
+    },
+    'c': {
+        'fin': '{name}.c',
+        'fout': '{name}.c.out',
+        'prog': '{fout}',
+        'compiler': 'gcc -O2 {fin} -o {fout}',
+        'header_language': 'c-header',
+        'artifacts': ['{fout}'],
+        'profiler': 'gprof',
+        'profile_flags': '-pg',
+    },
+    'cpp': {
+        'fin': '{name}.cpp',
+        'fout': '{name}.cpp.out',
+        'prog': '{fout}',
+        'compiler': 'g++ -O2 {fin} -o {fout}',
+        'header_language': 'c++-header',
+        'artifacts': ['{fout}'],
+        'profiler': 'gprof',
+        'profile_flags': '-pg',
+    },
+}
+
+DEFAULT_LANGUAGE = 'python'
+
+# in --cpu-time mode, process is killed after running for that many times
+# its time limit (i.e. if it is blocked and uses no CPU at all)
+CPU_TIME_WALL_FACTOR = 2
+
+# only that much of the output is kept in memory (for verbose reports)
+OUTPUT_PREVIEW_SIZE = 4 * 1024
+
+# how many test cases (or builds) are submitted to their pool per worker;
+# the rest waits until some of them finish
+WINDOW_FACTOR = 2
+
+def curdir():
+    return os.path.curdir
+
+def decode(data):
+    return data.decode('utf-8', 'replace')
+
+def format_size(size):
+    return '%.1fMB' % (size / (1024.0 * 1024))
+
+def add_preview(preview, chunk):
+    """
+    Returns output ``preview`` extended with ``chunk``, up to
+    ``OUTPUT_PREVIEW_SIZE`` bytes.
+    """
+    if len(preview) < OUTPUT_PREVIEW_SIZE:
+        preview += chunk[:OUTPUT_PREVIEW_SIZE - len(preview)]
+    return preview
+
+def cpu_count():
+    try:
+        return multiprocessing.cpu_count()
+    except NotImplementedError:
+        return 1
+
+
+class EngineError(Exception):
+    pass
+
+
+class Engine(object):
+    languages = LANGUAGES
+    default_language = DEFAULT_LANGUAGE
+    namespace = None
+    cache_status = None
+    fork_server = None
+    reports = ()
+    suite = None
+    profiler = None
+    problem = None
+    configs = None
+    cpu_pool = None
+    affinity = None
+    calibrations = None
+    calibration_cpu = None
+    calibration_lock = threading.Lock()
+
+    def prepare_suite(self, dirname):
+        """
+        Opens reports, compiles the solution of the problem in ``dirname``
+        and starts discovering its test cases (see ``compile_and_discover``).
+        Returns ``(binary, cases)`` where ``binary`` is a list of arguments.
+        """
+        lang = self.namespace.lang
+        self.open_reports()
+        started = procme.monotonic()
+        binary, compiled, cases = self.compile_and_discover(dirname, lang)
+        self.suite = {
+            'name': dirname,
+            'lang': lang,
+            'binary': binary,
+            'started': started,
+            'compile': (started, compiled),
+        }
+        return self.get_binary_argv(dirname, lang), cases
+
+    def start_suite(self, dirname, binary, cases):
+        """
+        Pins tests to CPUs and starts the profiler and the fork server, as
+        asked to. Returns ``cases`` in the order they should be run. Caller
+        has to call ``stop_suite`` once the suite is run.
+        """
+        self.start_pinning()
+        if getattr(self.namespace, 'profile', False):
+            self.start_profiler(dirname, self.namespace.lang)
+        if getattr(self.namespace, 'fork_server', False):
+            self.start_fork_server(dirname, binary)
+        return self.schedule_cases(dirname, cases)
+
+    def stop_suite(self):
+        """
+        Stops the fork server and unpins porunga, if they were started by
+        ``start_suite``.
+        """
+        self.stop_fork_server()
+        self.stop_pinning()
+
+    def compile_and_discover(self, dirname, lang):
+        """
+        Compiles the solution in background while test cases are discovered
+        (and their inputs preloaded). Returns ``(binary, compiled, cases)``
+        as soon as it is compiled, where ``compiled`` is the time it happened;
+        cases not discovered by then are discovered lazily, as tests run.
+        """
+        def compile():
+            binary = self.get_binary(dirname, lang)
+            return binary, procme.monotonic()
+
+        cases = self.get_test_cases(dirname)
+        discovered = []
+        executor = ThreadPoolExecutor(max_workers=1,
+            thread_name_prefix='compiler')
+        try:
+            future = executor.submit(compile)
+            for fin, fout in cases:
+                discovered.append((fin, fout))
+                containers.preload(fin)
+                if future.done():
+                    break
+            binary, compiled = future.result()
+        finally:
+            executor.shutdown()
+        return binary, compiled, itertools.chain(discovered, cases)
+
+    def set_problem(self, dirname):
+        """
+        Sets directory of the tested problem and checks its configuration.
+        """
+        self.problem = dirname
+        try:
+            self.get_problem_config(dirname)
+        except ConfigError as err:
+            self.exit(str(err))
+
+    def get_problem_config(self, dirname):
+        """
+        Returns (cached) configuration of the problem (see
+        ``porunga.config``). Raises ``ConfigError`` if it is invalid.
+        """
+        if self.configs is None:
+            self.configs = {}
+        key = abspath(dirname)
+        if key not in self.configs:
+            config = load_config(dirname)
+            if config.get('comparator', 'exact') not in COMPARATORS:
+                raise ConfigError('Unknown comparator %r (available: %s)' % (
+                    config['comparator'], ', '.join(sorted(COMPARATORS))))
+            if config.get('time_limit', 1.0) <= 0:
+                raise ConfigError('Time limit must be positive (%s)' %
+                    config['time_limit'])
+            self.configs[key] = config
+        return self.configs[key]
+
+    def get_comparator(self, expected, dirname=None):
+        """
+        Returns comparator checking output against ``expected`` stream, as
+        chosen by command line options or configuration of the problem.
+        """
+        dirname = dirname or self.problem
+        config = self.get_problem_config(dirname) if dirname else {}
+
+        def option(name, default):
+            value = getattr(self.namespace, name, None)
+            return config.get(name, default) if value is None else value
+
+        name = option('comparator', 'exact')
+        if name == 'numeric':
+            return COMPARATORS[name](expected,
+                absolute=option('absolute_error', 1e-6),
+                relative=option('relative_error', 1e-6))
+        return COMPARATORS[name](expected)
+
+    def get_timeout(self, dirname=None):
+        """
+        Returns time limit of tests in seconds (``None`` if there is none):
+        either given by ``--timeout`` or problem's ``time_limit`` scaled to
+        speed of this host.
+        """
+        if self.namespace.timeout:
+            return self.namespace.timeout
+        dirname = dirname or self.problem
+        config = self.get_problem_config(dirname) if dirname else {}
+        if 'time_limit' not in config:
+            return None
+        return self.get_calibration(self.namespace.lang).scale(
+            config['time_limit'])
+
+    def get_calibration(self, lang, recalibrate=False):
+        """
+        Returns ``Calibration`` of this host for given language, measured
+        only if it is not cached yet for the installed version of the
+        language (or if asked to ``recalibrate``). Speed of CPU is shared by
+        all languages, so it is measured at most once. Cached calibration is
+        returned without taking the lock, which may be held for seconds while
+        another language is measured.
+        """
+        calibrations = self.calibrations
+        if not recalibrate and calibrations and lang in calibrations:
+            return calibrations[lang]
+        with self.calibration_lock:
+            if self.calibrations is None:
+                self.calibrations = {}
+            if recalibrate or lang not in self.calibrations:
+                cache = CalibrationCache()
+                version = self.get_language_version(lang)
+                calibration = None if recalibrate else cache.get(lang,
+                    version)
+                if calibration is None:
+                    cpu = self.calibration_cpu
+                    if cpu is None and not recalibrate:
+                        cpu = cache.get_cpu()
+                    calibration = self.measure_calibration(lang, cpu)
+                    calibration.version = version
+                    self.calibration_cpu = calibration.cpu
+                    try:
+                        cache.store(calibration)
+                    except (IOError, OSError) as err:
+                        self.error("Could not store calibration: %s" % err)
+                self.calibrations[lang] = calibration
+            return self.calibrations[lang]
+
+    def get_language_version(self, lang):
+        """
+        Returns versions of interpreter and compiler of given language (empty
+        string if they cannot be found).
+        """
+        info = LANGUAGES[lang]
+        programs = [info['prog'], info.get('compiler', '')]
+        return '\n'.join(get_compiler_version(program)
+            for program in programs if program and program[0] != '{')
+
+    def measure_calibration(self, lang, cpu=None):
+        """
+        Measures startup cost of an empty program in given language and speed
+        of CPU (unless it is given).
+        """
+        info = LANGUAGES[lang]
+        tempdir = tempfile.mkdtemp(prefix='porunga-calibration-')
+        try:
+            dirname = joinpath(tempdir, 'calibration')
+            os.mkdir(dirname)
+            data = self.get_binary_data(dirname, info)
+            with open(data['fin'] or data['fout'], 'w') as afile:
+                afile.write(EMPTY_PROGRAMS[lang].format(**data))
+            if 'compiler' in info:
+                # never worth keeping in the compilation cache
+                self.compile(self.get_compiler(info).format(**data))
+            startup = measure_startup(self.get_binary_argv(dirname, lang))
+        except OSError as err:
+            self.exit("Could not calibrate %s: %s" % (lang, err))
+        finally:
+            shutil.rmtree(tempdir, ignore_errors=True)
+        if cpu is None:
+            cpu = measure_cpu()
+        return Calibration(lang, cpu, startup)
+
+    def start_pinning(self):
+        """
+        Prepares pool of CPUs tests are pinned to (with ``--pin``) and moves
+        calling thread to the CPU left for porunga, until ``stop_pinning``.
+        """
+        if not getattr(self.namespace, 'pin', False):
+            return
+        if not pinning.is_supported():
+            self.exit("Pinning is not supported on this system (CPU affinity "
+                "can not be set)")
+        reserved, cpus = pinning.split_cpus(pinning.get_available_cpus())
+        if reserved:
+            # worker threads started later inherit affinity
+            self.affinity = os.sched_getaffinity(0)
+            os.sched_setaffinity(0, reserved)
+            self.info("Tests pinned to CPUs %s, porunga runs on CPU %s" % (
+                ', '.join(map(str, cpus)), reserved[0]))
+        else:
+            self.info("Tests pinned to CPU %s (no CPU left for porunga)"
+                % cpus[0])
+        self.log('')
+        self.cpu_pool = pinning.CpuPool(cpus)
+
+    def stop_pinning(self):
+        """
+        Restores affinity the calling thread had before ``start_pinning``.
+        """
+        self.cpu_pool = None
+        if self.affinity is not None:
+            os.sched_setaffinity(0, self.affinity)
+            self.affinity = None
+
+    def calibrate(self):
+        """
+        Returns timings of calibration loop on CPUs tests are pinned to
+        (empty list if they are not pinned).
+        """
+        if self.cpu_pool is None:
+            return []
+        return pinning.estimate_noise(self.cpu_pool.cpus)
+
+    def open_reports(self):
+        self.reports = []
+        for value in getattr(self.namespace, 'report', None) or []:
+            try:
+                self.reports.append(open_report(value))
+            except (ValueError, IOError, OSError) as err:
+                self.exit("Could not open report: %s" % err)
+
+    def start_profiler(self, dirname, lang):
+        info = LANGUAGES[lang]
+        if 'profiler' not in info:
+            self.exit("Profiling is not supported for %s" % lang)
+        if getattr(self.namespace, 'fork_server', False):
+            self.exit("--profile can not be used together with --fork-server")
+        data = self.get_binary_data(dirname.rstrip('/\\'), info)
+        self.profiler = PROFILERS[info['profiler']](joinpath(dirname,
+            PROFILE_DIRNAME), data['fout'])
+
+    def start_fork_server(self, dirname, binary):
+        if self.namespace.lang != 'python':
+            self.exit("Fork server can be used only for python")
+        self.fork_server = ForkServer(binary[0], self.get_source(dirname,
+            self.namespace.lang))
+        try:
+            self.fork_server.start()
+        except OSError as err:
+            self.exit("Could not start fork server: %s" % err)
+
+    def start_program_server(self, path, program):
+        """
+        Returns started fork server for a program given by its source
+        ``path`` (see ``get_program``) or ``None`` if it is not a Python
+        program.
+        """
+        if self.get_language_for_file(path)[0] != 'python':
+            return None
+        server = ForkServer(program[0], abspath(path))
+        try:
+            return server.start()
+        except OSError as err:
+            self.exit("Could not start fork server: %s" % err)
+
+    def stop_fork_server(self):
+        if self.fork_server is not None:
+            self.fork_server.stop()
+            self.fork_server = None
+
+    def close_reports(self):
+        if not self.reports:
+            return
+        self.suite['finished'] = procme.monotonic()
+        for report in self.reports:
+            try:
+                report.close(self.suite)
+            except (IOError, OSError) as err:
+                self.error("Could not write report %s: %s" % (report.path,
+                    err))
+
+    def iter_suite(self, dirname, binary, cases):
+        """
+        Runs ``cases`` and yields their results, adding them to reports too.
+        With ``--fail-fast`` it stops after the first failed test.
+        """
+        for report in self.reports:
+            report.start(self.suite)
+        for info in self.iter_test_results(dirname, binary, cases):
+            for report in self.reports:
+                report.add(info)
+            yield info
+            if not info['success'] and getattr(self.namespace, 'fail_fast',
+                    False):
+                break
+
+    def schedule_cases(self, dirname, cases):
+        """
+        Orders ``cases`` using timings and verdicts of previous runs (see
+        ``porunga.scheduling``): longest tests go first if they are run
+        concurrently and, with ``--failed-first``, failed tests go before
+        all others. ``cases`` are returned intact (and so discovered lazily)
+        if there is nothing to order by.
+        """
+        failed_first = getattr(self.namespace, 'failed_first', False)
+        longest_first = self.get_jobs() > 1
+        if not failed_first and not longest_first:
+            return cases
+        previous = self.get_previous_results(dirname)
+        if not previous:
+            return cases
+        durations = {}
+        failed = set()
+        cases = list(cases)
+        key = 'cpu' if getattr(self.namespace, 'cpu_time', False) else 'wall'
+        for fin, fout in cases:
+            result = previous.get(os.path.relpath(fin, dirname))
+            if result is None:
+                continue
+            if result[key] is not None:
+                durations[fin] = result[key]
+            if result['verdict'] != VERDICT_OK:
+                failed.add(fin)
+        return scheduling.order_cases(cases, durations,
+            failed if failed_first else (), longest_first)
+
+    def get_previous_results(self, dirname):
+        """
+        Returns latest recorded results of problem's tests (mapping names of
+        tests to results) or empty dictionary if there is no history.
+        """
+        path = get_history_path(dirname)
+        if not os.path.isfile(path):
+            return {}
+        try:
+            history = History(path)
+            try:
+                return history.get_latest_results(self.namespace.lang)
+            finally:
+                history.close()
+        except sqlite3.Error as err:
+            self.error('Could not use timing history (%s)' % err)
+            return {}
+
+    def get_source(self, dirname, lang):
+        """
+        Returns path to the source file of the solution.
+        """
+        data = self.get_binary_data(dirname.rstrip('/\\'), LANGUAGES[lang])
+        return data['fin'] or data['fout']
+
+    def get_history_result(self, dirname, info):
+        return {
+            'name': os.path.relpath(info['fin'], dirname),
+            'verdict': info['verdict'],
+            'wall': info['time'],
+            'cpu': info['utime'] + info['stime'],
+            'maxrss': info['maxrss'],
+        }
+
+    def record_history(self, dirname, results):
+        """
+        Records this run in problem's history and, if asked to, compares it
+        with a baseline run. Exits with an error if any test got slower.
+        """
+        reference = getattr(self.namespace, 'compare', None)
+        record = not getattr(self.namespace, 'no_history', True)
+        if not record and not reference:
+            return
+        current = dict((result['name'], result) for result in
+            (self.get_history_result(dirname, info) for info in results))
+        try:
+            history = History(get_history_path(dirname))
+            try:
+                baseline = None
+                if reference:
+                    run_id = history.find_run(reference,
+                        self.namespace.lang)
+                    if run_id is not None:
+                        baseline = history.get_results(run_id)
+                if record:
+                    try:
+                        source_hash = file_digest(self.get_source(dirname,
+                            self.namespace.lang))
+                    except (IOError, OSError):
+                        source_hash = None
+                    history.add_run(self.namespace.lang, source_hash,
+                        list(current.values()), tag=self.namespace.tag)
+            finally:
+                history.close()
+        except sqlite3.Error as err:
+            self.error('Could not use timing history (%s)' % err)
+            return
+        if reference:
+            self.compare_with_baseline(reference, baseline, current)
+
+    def compare_with_baseline(self, reference, baseline, current):
+        if baseline is None:
+            self.exit("There is no %r run to compare with" % reference)
+        passed = lambda results: dict((name, result) for name, result in
+            results.items() if result['verdict'] == VERDICT_OK)
+        key = 'cpu' if getattr(self.namespace, 'cpu_time', False) else 'wall'
+        regressions = find_regressions(passed(baseline), passed(current), key,
+            self.namespace.threshold, self.namespace.noise)
+        if not regressions:
+            self.success('No performance regressions (compared with %s run)'
+                % reference)
+            return
+        self.error('%s tests are slower than in %s run:' % (len(regressions),
+            reference))
+        for name, before, after in regressions:
+            self.error_continuation('    %s: %.3fs -> %.3fs (+%.1f%%)' % (name,
+                before, after, (after / before - 1) * 100 if before else 100))
+        self.exit('Performance regressions found')
+
+    def get_binary_data(self, dirname, info, simplename=None):
+        data = {'dirname': dirname}
+        if simplename is None:
+            simplename = os.path.split(dirname)[1] # dirname
+        data['simplename'] = simplename
+        name = joinpath(dirname, simplename)
+        data['name'] = name
+        fin = info['fin'].format(**data) if 'fin' in info else ''
+        data['fin'] = fin
+        fout = info['fout'].format(**data)
+        data['fout'] = fout
+        return data
+
+    def get_binary(self, dirname, lang, simplename=None):
+        dirname = dirname.rstrip('/\\')
+        self.cache_status = None
+        if lang in LANGUAGES:
+            info = LANGUAGES[lang]
+            data = self.get_binary_data(dirname, info, simplename)
+            if 'compiler' in info:
+                program = self.get_compiler(info).format(**data)
+                self.compile_cached(program, dirname, info, data)
+            return info['prog'].format(**data)
+        else:
+            self.exit("Wrong language specified")
+
+    def get_binary_argv(self, dirname, lang, simplename=None):
+        """
+        Returns command for the binary as a list of arguments, ready to be
+        executed without a shell. Paths are never split, even if they contain
+        spaces. Nothing is compiled here, ``get_binary`` should be called first.
+        """
+        dirname = dirname.rstrip('/\\')
+        info = LANGUAGES[lang]
+        data = self.get_binary_data(dirname, info, simplename)
+        return [part.format(**data) for part in shlex.split(info['prog'])]
+
+    def get_language_for_file(self, path):
+        """
+        Returns ``(lang, simplename)`` for given source file, based on its
+        extension, or ``(None, None)`` if it is not recognized.
+        """
+        filename = os.path.basename(path)
+        for lang in sorted(LANGUAGES):
+            info = LANGUAGES[lang]
+            suffix = info.get('fin', info['fout']).replace('{name}', '')
+            if '{' not in suffix and filename.endswith(suffix):
+                return lang, filename[:-len(suffix)]
+        return None, None
+
+    def get_program(self, path, lang=None):
+        """
+        Compiles (if needed) any given source file (not only problem's
+        solution) and returns command running it as a list of arguments.
+        Language is guessed from file's extension unless ``lang`` is given.
+        """
+        guessed, simplename = self.get_language_for_file(path)
+        lang = lang or guessed
+        if lang is None or lang != guessed:
+            self.exit("Could not recognize language of %r" % path)
+        dirname = os.path.dirname(path) or curdir()
+        self.get_binary(dirname, lang, simplename)
+        return self.get_binary_argv(dirname, lang, simplename)
+
+    def get_compiler(self, info):
+        """
+        Returns compiler command template, with profiling flags if
+        ``--profile`` is given.
+        """
+        compiler = info['compiler']
+        if getattr(self.namespace, 'profile', False) and (
+                'profile_flags' in info):
+            compiler = '%s %s' % (compiler, info['profile_flags'])
+        return compiler
+
+    def get_compile_cache(self):
+        if getattr(self.namespace, 'no_cache', True):
+            return None
+        from porunga.compilecache import CompileCache
+        return CompileCache(max_size=self.namespace.cache_size * 1024 * 1024)
+
+    def compile_cached(self, program, dirname, info, data):
+        """
+        Compiles ``program`` unless its artifacts can be restored from the
+        compilation cache. Cache key is computed from the command resolved
+        against problem's name only (not its location) so the same solution
+        is a hit wherever it is tested from.
+        """
+        cache = self.get_compile_cache()
+        key = None
+        if cache is not None and 'artifacts' in info:
+            simplename = data['simplename']
+            relative = {'dirname': '.', 'simplename': simplename,
+                'name': simplename}
+            relative['fin'] = info['fin'].format(**relative)
+            relative['fout'] = info['fout'].format(**relative)
+            key = cache.get_key(data['fin'],
+                self.get_compiler(info).format(**relative))
+        if key is None:
+            self.compile(program)
+            return
+        if cache.restore(key, dirname or curdir()):
+            self.cache_status = 'hit'
+            return
+        self.compile(self.use_precompiled_header(program, info, data))
+        self.cache_status = 'miss'
+        cache.store(key, [pattern.format(**data)
+            for pattern in info['artifacts']])
+
+    def use_precompiled_header(self, program, info, data):
+        """
+        Adds directory with precompiled first header of the source (see
+        ``porunga.pch``) to the include path of compiler ``program``.
+        """
+        if 'header_language' not in info:
+            return program
+        header = get_first_include(data['fin'])
+        if header is None:
+            return program
+        include_dir = HeaderCache().get_include_dir(self.get_compiler(info),
+            header, info['header_language'])
+        if include_dir is None:
+            return program
+        return '%s -I %s' % (program, quote(include_dir))
+
+    def get_command_timeouts(self, dirname=None):
+        """
+        Returns ``(timeout, cpu_timeout)`` for the test command. If limit
+        applies to CPU time, process is still killed if it runs for much
+        longer than that (i.e. is blocked waiting for input).
+        """
+        timeout = self.get_timeout(dirname)
+        if timeout and getattr(self.namespace, 'cpu_time', False):
+            return timeout * CPU_TIME_WALL_FACTOR + 1, timeout
+        return timeout, None
+
+    def run_test_command(self, cmd, stdin=None, comparator=None, input=None,
+            env=None, cpus=None, dirname=None):
+        """
+        Runs test command and feeds its output to the ``comparator`` as soon
+        as it is written. Command is killed once comparator knows output is
+        wrong. Only first ``OUTPUT_PREVIEW_SIZE`` bytes of output are kept.
+
+        Command reads ``stdin`` file directly or is given ``input`` bytes.
+        It is pinned to ``cpus``, if given. Time limit is the one of the
+        problem in ``dirname`` (current problem by default).
+        """
+        command = self.get_test_command(cmd, stdin=stdin, input=input,
+            env=env, cpus=cpus, dirname=dirname)
+        preview = b''
+        aborted = False
+        timeouted = False
+        try:
+            chunks = command.iter_raw_output()
+            try:
+                for chunk in chunks:
+                    preview = add_preview(preview, chunk)
+                    if comparator is not None and not comparator.feed(chunk):
+                        aborted = True
+                        break
+            finally:
+                chunks.close()
+        except procme.TimeoutExceeded:
+            timeouted = True
+        except OSError as err:
+            return self.get_failed_runinfo('Could not run %r: %s' % (cmd, err))
+        finally:
+            usage = self.release_cgroup(command)
+        return self.get_command_runinfo(command, preview, timeouted, aborted,
+            *usage)
+
+    def get_test_command(self, cmd, stdin=None, input=None, env=None,
+            cpus=None, dirname=None, factory=None):
+        """
+        Returns test command (not started yet) with limits of the problem in
+        ``dirname`` applied. Command is created by ``factory`` (by default
+        ``get_command``).
+        """
+        timeout, cpu_timeout = self.get_command_timeouts(dirname)
+        memory_limit = self.get_memory_limit()
+        cgroup = self.get_memory_cgroup(memory_limit)
+        return (factory or self.get_command)(cmd, timeout=timeout,
+            cpu_timeout=cpu_timeout, stderr=PIPE, stdin=stdin,
+            memory_limit=memory_limit, cgroup=cgroup, input=input, env=env,
+            cpus=cpus, nice=getattr(self.namespace, 'nice', None))
+
+    def release_cgroup(self, command):
+        """
+        Destroys cgroup of finished ``command`` (if it had one) and returns
+        ``(oom_killed, peak)`` memory usage it recorded.
+        """
+        if command.cgroup is None:
+            return False, None
+        oom_killed = command.cgroup.was_oom_killed()
+        peak = command.cgroup.get_peak()
+        command.cgroup.destroy()
+        return oom_killed, peak
+
+    def get_command_runinfo(self, command, preview, timeouted, aborted,
+            oom_killed=False, peak=None):
+        """
+        Returns run information of finished test ``command``. Memory limit
+        is exceeded if the command has been killed by the kernel for that,
+        its peak memory is over the limit or it failed to allocate memory.
+        """
+        memory_limit = command.memory_limit
+        # peak of the cgroup is exact, command's own may be sampled
+        maxrss = peak if peak is not None else command.max_rss
+        errors = decode(command.error_output).strip()
+        memory_exceeded = bool(memory_limit) and (oom_killed or
+            maxrss > memory_limit or (command.returncode != 0 and
+            limits.is_out_of_memory_message(errors)))
+        return {
+            'output': decode(preview).strip(),
+            'errors': errors,
+            'returncode': command.returncode,
+            'timeouted': timeouted,
+            'aborted': aborted,
+            'memory_exceeded': memory_exceeded,
+            'wall': command.wall_time,
+            'utime': command.user_time,
+            'stime': command.system_time,
+            'maxrss': maxrss,
+        }
+
+    def get_command(self, cmd, **kwargs):
+        if self.fork_server is not None:
+            return ForkServerCommand(self.fork_server, cmd, **kwargs)
+        return procme.Command(cmd, **kwargs)
+
+    def get_measured_time(self, runinfo):
+        """
+        Returns time of the run which should be compared between runs - CPU
+        time if ``--cpu-time`` is given, wall time otherwise.
+        """
+        if self.namespace.cpu_time:
+            return runinfo['utime'] + runinfo['stime']
+        return runinfo['wall']
+
+    def get_memory_limit(self):
+        """
+        Returns memory limit in bytes (or ``None`` if memory is not limited).
+        """
+        limit = getattr(self.namespace, 'memory_limit', 0)
+        if not limit:
+            return None
+        return int(limit * 1024 * 1024)
+
+    def get_memory_cgroup(self, memory_limit):
+        """
+        Returns new cgroup for a test command if memory should be limited and
+        delegated cgroup is available, ``None`` otherwise (then address space
+        of the command is limited instead).
+        """
+        if not memory_limit:
+            return None
+        root = limits.get_cgroup_root()
+        if root is None:
+            return None
+        try:
+            return limits.MemoryCgroup(root, memory_limit)
+        except (IOError, OSError):
+            return None
+
+    def get_failed_runinfo(self, message, returncode=127):
+        """
+        Returns run information for a test command which could not be run.
+        """
+        return {
+            'output': message,
+            'errors': '',
+            'returncode': returncode,
+            'timeouted': False,
+            'aborted': False,
+            'memory_exceeded': False,
+            'wall': 0.0,
+            'utime': 0.0,
+            'stime': 0.0,
+            'maxrss': 0,
+        }
+
+    def get_jobs(self):
+        jobs = getattr(self.namespace, 'jobs', None) or cpu_count()
+        if self.cpu_pool is not None:
+            jobs = min(jobs, len(self.cpu_pool.cpus))
+        return max(jobs, 1)
+
+    def iter_test_results(self, dirname, binary, cases):
+        """
+        Runs given test cases and yields their results, in the same order as
+        ``cases``. If more than one job is allowed, cases are run concurrently
+        on a thread pool (the heavy lifting is done by child processes) while
+        reports are still printed one after another. Only a few cases per
+        worker are submitted ahead of the one reported, so ``cases`` are
+        discovered lazily and nothing is run far ahead of the caller.
+        """
+        jobs = self.get_jobs()
+        if jobs == 1:
+            for fin, fout in cases:
+                yield self.test(dirname, binary, fin, fout)
+            return
+
+        def run(case):
+            return self.run_test(dirname, binary, *case)
+
+        cases = iter(cases)
+        window = jobs * WINDOW_FACTOR
+        executor = ThreadPoolExecutor(max_workers=jobs,
+            thread_name_prefix='worker')
+        futures = collections.deque()
+        try:
+            while True:
+                futures.extend(executor.submit(run, case)
+                    for case in itertools.islice(cases, window - len(futures)))
+                if not futures:
+                    break
+                info = futures.popleft().result()
+                self.report_test_header(info['fin'])
+                self.report_test(info)
+                yield info
+        finally:
+            # tests not started yet are dropped if caller stops early
+            for future in futures:
+                future.cancel()
+            executor.shutdown()
+
+    def test(self, dirname, binary, fin, fout):
+        self.report_test_header(fin)
+        info = self.run_test(dirname, binary, fin, fout)
+        self.report_test(info)
+        return info
+
+    def run_test(self, dirname, binary, fin, fout):
+        """
+        Runs single test case and returns information about it. Nothing is
+        printed here so it is safe to call it from many threads at once.
+        """
+        started = procme.monotonic()
+        if isinstance(binary, list):
+            cmd = binary
+        else:
+            cmd = shlex.split(binary)
+        retried = False
+        if self.cpu_pool is None:
+            runinfo, fout_read, matched, mismatch = self.run_test_once(
+                dirname, cmd, fin, fout)
+        else:
+            with self.cpu_pool.pinned() as cpus:
+                runinfo, fout_read, matched, mismatch = self.run_test_once(
+                    dirname, cmd, fin, fout, cpus)
+                if runinfo['timeouted']:
+                    # timeout might have been caused by noise, confirm it
+                    retried = True
+                    runinfo, fout_read, matched, mismatch = (
+                        self.run_test_once(dirname, cmd, fin, fout, cpus))
+        return self.get_test_result(fin, fout, runinfo, fout_read, matched,
+            mismatch, started, retried)
+
+    def get_test_result(self, fin, fout, runinfo, fout_read, matched,
+            mismatch, started, retried=False):
+        """
+        Returns information about a test (as returned by ``run_test``) from
+        information about its run.
+        """
+        output = runinfo['output']
+        returncode = runinfo['returncode']
+        timeouted = runinfo['timeouted']
+        verdict = self.get_verdict(runinfo, fout_read, matched)
+        success = verdict == VERDICT_OK
+        expected = ''
+        if fout_read and not success:
+            expected = self.get_expected_preview(fout)
+        return {
+            'fin': fin,
+            'fout': fout,
+            'verdict': verdict,
+            'success': success,
+            'time': runinfo['wall'],
+            'utime': runinfo['utime'],
+            'stime': runinfo['stime'],
+            'maxrss': runinfo['maxrss'],
+            'output': output,
+            'errors': runinfo['errors'],
+            'expected': expected,
+            'mismatch': mismatch,
+            'returncode': returncode,
+            'timeouted': timeouted,
+            'aborted': runinfo['aborted'],
+            'fout_read': fout_read,
+            'started': started,
+            'finished': procme.monotonic(),
+            'worker': threading.current_thread().name,
+            'retried': retried,
+        }
+
+    def run_test_once(self, dirname, cmd, fin, fout, cpus=None):
+        """
+        Runs test command once and returns ``(runinfo, fout_read, matched,
+        mismatch)``.
+        """
+        env = None
+        if self.profiler is not None:
+            cmd, env = self.profiler.prepare(cmd)
+        expected_file, comparator = self.open_comparator(fout, dirname)
+        try:
+            try:
+                if containers.is_plain(fin):
+                    with open(fin, 'rb') as stdin:
+                        runinfo = self.run_test_command(cmd, stdin,
+                            comparator, env=env, cpus=cpus, dirname=dirname)
+                else:
+                    with containers.open_test_file(fin) as source:
+                        runinfo = self.run_test_command(cmd, None,
+                            comparator, input=source, env=env, cpus=cpus,
+                            dirname=dirname)
+            except (IOError, OSError) as err:
+                runinfo = self.get_failed_runinfo('in file could not be read '
+                    '(%s)' % err)
+            fout_read, matched, mismatch = self.finish_comparator(comparator)
+        finally:
+            if expected_file is not None:
+                expected_file.close()
+        return runinfo, fout_read, matched, mismatch
+
+    def open_comparator(self, fout, dirname):
+        """
+        Returns ``(expected_file, comparator)`` for expected output ``fout``
+        (both ``None`` if it can not be read).
+        """
+        try:
+            expected_file = containers.open_test_file(fout)
+            return expected_file, self.get_comparator(expected_file, dirname)
+        except (IOError, OSError):
+            return None, None
+
+    def finish_comparator(self, comparator):
+        """
+        Returns ``(fout_read, matched, mismatch)`` once whole output was fed
+        to the ``comparator``.
+        """
+        if comparator is None:
+            return False, False, None
+        return True, comparator.finish(), comparator.mismatch
+
+    def get_verdict(self, runinfo, fout_read=True, matched=True):
+        if runinfo['timeouted']:
+            return VERDICT_TIMEOUT
+        elif runinfo['memory_exceeded']:
+            return VERDICT_MEMORY_LIMIT
+        elif runinfo['aborted']:
+            return VERDICT_WRONG_ANSWER
+        elif runinfo['returncode'] != 0:
+            return VERDICT_RUNTIME_ERROR
+        elif not fout_read:
+            return VERDICT_NO_OUTPUT_FILE
+        elif not matched:
+            return VERDICT_WRONG_ANSWER
+        return VERDICT_OK
+
+    def get_expected_preview(self, fout):
+        with containers.open_test_file(fout) as afile:
+            return decode(afile.read(OUTPUT_PREVIEW_SIZE)).strip()
+
+    def get_test_index(self, testdir):
+        if getattr(self.namespace, 'no_cache', True):
+            return None
+        return DirectoryIndex(get_cache_dir('index'), testdir)
+
+    def get_test_inputs(self, dirname):
+        """
+        Returns lazy iterator over test inputs of the problem, in natural
+        order (see ``porunga.discovery``). Inputs kept in archives (see
+        ``porunga.containers``) follow those from ``testdata`` directory.
+        """
+        testdir = joinpath(dirname, 'testdata')
+        return itertools.chain(
+            iter_test_inputs(testdir, recursive=self.namespace.all,
+                index=self.get_test_index(testdir)),
+            containers.iter_archive_inputs(dirname,
+                recursive=self.namespace.all),
+        )
+
+    def get_fout_name(self, fin):
+        """
+        Returns name of expected output for given input. Compressed input's
+        output is expected to be compressed the same way, unless there is
+        only uncompressed one.
+        """
+        base, compression = containers.split_compression(fin)
+        splitted = base.split('.')
+        suffix = splitted[-1]
+        if suffix == 'in':
+            fout = '.'.join(splitted[:-1] + ['out'])
+        elif suffix == 'IN':
+            fout = '.'.join(splitted[:-1] + ['OUT'])
+        else:
+            return None
+        if compression and (containers.exists(fout) and
+                not containers.exists(fout + compression)):
+            return fout
+        return fout + compression
+
+    def get_test_cases(self, dirname):
+        """
+        Yields ``(fin, fout)`` pairs as soon as test inputs are found, so
+        tests can be run while test data are still being walked.
+        """
+        if getattr(self.namespace, 'case', False):
+            fins = [self.namespace.case]
+        else:
+            fins = self.get_test_inputs(dirname)
+        for fin in fins:
+            fout = self.get_fout_name(fin)
+            if fout:
+                yield fin, fout
+
+    async def iter_suite_async(self, dirname, binary, cases, limit=None):
+        """
+        Asynchronous counterpart of ``iter_suite``: runs ``cases`` on the
+        current event loop and yields their results in order of ``cases``.
+        At most ``jobs`` tests run at once and, if ``limit`` semaphore is
+        given, only while it is acquired. Tests still running when the
+        caller stops are cancelled and waited for.
+        """
+        jobs = asyncio.Semaphore(self.get_jobs())
+
+        async def run(fin, fout):
+            async with jobs:
+                if limit is None:
+                    return await self.run_test_async(dirname, binary, fin,
+                        fout)
+                async with limit:
+                    return await self.run_test_async(dirname, binary, fin,
+                        fout)
+
+        for report in self.reports:
+            report.start(self.suite)
+        tasks = [asyncio.ensure_future(run(fin, fout)) for fin, fout in cases]
+        try:
+            for task in tasks:
+                info = await task
+                for report in self.reports:
+                    report.add(info)
+                yield info
+                if not info['success'] and getattr(self.namespace,
+                        'fail_fast', False):
+                    break
+        finally:
+            for task in tasks:
+                task.cancel()
+            # cancelled tests kill their processes only once they are run
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def run_test_async(self, dirname, binary, fin, fout):
+        """
+        Coroutine running single test case, see ``run_test``.
+        """
+        started = procme.monotonic()
+        cmd = binary if isinstance(binary, list) else shlex.split(binary)
+        expected_file, comparator = self.open_comparator(fout, dirname)
+        try:
+            try:
+                if containers.is_plain(fin):
+                    with open(fin, 'rb') as stdin:
+                        runinfo = await self.run_test_command_async(cmd,
+                            stdin, comparator, dirname=dirname)
+                else:
+                    with containers.open_test_file(fin) as source:
+                        runinfo = await self.run_test_command_async(cmd,
+                            None, comparator, input=source, dirname=dirname)
+            except (IOError, OSError) as err:
+                runinfo = self.get_failed_runinfo('in file could not be read '
+                    '(%s)' % err)
+            fout_read, matched, mismatch = self.finish_comparator(comparator)
+        finally:
+            if expected_file is not None:
+                expected_file.close()
+        return self.get_test_result(fin, fout, runinfo, fout_read, matched,
+            mismatch, started)
+
+    async def run_test_command_async(self, cmd, stdin=None, comparator=None,
+            input=None, dirname=None):
+        """
+        Coroutine running test command, see ``run_test_command``.
+        """
+        command = self.get_test_command(cmd, stdin=stdin, input=input,
+            dirname=dirname, factory=AsyncCommand)
+        preview = b''
+        aborted = False
+        timeouted = False
+        try:
+            chunks = command.iter_raw_output_async()
+            try:
+                async for chunk in chunks:
+                    preview = add_preview(preview, chunk)
+                    if comparator is not None and not comparator.feed(chunk):
+                        aborted = True
+                        break
+            finally:
+                await chunks.aclose()
+        except procme.TimeoutExceeded:
+            timeouted = True
+        except OSError as err:
+            return self.get_failed_runinfo('Could not run %r: %s' % (cmd, err))
+        finally:
+            usage = self.release_cgroup(command)
+        return self.get_command_runinfo(command, preview, timeouted, aborted,
+            *usage)
+
+    def compile(self, program):
+        proc = Popen([program], stdout=PIPE, stderr=PIPE, shell=True)
+        out, err = proc.communicate()
+        if proc.returncode != 0:
+            raise EngineError('Compilation error: %s' % decode(err).strip())
+
+    def report_test_header(self, fin):
+        pass
+
+    def report_test(self, info):
+        pass
+
+    def log(self, message, newline=True):
+        pass
+
+    def info(self, message, newline=True):
+        self.log(message, newline)
+
+    def info_continuation(self, message, newline=True):
+        self.log(message, newline)
+
+    def success(self, message, newline=True):
+        self.log(message, newline)
+
+    def success_continuation(self, message, newline=True):
+        self.log(message, newline)
+
+    def error(self, message, newline=True):
+        self.log(message, newline)
+
+    def error_continuation(self, message, newline=True):
+        self.log(message, newline)
+
+    def exit(self, message, code=1):
+        raise EngineError(message)
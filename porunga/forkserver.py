@@ -0,0 +1,204 @@
+"""
+Client side of the fork server (see ``porunga.forkserver_script``).
+
+Instead of starting new interpreter for each test, ``ForkServer`` starts it
+once and ``ForkServerCommand`` asks it to fork a child running the solution.
+``ForkServerCommand`` has the same interface as ``procme.Command``.
+"""
+import array
+import json
+import os
+import shutil
+import socket
+import subprocess
+import tempfile
+from porunga import procme
+from porunga.utils.paths import joinpath
+
+
+SCRIPT = joinpath(os.path.dirname(os.path.abspath(__file__)),
+    'forkserver_script.py')
+
+# written by the script once it accepts connections
+READY = b'ready\n'
+
+
+class Rusage(object):
+
+    def __init__(self, ru_utime, ru_stime, ru_maxrss):
+        self.ru_utime = ru_utime
+        self.ru_stime = ru_stime
+        self.ru_maxrss = ru_maxrss
+
+
+class ForkServer(object):
+    """
+    Fork server for ``solution`` run by given Python ``interpreter``.
+    """
+
+    def __init__(self, interpreter, solution):
+        self.interpreter = interpreter
+        self.solution = solution
+        self.process = None
+        self.tempdir = None
+        self.address = None
+
+    def start(self):
+        """
+        Starts the server and waits until it is ready to fork solutions,
+        so its startup is never counted in time of a test. Raises
+        ``OSError`` if it fails to start.
+        """
+        self.tempdir = tempfile.mkdtemp(prefix='porunga-')
+        self.address = joinpath(self.tempdir, 'forkserver.sock')
+        listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            listener.bind(self.address)
+            listener.listen(64)
+            self.process = subprocess.Popen(
+                [self.interpreter, SCRIPT, str(listener.fileno()),
+                 self.solution],
+                stdin=subprocess.DEVNULL,
+                stdout=subprocess.PIPE,
+                pass_fds=[listener.fileno()],
+                start_new_session=True,
+            )
+        finally:
+            listener.close()
+        with self.process.stdout:
+            ready = self.process.stdout.readline()
+        if ready != READY:
+            self.stop()
+            raise OSError('Fork server exited before it was ready')
+        return self
+
+    def stop(self):
+        if self.process is not None:
+            self.process.kill()
+            self.process.wait()
+            self.process = None
+        if self.tempdir is not None:
+            shutil.rmtree(self.tempdir, ignore_errors=True)
+            self.tempdir = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def connect(self):
+        conn = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        conn.connect(self.address)
+        return conn
+
+
+class ForkedProcess(object):
+    """
+    Minimal ``subprocess.Popen`` counterpart for a child of the fork server.
+    """
+
+    def __init__(self, pid, stdin, stdout, stderr):
+        self.pid = pid
+        self.stdin = stdin
+        self.stdout = stdout
+        self.stderr = stderr
+        self.returncode = None
+
+    def poll(self):
+        return self.returncode
+
+
+class ForkServerCommand(procme.Command):
+    """
+    Runs solution as a forked child of the given ``server``. Accepts same
+    arguments as ``procme.Command`` (``cmd``, ``shell`` and ``env`` are
+    ignored) and ``argv`` - arguments passed to the solution.
+    """
+
+    def __init__(self, server, *args, **kwargs):
+        self.server = server
+        self.argv = list(kwargs.pop('argv', ()))
+        self.conn = None
+        self.messages = b''
+        super(ForkServerCommand, self).__init__(*args, **kwargs)
+
+    def receive(self, block=True):
+        """
+        Returns next message from the server (or ``None`` if ``block`` is
+        false and message is not available yet).
+        """
+        while b'\n' not in self.messages:
+            self.conn.setblocking(block)
+            try:
+                data = self.conn.recv(4096)
+            except (BlockingIOError, InterruptedError):
+                return None
+            finally:
+                self.conn.setblocking(True)
+            if not data:
+                raise OSError('Fork server closed connection')
+            self.messages += data
+        line, self.messages = self.messages.split(b'\n', 1)
+        return json.loads(line.decode('utf-8'))
+
+    def start(self):
+        to_close = []
+        stdin = None
+        if self.input is not None:
+            infd, stdin_w = os.pipe()
+            stdin = os.fdopen(stdin_w, 'wb', 0)
+            to_close.append(infd)
+        elif self.stdin is None:
+            infd = os.open(os.devnull, os.O_RDONLY)
+            to_close.append(infd)
+        elif isinstance(self.stdin, int):
+            infd = self.stdin
+        else:
+            infd = self.stdin.fileno()
+        out_r, out_w = os.pipe()
+        to_close.append(out_w)
+        stderr = None
+        err_w = out_w
+        if self.stderr == subprocess.PIPE:
+            err_r, err_w = os.pipe()
+            stderr = os.fdopen(err_r, 'rb', 0)
+            to_close.append(err_w)
+        elif self.stderr != subprocess.STDOUT:
+            err_w = os.open(os.devnull, os.O_WRONLY)
+            to_close.append(err_w)
+
+        request = {
+            'rlimits': [[rlimit, soft, hard] for rlimit, (soft, hard)
+                        in self.get_rlimits()],
+            'cgroup': self.cgroup.path if self.cgroup is not None else None,
+            'argv': self.argv,
+            'cpus': sorted(self.cpus) if self.cpus else None,
+            'nice': self.nice,
+        }
+        try:
+            self.conn = self.server.connect()
+            fds = array.array('i', [infd, out_w, err_w])
+            self.conn.sendmsg([json.dumps(request).encode('utf-8') + b'\n'],
+                [(socket.SOL_SOCKET, socket.SCM_RIGHTS, fds.tobytes())])
+        finally:
+            for fd in to_close:
+                os.close(fd)
+        pid = self.receive()['pid']
+        # solution has just been forked, connecting does not count
+        self.started = procme.monotonic()
+        self.process = ForkedProcess(pid, stdin, os.fdopen(out_r, 'rb', 0),
+            stderr)
+        return self.process
+
+    def reap(self, options=0):
+        message = self.receive(block=not options & os.WNOHANG)
+        if message is None:
+            return False
+        self.wall_time = procme.monotonic() - self.started
+        self.rusage = Rusage(message['utime'], message['stime'],
+            message['maxrss'])
+        self.returncode = self.process.returncode = procme.get_returncode(
+            message['status'])
+        self.conn.close()
+        return True
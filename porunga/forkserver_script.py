@@ -0,0 +1,191 @@
+"""
+Fork server for Python solutions.
+
+This script is run by the solution's interpreter (so it must not import
+porunga): ``python forkserver_script.py LISTENER_FD SOLUTION``. Interpreter
+starts up and imports modules used by the solution once; then for each
+connection accepted on the listening socket a child is forked which runs the
+solution with ``runpy``, with stdin/stdout/stderr replaced by descriptors
+sent with the request. Server writes ``READY`` line to its stdout (and
+closes it) once it is ready to accept connections.
+
+Request is a JSON line (``{"rlimits": [[resource, soft, hard], ...],
+"cgroup": path or null, "argv": [arg, ...], "cpus": [cpu, ...] or null,
+"nice": increment or null}``) sent together with three file
+descriptors. Server answers with ``{"pid": pid}`` once solution is forked
+and with ``{"status": ..., "utime": ..., "stime": ..., "maxrss": ...}``
+once it exits.
+"""
+import array
+import ast
+import gc
+import io
+import json
+import os
+import resource
+import runpy
+import socket
+import sys
+import traceback
+
+
+FDS_COUNT = 3
+
+READY = b'ready\n'
+
+
+def prewarm(solution):
+    """
+    Imports modules imported at the top level of the solution, so forked
+    children do not need to.
+    """
+    try:
+        with open(solution) as afile:
+            tree = ast.parse(afile.read(), solution)
+    except (IOError, OSError, SyntaxError, ValueError):
+        return
+    for node in tree.body:
+        if isinstance(node, ast.Import):
+            names = [alias.name for alias in node.names]
+        elif isinstance(node, ast.ImportFrom) and not node.level:
+            names = [node.module]
+        else:
+            continue
+        for name in names:
+            try:
+                __import__(name)
+            except Exception:
+                pass
+
+
+def receive_request(conn):
+    fds = array.array('i')
+    data = b''
+    while not data.endswith(b'\n'):
+        msg, ancdata, flags, addr = conn.recvmsg(4096,
+            socket.CMSG_LEN(FDS_COUNT * fds.itemsize))
+        if not msg:
+            raise EOFError
+        data += msg
+        for level, kind, payload in ancdata:
+            if level == socket.SOL_SOCKET and kind == socket.SCM_RIGHTS:
+                fds.frombytes(payload[:len(payload) -
+                    (len(payload) % fds.itemsize)])
+    return json.loads(data.decode('utf-8')), list(fds)
+
+
+def send(conn, message):
+    conn.sendall(json.dumps(message).encode('utf-8') + b'\n')
+
+
+def run_solution(solution, request, fds):
+    """
+    Runs the solution within (already forked) child. Never returns.
+    """
+    code = 1
+    try:
+        os.setsid()
+        if request.get('cgroup'):
+            with open(os.path.join(request['cgroup'], 'cgroup.procs'), 'w') as f:
+                f.write(str(os.getpid()))
+        for rlimit, soft, hard in request.get('rlimits', []):
+            resource.setrlimit(rlimit, (soft, hard))
+        if request.get('cpus'):
+            os.sched_setaffinity(0, request['cpus'])
+        if request.get('nice'):
+            os.nice(request['nice'])
+        for target, fd in enumerate(fds):
+            os.dup2(fd, target)
+            os.close(fd)
+        sys.stdin = io.open(0, 'r', closefd=False)
+        sys.stdout = io.open(1, 'w', closefd=False)
+        sys.stderr = io.open(2, 'w', closefd=False)
+        sys.argv = [solution] + request.get('argv', [])
+        code = 0
+        runpy.run_path(solution, run_name='__main__')
+    except SystemExit as err:
+        if err.code is None:
+            code = 0
+        elif isinstance(err.code, int):
+            code = err.code
+        else:
+            sys.stderr.write('%s\n' % err.code)
+            code = 1
+    except BaseException:
+        traceback.print_exc()
+        code = 1
+    finally:
+        try:
+            sys.stdout.flush()
+            sys.stderr.flush()
+        except Exception:
+            code = code or 1
+        os._exit(code)
+
+
+def handle(conn, solution):
+    """
+    Handles single request within forked child of the server.
+    """
+    request, fds = receive_request(conn)
+    pid = os.fork()
+    if pid == 0:
+        conn.close()
+        run_solution(solution, request, fds)
+    for fd in fds:
+        os.close(fd)
+    send(conn, {'pid': pid})
+    pid, status, rusage = os.wait4(pid, 0)
+    send(conn, {
+        'status': status,
+        'utime': rusage.ru_utime,
+        'stime': rusage.ru_stime,
+        'maxrss': rusage.ru_maxrss,
+    })
+
+
+def notify_ready():
+    """
+    Tells porunga that server is ready; stdout is not used anymore.
+    """
+    os.write(1, READY)
+    devnull = os.open(os.devnull, os.O_WRONLY)
+    os.dup2(devnull, 1)
+    os.close(devnull)
+
+
+def serve(listener, solution):
+    while True:
+        conn, addr = listener.accept()
+        pid = os.fork()
+        if pid == 0:
+            listener.close()
+            code = 0
+            try:
+                handle(conn, solution)
+            except Exception:
+                traceback.print_exc()
+                code = 1
+            os._exit(code)
+        conn.close()
+        try:
+            while os.waitpid(-1, os.WNOHANG)[0]:
+                pass
+        except OSError:
+            pass
+
+
+def main():
+    listener = socket.socket(fileno=int(sys.argv[1]))
+    solution = os.path.abspath(sys.argv[2])
+    sys.path[0] = os.path.dirname(solution)
+    prewarm(solution)
+    gc.collect()
+    if hasattr(gc, 'freeze'):
+        gc.freeze()
+    notify_ready()
+    serve(listener, solution)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,136 @@
+"""
+Timing history of test runs.
+
+Each run of ``porunga test`` is recorded (per test timings and verdicts, and
+hash of the solution source) in a SQLite file kept in the problem directory,
+next to ``testdata/``. Recorded runs can be used as a baseline to detect
+performance regressions.
+"""
+import sqlite3
+import time
+from porunga.utils.paths import joinpath
+
+
+HISTORY_FILENAME = '.porunga-history.sqlite'
+
+# references to runs which are not tags
+PREVIOUS_RUN = 'previous'
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    started REAL NOT NULL,
+    lang TEXT NOT NULL,
+    source_hash TEXT,
+    tag TEXT
+);
+CREATE TABLE IF NOT EXISTS results (
+    run_id INTEGER NOT NULL REFERENCES runs (id),
+    name TEXT NOT NULL,
+    verdict TEXT NOT NULL,
+    wall REAL,
+    cpu REAL,
+    maxrss INTEGER
+);
+CREATE INDEX IF NOT EXISTS results_run_id ON results (run_id);
+CREATE INDEX IF NOT EXISTS runs_tag ON runs (tag);
+"""
+
+
+def get_history_path(dirname):
+    return joinpath(dirname, HISTORY_FILENAME)
+
+
+class History(object):
+
+    def __init__(self, path):
+        self.path = path
+        self.connection = sqlite3.connect(path, timeout=30)
+        self.connection.executescript(SCHEMA)
+
+    def close(self):
+        self.connection.close()
+
+    def add_run(self, lang, source_hash, results, tag=None):
+        """
+        Records a run together with its ``results`` - list of dictionaries
+        with ``name``, ``verdict``, ``wall``, ``cpu`` and ``maxrss`` keys.
+        Returns id of the new run.
+        """
+        with self.connection:
+            cursor = self.connection.execute('INSERT INTO runs (started, '
+                'lang, source_hash, tag) VALUES (?, ?, ?, ?)',
+                (time.time(), lang, source_hash, tag))
+            run_id = cursor.lastrowid
+            self.connection.executemany('INSERT INTO results (run_id, name, '
+                'verdict, wall, cpu, maxrss) VALUES (?, ?, ?, ?, ?, ?)',
+                [(run_id, result['name'], result['verdict'], result['wall'],
+                  result['cpu'], result['maxrss']) for result in results])
+        return run_id
+
+    def find_run(self, reference, lang):
+        """
+        Returns id of the latest run of given language matching
+        ``reference`` - either a tag or ``PREVIOUS_RUN``. Returns ``None`` if
+        there is no such run.
+        """
+        if reference == PREVIOUS_RUN:
+            row = self.connection.execute('SELECT id FROM runs WHERE '
+                'lang = ? ORDER BY id DESC LIMIT 1', (lang,)).fetchone()
+        else:
+            row = self.connection.execute('SELECT id FROM runs WHERE tag = ? '
+                'AND lang = ? ORDER BY id DESC LIMIT 1',
+                (reference, lang)).fetchone()
+        return row[0] if row else None
+
+    def get_results(self, run_id):
+        """
+        Returns dictionary mapping test names to their results in given run.
+        """
+        rows = self.connection.execute('SELECT name, verdict, wall, cpu, '
+            'maxrss FROM results WHERE run_id = ?', (run_id,))
+        return dict((row[0], {
+            'name': row[0],
+            'verdict': row[1],
+            'wall': row[2],
+            'cpu': row[3],
+            'maxrss': row[4],
+        }) for row in rows)
+
+    def get_latest_results(self, lang):
+        """
+        Returns dictionary mapping test names to their latest recorded
+        results in runs of given language (tests need not to be run by the
+        same run).
+        """
+        # SQLite takes bare columns from the row with maximal run_id
+        rows = self.connection.execute('SELECT name, verdict, wall, cpu, '
+            'maxrss, MAX(run_id) FROM results JOIN runs ON runs.id = run_id '
+            'WHERE runs.lang = ? GROUP BY name', (lang,))
+        return dict((row[0], {
+            'name': row[0],
+            'verdict': row[1],
+            'wall': row[2],
+            'cpu': row[3],
+            'maxrss': row[4],
+        }) for row in rows)
+
+
+def find_regressions(baseline, results, key='wall', threshold=0.1, noise=0.01):
+    """
+    Returns list of ``(name, before, after)`` for tests which are slower than
+    in the ``baseline`` by more than ``threshold`` (relative) and more than
+    ``noise`` (absolute, in seconds). Both ``baseline`` and ``results`` should
+    map test names to results.
+    """
+    regressions = []
+    for name in sorted(results):
+        if name not in baseline:
+            continue
+        before = baseline[name][key]
+        after = results[name][key]
+        if before is None or after is None:
+            continue
+        if after > before * (1 + threshold) and after - before > noise:
+            regressions.append((name, before, after))
+    return regressions
@@ -0,0 +1,110 @@
+"""
+Memory limits for test commands.
+
+By default memory is limited with ``setrlimit(RLIMIT_AS)`` applied in the
+child before it executes the solution. If a delegated cgroup v2 directory
+with memory controller enabled is given (``PORUNGA_CGROUP`` environment
+variable), each test is run within its own child cgroup instead - then the
+kernel reports peak usage and OOM kills precisely.
+"""
+import itertools
+import os
+import threading
+from porunga.utils.paths import joinpath
+
+
+CGROUP_ENV_VAR = 'PORUNGA_CGROUP'
+
+# messages printed by runtimes which failed to allocate memory
+OUT_OF_MEMORY_MARKERS = (
+    'MemoryError',
+    'std::bad_alloc',
+    'OutOfMemoryError',
+    'NoMemoryError',
+    'failed to allocate',
+    'Cannot allocate memory',
+)
+
+_counter = itertools.count()
+_counter_lock = threading.Lock()
+
+
+def read_file(path):
+    with open(path) as afile:
+        return afile.read()
+
+
+def write_file(path, content):
+    with open(path, 'w') as afile:
+        afile.write(content)
+
+
+def get_cgroup_root():
+    """
+    Returns delegated cgroup directory in which porunga may create cgroups
+    with memory controller or ``None`` if there is no such directory.
+    """
+    path = os.environ.get(CGROUP_ENV_VAR)
+    if not path:
+        return None
+    try:
+        controllers = read_file(joinpath(path, 'cgroup.subtree_control'))
+    except (IOError, OSError):
+        return None
+    if 'memory' not in controllers.split() or not os.access(path, os.W_OK):
+        return None
+    return path
+
+
+def is_out_of_memory_message(message):
+    return any(marker in message for marker in OUT_OF_MEMORY_MARKERS)
+
+
+class MemoryCgroup(object):
+    """
+    Child cgroup limiting memory of a single test command. Should be created
+    before the command is started (command moves itself into it before it is
+    executed) and destroyed once it is finished.
+    """
+
+    def __init__(self, root, limit):
+        with _counter_lock:
+            number = next(_counter)
+        self.path = joinpath(root, 'porunga-%d-%d' % (os.getpid(), number))
+        self.limit = limit
+        os.mkdir(self.path)
+        write_file(joinpath(self.path, 'memory.max'), str(int(limit)))
+        try:
+            write_file(joinpath(self.path, 'memory.swap.max'), '0')
+        except (IOError, OSError):
+            pass
+
+    def get_procs_path(self):
+        return joinpath(self.path, 'cgroup.procs')
+
+    def get_peak(self):
+        """
+        Returns peak memory usage (in bytes) or ``None`` if kernel does not
+        report it.
+        """
+        try:
+            return int(read_file(joinpath(self.path, 'memory.peak')))
+        except (IOError, OSError, ValueError):
+            return None
+
+    def was_oom_killed(self):
+        try:
+            events = read_file(joinpath(self.path, 'memory.events'))
+        except (IOError, OSError):
+            return False
+        for line in events.splitlines():
+            key, value = line.split()
+            if key == 'oom_kill':
+                return int(value) > 0
+        return False
+
+    def destroy(self):
+        try:
+            os.rmdir(self.path)
+        except OSError:
+            pass
@@ -0,0 +1,123 @@
+"""
+Cache of precompiled headers of C and C++ solutions.
+
+Solutions often start with ``#include <bits/stdc++.h>``, which takes most of
+their compilation time. Such header is precompiled once per compiler version
+and compiler command (flags must match for the compiler to accept it) and its
+directory is added to the include path: ``gcc`` looks for ``header.gch``
+before the header itself and silently falls back to the header if the
+precompiled one can not be used.
+
+Only the first include of a source file can be precompiled and only if no
+code precedes it.
+"""
+import os
+import re
+import shutil
+import subprocess
+import tempfile
+from porunga.compilecache import get_compiler_version
+from porunga.utils.hashing import text_digest
+from porunga.utils.paths import get_cache_dir
+from porunga.utils.paths import joinpath
+from shlex import quote
+
+
+PCH_SUFFIX = '.gch'
+
+_include = re.compile(r'#\s*include\s*<([^>]+)>')
+_any_include = re.compile(r'#\s*include')
+
+
+def get_first_include(path):
+    """
+    Returns system header included by the source file at ``path`` before any
+    code (``None`` if there is none). Comments and other preprocessor
+    directives may precede it.
+    """
+    try:
+        with open(path, 'rb') as afile:
+            lines = afile.read().decode('utf-8', 'replace').splitlines()
+    except (IOError, OSError):
+        return None
+    in_comment = False
+    for line in lines:
+        line = line.strip()
+        if in_comment:
+            if '*/' not in line:
+                continue
+            in_comment = False
+            line = line.split('*/', 1)[1].strip()
+        if line.startswith('/*'):
+            if '*/' not in line:
+                in_comment = True
+                continue
+            line = line.split('*/', 1)[1].strip()
+        if not line or line.startswith('//'):
+            continue
+        match = _include.match(line)
+        if match:
+            return match.group(1)
+        if not line.startswith('#') or _any_include.match(line):
+            return None
+    return None
+
+
+class HeaderCache(object):
+    """
+    Directories with precompiled headers, one per header and compiler
+    command.
+    """
+
+    def __init__(self, directory=None):
+        self.directory = directory or get_cache_dir('pch')
+
+    def get_key(self, compiler, header, language):
+        return text_digest(compiler, get_compiler_version(compiler), header,
+            language)
+
+    def get_include_dir(self, compiler, header, language):
+        """
+        Returns directory containing ``header`` precompiled by ``compiler``
+        command template (with ``{fin}`` and ``{fout}`` fields) as given
+        ``language`` (i.e. ``c++-header``). Header is precompiled first if
+        needed. Returns ``None`` if it could not be precompiled; failures are
+        cached too, so it is never tried again.
+        """
+        include_dir = joinpath(self.directory, self.get_key(compiler, header,
+            language))
+        if not os.path.isdir(include_dir):
+            self.build(include_dir, compiler, header, language)
+        if not os.path.isfile(joinpath(include_dir, header + PCH_SUFFIX)):
+            return None
+        return include_dir
+
+    def build(self, include_dir, compiler, header, language):
+        try:
+            if not os.path.isdir(self.directory):
+                os.makedirs(self.directory)
+            tmp = tempfile.mkdtemp(prefix='tmp-', dir=self.directory)
+        except OSError:
+            return
+        try:
+            wrapper = joinpath(tmp, 'header.h')
+            with open(wrapper, 'w') as afile:
+                afile.write('#include <%s>\n' % header)
+            target = joinpath(tmp, header + PCH_SUFFIX)
+            if not os.path.isdir(os.path.dirname(target)):
+                os.makedirs(os.path.dirname(target))
+            program = compiler.format(fin='-x %s %s' % (language,
+                quote(wrapper)), fout=quote(target))
+            proc = subprocess.Popen(program, shell=True,
+                stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+            proc.communicate()
+            if proc.returncode != 0 and os.path.exists(target):
+                os.remove(target)
+            os.remove(wrapper)
+            # someone else might have built it in the meantime
+            if not os.path.isdir(include_dir):
+                os.rename(tmp, include_dir)
+        except (IOError, OSError):
+            pass
+        finally:
+            shutil.rmtree(tmp, ignore_errors=True)
@@ -0,0 +1,131 @@
+"""
+Pinning tests to dedicated CPUs (``--pin``).
+
+Each test process is pinned to a CPU which no other test uses at the same
+time, so it is not migrated between cores and tests do not compete for them.
+First available CPU (the one which usually handles most interrupts) is left
+for porunga itself, unless it is the only one.
+
+Noise of timings is estimated by timing a short calibration loop a few times
+on each of the CPUs used for tests: the more its timings vary, the less
+precise timings of tests are.
+
+Pinning needs ``os.sched_setaffinity``, which is not available everywhere
+(i.e. on macOS); ``--pin`` is rejected there.
+"""
+import argparse
+import contextlib
+import multiprocessing
+import os
+import queue
+from porunga.procme import monotonic
+from porunga.utils.stats import mean
+from porunga.utils.stats import stddev
+
+
+CALIBRATION_LOOPS = 50000
+CALIBRATION_SAMPLES = 5
+
+
+def is_supported():
+    """
+    Tells if processes can be pinned to CPUs on this system.
+    """
+    return hasattr(os, 'sched_setaffinity')
+
+
+class PinAction(argparse.Action):
+    """
+    Sets ``--pin`` flag (like ``store_true``) or fails if pinning is not
+    supported.
+    """
+
+    def __init__(self, option_strings, dest, default=False, **kwargs):
+        super(PinAction, self).__init__(option_strings, dest, nargs=0,
+            default=default, **kwargs)
+
+    def __call__(self, parser, namespace, values, option_string=None):
+        if not is_supported():
+            parser.error('%s is not supported on this system (CPU affinity '
+                'can not be set)' % option_string)
+        setattr(namespace, self.dest, True)
+
+
+def get_available_cpus():
+    """
+    Returns sorted list of CPUs this process may run on.
+    """
+    try:
+        return sorted(os.sched_getaffinity(0))
+    except AttributeError:
+        return list(range(multiprocessing.cpu_count()))
+
+
+def split_cpus(cpus, reserve=1):
+    """
+    Returns ``(reserved, free)`` lists of CPUs: first ``reserve`` ones are
+    reserved (for porunga itself) if there are more CPUs than that.
+    """
+    cpus = list(cpus)
+    if len(cpus) <= reserve:
+        return [], cpus
+    return cpus[:reserve], cpus[reserve:]
+
+
+class CpuPool(object):
+    """
+    Hands out CPUs to concurrently run tests, one CPU per test.
+    """
+
+    def __init__(self, cpus):
+        self.cpus = list(cpus)
+        self.free = queue.Queue()
+        for cpu in self.cpus:
+            self.free.put(cpu)
+
+    @contextlib.contextmanager
+    def pinned(self):
+        """
+        Yields set with a single CPU, not used by anyone else until the
+        block ends.
+        """
+        cpu = self.free.get()
+        try:
+            yield set([cpu])
+        finally:
+            self.free.put(cpu)
+
+
+def time_calibration_loop(loops=CALIBRATION_LOOPS):
+    started = monotonic()
+    total = 0
+    for number in range(loops):
+        total += number
+    return monotonic() - started
+
+
+def estimate_noise(cpus, samples=CALIBRATION_SAMPLES):
+    """
+    Times calibration loop ``samples`` times on each of ``cpus`` (calling
+    thread is moved there for a while) and returns list of timings.
+    """
+    original = os.sched_getaffinity(0)
+    timings = []
+    try:
+        for cpu in cpus:
+            os.sched_setaffinity(0, [cpu])
+            time_calibration_loop(CALIBRATION_LOOPS // 10)
+            timings.extend(time_calibration_loop() for sample in
+                range(samples))
+    finally:
+        os.sched_setaffinity(0, original)
+    return timings
+
+
+def get_noise(timings):
+    """
+    Returns relative standard deviation of calibration ``timings``.
+    """
+    if len(timings) < 2:
+        return 0.0
+    return stddev(timings) / mean(timings)
@@ -1,77 +1,450 @@
 from __future__ import print_function
-import datetime
+import codecs
+import contextlib
+import errno
+import math
 import os
+import resource
+import selectors
+import shutil
+import signal
 import subprocess
-import tempfile
-import threading
+import sys
 import time
+from shlex import quote
+
+
+CHUNK_SIZE = 64 * 1024
+STDERR_LIMIT = 64 * 1024
+
+# ru_maxrss is given in kilobytes on Linux and in bytes on OS X
+MAXRSS_UNIT = 1 if sys.platform == 'darwin' else 1024
+
+# peak memory of commands smaller than porunga itself is sampled at most this
+# often (in seconds), more often just after they are started
+MEMORY_SAMPLE_INTERVAL = 0.01
+
+# ulimit options (and units) of limits set up before command is executed
+ULIMIT_OPTIONS = {
+    resource.RLIMIT_CPU: ('-t', 1),
+    resource.RLIMIT_AS: ('-v', 1024),
+}
+
+monotonic = time.monotonic
 
 
 class TimeoutExceeded(RuntimeError):
     pass
 
 
+def open_pidfd(pid):
+    """
+    Returns file descriptor which becomes readable once process with given
+    ``pid`` exits or ``None`` if it is not supported by the platform.
+    """
+    try:
+        return os.pidfd_open(pid)
+    except (AttributeError, OSError):
+        return None
+
+
+def read_peak_rss(pid='self'):
+    """
+    Returns peak resident set size (in bytes) of the process as reported by
+    ``/proc`` or ``None`` if it is not available (the process has exited or
+    there is no ``/proc``).
+    """
+    try:
+        with open('/proc/%s/status' % pid, 'rb') as afile:
+            for line in afile:
+                if line.startswith(b'VmHWM:'):
+                    return int(line.split()[1]) * 1024
+    except (IOError, OSError, ValueError):
+        pass
+    return None
+
+
+@contextlib.contextmanager
+def inherited_affinity(cpus):
+    """
+    Pins calling thread to ``cpus`` (if given) for the duration of the block,
+    so processes it starts inherit that affinity. Affinity is a property of
+    a thread, so other threads are not affected. Where affinity can not be
+    set, ``cpus`` are ignored.
+    """
+    if not cpus or not hasattr(os, 'sched_setaffinity'):
+        yield
+        return
+    original = os.sched_getaffinity(0)
+    os.sched_setaffinity(0, cpus)
+    try:
+        yield
+    finally:
+        os.sched_setaffinity(0, original)
+
+
+def get_returncode(status):
+    if os.WIFSIGNALED(status):
+        return -os.WTERMSIG(status)
+    return os.WEXITSTATUS(status)
+
+
 class Command(object):
+    """
+    Runs a command and reads its output directly from the pipe. By default
+    stderr is merged into the output; if ``stderr`` is ``subprocess.PIPE``,
+    first ``STDERR_LIMIT`` bytes of it are kept at ``error_output`` instead.
+    Output is multiplexed with ``selectors`` and deadline is checked against
+    monotonic clock, so output is read as soon as it is written. Command is
+    started within its own session (and process group) and whole group is
+    killed if ``timeout`` is exceeded.
+
+    Once command finishes, its resource usage (including its waited-for
+    children) is available: ``user_time``, ``system_time``, ``wall_time`` (in
+    seconds) and ``max_rss`` (in bytes). If ``cpu_timeout`` is given, CPU time
+    of the command is limited too.
+
+    Peak memory reported by ``wait4`` is never lower than peak memory of the
+    process which started the command (kernel keeps it across exec). If it is
+    not higher than porunga's own peak, it could be porunga's, so peak of the
+    command is sampled from ``/proc`` while it runs instead (memory allocated
+    in the last few milliseconds before exit may be missed then).
+
+    If ``memory_limit`` (in bytes) is given, address space of the command is
+    limited, unless ``cgroup`` (see ``porunga.limits.MemoryCgroup``) is given
+    - then command is moved into that cgroup before it is executed.
+
+    ``stdin`` (file object or descriptor) is passed to the command as is, so
+    i.e. an opened input file is read by the command directly. Alternatively,
+    ``input`` (bytes or binary file object, i.e. a decompressing stream) is
+    written to command's stdin as it is able to read it.
+
+    ``env`` (if given) replaces environment of the command.
+
+    ``cpus`` (set of CPU numbers) pins the command to given CPUs and ``nice``
+    is added to its niceness.
 
-    def __init__(self, cmd, stream=None, shell=False, timeout=None):
+    No Python code is run between fork and exec, as it may deadlock if
+    commands are started from several threads. Limits, cgroup and niceness
+    are set up by a tiny shell script which then executes the command.
+    """
+
+    def __init__(self, cmd, stream=None, shell=False, timeout=None,
+            cpu_timeout=None, stderr=subprocess.STDOUT, stdin=None,
+            memory_limit=None, cgroup=None, input=None, env=None, cpus=None,
+            nice=None):
         self.cmd = cmd
+        self.env = env
+        self.cpus = cpus
+        self.nice = nice
+        self.input = input
+        self.memory_limit = memory_limit
+        self.cgroup = cgroup
+        self.stdin = stdin
+        self.stderr = stderr
+        self.error_output = b''
         self.process = None
-        self.thread = None
         self.returncode = None
-        self.stream = stream or tempfile.NamedTemporaryFile()
+        self.stream = stream
         self.shell = shell
         self.timeout = timeout
-        self.output = ''
+        self.cpu_timeout = cpu_timeout
+        self.timeouted = False
+        self.chunks = []
+        self.rusage = None
+        self.started = None
+        self.wall_time = None
+        self.rss_floor = None
+        self.sampled_rss = None
+        self.next_sample = None
+        self.sample_interval = None
 
     def __str__(self):
         return '<Command: %s | %r>' % (self.returncode, self.cmd)
 
-    def run_in_thread(self):
-        def target():
+    @property
+    def output(self):
+        return ''.join(self.chunks)
+
+    @property
+    def user_time(self):
+        return self.rusage.ru_utime if self.rusage else None
+
+    @property
+    def system_time(self):
+        return self.rusage.ru_stime if self.rusage else None
+
+    @property
+    def cpu_time(self):
+        if not self.rusage:
+            return None
+        return self.rusage.ru_utime + self.rusage.ru_stime
+
+    @property
+    def max_rss(self):
+        if not self.rusage:
+            return None
+        max_rss = self.rusage.ru_maxrss * MAXRSS_UNIT
+        if self.rss_floor is not None and max_rss <= self.rss_floor:
+            return self.sampled_rss or 0
+        return max_rss
+
+    def get_rlimits(self):
+        """
+        Returns list of ``(resource, (soft, hard))`` limits applied to the
+        command before it is executed.
+        """
+        rlimits = []
+        if self.cpu_timeout:
+            # process is killed by the kernel only if it runs well over the
+            # limit; verdict is based on measured CPU time
+            soft = int(math.ceil(self.cpu_timeout)) + 1
+            rlimits.append((resource.RLIMIT_CPU, (soft, soft + 1)))
+        if self.memory_limit and self.cgroup is None:
+            limit = int(self.memory_limit)
+            rlimits.append((resource.RLIMIT_AS, (limit, limit)))
+        return rlimits
+
+    def get_setup_script(self):
+        """
+        Returns shell script setting up the command (and executing it, given
+        as script's arguments) or ``None`` if there is nothing to set up.
+        """
+        commands = []
+        for rlimit, (soft, hard) in self.get_rlimits():
+            option, unit = ULIMIT_OPTIONS[rlimit]
+            commands.append('ulimit -S %s %d' % (option, soft // unit))
+            commands.append('ulimit -H %s %d' % (option, hard // unit))
+        if self.cgroup is not None:
+            commands.append('echo $$ > %s' % quote(
+                self.cgroup.get_procs_path()))
+        if not commands and not self.nice:
+            return None
+        if self.nice:
+            commands.append('exec nice -n %d "$@"' % self.nice)
+        else:
+            commands.append('exec "$@"')
+        return ' && '.join(commands)
+
+    def get_argv(self):
+        """
+        Returns arguments of the process to start - either the command itself
+        or the setup script executing it.
+        """
+        if self.shell:
+            argv = ['/bin/sh', '-c', self.cmd]
+        elif isinstance(self.cmd, str):
+            argv = [self.cmd]
+        else:
+            argv = list(self.cmd)
+        script = self.get_setup_script()
+        if script is None:
+            return argv
+        # report missing program as Popen would, not as a failure of script
+        path = (self.env if self.env is not None else os.environ).get('PATH')
+        if shutil.which(argv[0], path=path) is None:
+            raise FileNotFoundError(errno.ENOENT, os.strerror(errno.ENOENT),
+                argv[0])
+        return ['/bin/sh', '-c', script, 'porunga'] + argv
+
+    def start(self):
+        argv = self.get_argv()
+        self.started = monotonic()
+        stdin = self.stdin
+        if self.input is not None:
+            stdin = subprocess.PIPE
+        with inherited_affinity(self.cpus):
             self.process = subprocess.Popen(
-                self.cmd,
-                stdout=self.stream,
-                stderr=subprocess.STDOUT,
-                shell=self.shell,
+                argv,
+                stdin=stdin,
+                stdout=subprocess.PIPE,
+                stderr=self.stderr,
+                env=self.env,
+                start_new_session=True,
             )
-            self.process.communicate()
-            self.returncode = self.process.returncode
-
-        self.thread = threading.Thread(target=target)
-        self.thread.start()
-        return self.thread
-
-    def iter_output_for_stream(self, stream, pause=0.05):
-        """
-        """
-        afile = open(stream.name)
-        thread = self.run_in_thread()
-        start = datetime.datetime.now()
-
-        def should_run():
-            should = self.returncode is None
-            if self.timeout:
-                delta = (datetime.datetime.now() - start).total_seconds()
-                should = should and delta < self.timeout
-            return should
-
-        # we need to run at least once as at this time as for very fast commands
-        # process might already finish and returncode already set
-        while True:
-            if afile.tell() < os.path.getsize(afile.name):
-                chunk = afile.read()
-                self.output += chunk
-                yield chunk
-            if not should_run():
-                break
-            time.sleep(pause)
-
-        if thread.is_alive():
-            self.process.terminate()
-            thread.join()
+        # exec has already happened, so porunga's peak can't be any lower
+        # than what the command has inherited
+        self.rss_floor = read_peak_rss()
+        if self.rss_floor is not None:
+            self.next_sample = self.started
+            self.sample_interval = 0.0002
+            self.sample_memory()
+        return self.process
+
+    def sample_memory(self):
+        """
+        Samples peak memory of the running command if it is time to. Sets
+        ``next_sample`` to ``None`` once no more samples are needed.
+        """
+        now = monotonic()
+        if self.next_sample is None or now < self.next_sample:
+            return
+        if self.returncode is None:
+            peak = read_peak_rss(self.process.pid)
+            if peak is not None:
+                self.sampled_rss = max(self.sampled_rss or 0, peak)
+        if self.returncode is not None or (self.sampled_rss or 0) > \
+                self.rss_floor:
+            # from now on peak reported by wait4 is the command's own
+            self.next_sample = None
+            return
+        self.next_sample = now + self.sample_interval
+        self.sample_interval = min(self.sample_interval * 2,
+            MEMORY_SAMPLE_INTERVAL)
+
+    def get_wait_timeout(self, deadline):
+        """
+        Returns how long to wait for the command - until ``deadline`` or the
+        next memory sample (``None`` if there is no such moment).
+        """
+        moments = [moment for moment in (deadline, self.next_sample)
+            if moment is not None]
+        if not moments:
+            return None
+        return max(min(moments) - monotonic(), 0)
+
+    def reap(self, options=0):
+        """
+        Collects exit status and resource usage of the process. Returns
+        ``False`` if ``options`` contain ``os.WNOHANG`` and process is still
+        running.
+        """
+        pid, status, rusage = os.wait4(self.process.pid, options)
+        if pid == 0:
+            return False
+        self.wall_time = monotonic() - self.started
+        self.rusage = rusage
+        self.returncode = self.process.returncode = get_returncode(status)
+        return True
+
+    def kill(self):
+        """
+        Kills whole process group of the command.
+        """
+        if self.process is None:
+            return
+        try:
+            os.killpg(self.process.pid, signal.SIGKILL)
+        except OSError:
+            pass
+
+    def wait(self, deadline=None):
+        """
+        Waits for the process to finish and returns its return code. If
+        ``deadline`` passes in the meantime, ``TimeoutExceeded`` is raised.
+        """
+        if self.returncode is not None:
+            return self.returncode
+        if deadline is None:
+            self.reap()
+            return self.returncode
+        pause = 0.001
+        while not self.reap(os.WNOHANG):
+            self.sample_memory()
+            remaining = deadline - monotonic()
+            if remaining <= 0:
+                raise TimeoutExceeded
+            time.sleep(min(pause, remaining))
+            pause = min(pause * 2, 0.05)
+        return self.returncode
+
+    def check_cpu_timeout(self):
+        if self.cpu_timeout and self.cpu_time > self.cpu_timeout:
             raise TimeoutExceeded
 
-    def iter_output(self, pause=0.05):
+    def iter_raw_output(self, chunk_size=CHUNK_SIZE):
+        """
+        Returns iterator of chunked output (as bytes), as soon as command
+        writes it. If iterator is closed before command finishes, command is
+        killed.
+        """
+        self.start()
+        deadline = None
+        if self.timeout:
+            # measured from the same moment as wall time
+            deadline = self.started + self.timeout
+        fd = self.process.stdout.fileno()
+        errfd = None
+        pidfd = open_pidfd(self.process.pid)
+        selector = selectors.DefaultSelector()
+        selector.register(fd, selectors.EVENT_READ)
+        if self.process.stderr is not None:
+            errfd = self.process.stderr.fileno()
+            selector.register(errfd, selectors.EVENT_READ)
+        infd = None
+        if self.process.stdin is not None:
+            infd = self.process.stdin.fileno()
+            os.set_blocking(infd, False)
+            selector.register(infd, selectors.EVENT_WRITE)
+            if hasattr(self.input, 'read'):
+                source = self.input
+                pending = memoryview(b'')
+            else:
+                source = None
+                pending = memoryview(self.input)
+        if pidfd is not None:
+            selector.register(pidfd, selectors.EVENT_READ)
+        try:
+            while fd in selector.get_map():
+                if deadline is not None and deadline <= monotonic():
+                    raise TimeoutExceeded
+                events = selector.select(self.get_wait_timeout(deadline))
+                self.sample_memory()
+                for key, mask in events:
+                    if key.fd == pidfd:
+                        selector.unregister(pidfd)
+                        self.reap()
+                        continue
+                    if key.fd == infd:
+                        if not pending and source is not None:
+                            pending = memoryview(source.read(chunk_size))
+                            if not pending:
+                                source = None
+                        try:
+                            written = os.write(infd, pending[:chunk_size])
+                        except (BrokenPipeError, BlockingIOError) as err:
+                            written = 0
+                            if isinstance(err, BrokenPipeError):
+                                pending = pending[:0]
+                                source = None
+                        pending = pending[written:]
+                        if not pending and source is None:
+                            selector.unregister(infd)
+                            self.process.stdin.close()
+                        continue
+                    chunk = os.read(key.fd, chunk_size)
+                    if not chunk:
+                        selector.unregister(key.fd)
+                        continue
+                    if key.fd == errfd:
+                        missing = STDERR_LIMIT - len(self.error_output)
+                        self.error_output += chunk[:max(missing, 0)]
+                        continue
+                    if self.stream is not None:
+                        self.stream.write(chunk)
+                    yield chunk
+            self.wait(deadline)
+            self.check_cpu_timeout()
+        except TimeoutExceeded:
+            self.timeouted = True
+            raise
+        finally:
+            selector.close()
+            if pidfd is not None:
+                os.close(pidfd)
+            self.process.stdout.close()
+            stdin = self.process.stdin
+            if stdin is not None and not stdin.closed:
+                stdin.close()
+            if self.process.stderr is not None:
+                self.process.stderr.close()
+            if self.returncode is None or self.timeouted:
+                # group may still have members even if its leader has exited
+                self.kill()
+            if self.returncode is None:
+                self.reap()
+
+    def iter_output(self, pause=None):
         """
         Returns iterator of chunked output.
 
@@ -79,8 +452,8 @@ class Command(object):
         :param shell: Tells if process should be run within a shell. Default: False
         :param timeout: If command exceeds given ``timeout`` in seconds,
         ``TimeoutExceeded`` exception would be raised. Default: None
-        :param pause: How long (in seconds) we should wait for the output.
-        Default: 0.05
+        :param pause: Not used anymore, output is read as soon as it is
+        available. Kept for backward compatibility.
 
         Example::
 
@@ -88,9 +461,16 @@ class Command(object):
             >>> for chunk in command.iter_output():
             ...     print(chunk, end='')
         """
-        with self.stream as temp:
-            for chunk in self.iter_output_for_stream(temp, pause=pause):
-                yield chunk
+        decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+        for chunk in self.iter_raw_output():
+            text = decoder.decode(chunk)
+            if text:
+                self.chunks.append(text)
+                yield text
+        text = decoder.decode(b'', final=True)
+        if text:
+            self.chunks.append(text)
+            yield text
 
     def run(self):
         for chunk in self.iter_output():
@@ -104,9 +484,8 @@ if __name__ == '__main__':
     timeout = 0.5
     command = Command(cmd, shell=True, timeout=timeout)
     try:
-        for chunk in command.iter_output(pause=0.2):
+        for chunk in command.iter_output():
             print(chunk, end='')
     except TimeoutExceeded as err:
         print(" -> Timeouted after %s" % timeout)
     print(" -> Command finished with returncode: %s" % command.returncode)
-
@@ -0,0 +1,143 @@
+"""
+Profiling of a solution over the whole suite (``--profile``).
+
+Python solutions are run under ``cProfile`` and statistics of all test cases
+are merged. C and C++ solutions are compiled with ``-pg`` and ``gmon.out``
+files written by all test cases are summed with ``gprof``. Raw profile data
+are kept in ``.porunga-profile`` directory of the problem (``suite.prof`` can
+be opened with ``pstats`` or i.e. ``snakeviz``, ``gmon.sum`` with
+``gprof``).
+
+Profilers return functions ordered by time spent in them (not counting
+functions they call) as ``(self, total, calls, name)`` tuples; ``total`` and
+``calls`` may be ``None`` if they are unknown.
+"""
+import glob
+import itertools
+import os
+import pstats
+import re
+import shutil
+import subprocess
+import threading
+from porunga.utils.paths import joinpath
+
+
+PROFILE_DIRNAME = '.porunga-profile'
+
+GPROF_LINE = re.compile(r'^\s*[\d.]+\s+[\d.]+\s+(?P<self>[\d.]+)\s+'
+    r'(?:(?P<calls>\d+)\s+[\d.]+\s+(?P<total>[\d.]+)\s+)?(?P<name>\S.*)$')
+
+
+class ProfileError(Exception):
+    pass
+
+
+class Profiler(object):
+    """
+    Collects profile data in ``directory`` (which is emptied first).
+    ``program`` is the path of the executed solution.
+    """
+
+    def __init__(self, directory, program):
+        self.directory = directory
+        self.program = program
+        self.counter = itertools.count(1)
+        self.lock = threading.Lock()
+        shutil.rmtree(directory, ignore_errors=True)
+        os.makedirs(directory)
+
+    def get_path(self, pattern):
+        with self.lock:
+            number = next(self.counter)
+        return joinpath(self.directory, pattern % number)
+
+    def prepare(self, cmd):
+        """
+        Returns ``(cmd, env)`` for running single test case under the
+        profiler (``env`` is ``None`` if environment is not changed).
+        """
+        return cmd, None
+
+    def collect(self):
+        raise NotImplementedError
+
+
+class PythonProfiler(Profiler):
+
+    def prepare(self, cmd):
+        path = self.get_path('case-%d.prof')
+        return [cmd[0], '-m', 'cProfile', '-o', path] + cmd[1:], None
+
+    def collect(self):
+        stats = None
+        for path in sorted(glob.glob(joinpath(self.directory, 'case-*.prof'))):
+            try:
+                if stats is None:
+                    stats = pstats.Stats(path)
+                else:
+                    stats.add(path)
+            except Exception:
+                # test was killed while profile was written
+                continue
+        if stats is None:
+            return []
+        stats.dump_stats(joinpath(self.directory, 'suite.prof'))
+        rows = [(tt, ct, nc, pstats.func_std_string(func))
+                for func, (cc, nc, tt, ct, callers) in stats.stats.items()]
+        rows.sort(key=lambda row: row[0], reverse=True)
+        return rows
+
+
+class GprofProfiler(Profiler):
+    """
+    Binary must be compiled with ``-pg``. Each test writes its own
+    ``gmon.out.PID`` file (see ``GMON_OUT_PREFIX``).
+    """
+
+    def prepare(self, cmd):
+        env = dict(os.environ)
+        env['GMON_OUT_PREFIX'] = joinpath(self.directory, 'gmon.out')
+        return cmd, env
+
+    def gprof(self, *args):
+        try:
+            process = subprocess.Popen(('gprof',) + args, cwd=self.directory,
+                stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        except OSError as err:
+            raise ProfileError('Could not run gprof: %s' % err)
+        out, err = process.communicate()
+        if process.returncode != 0:
+            raise ProfileError('gprof failed: %s' % err.decode('utf-8',
+                'replace').strip())
+        return out.decode('utf-8', 'replace')
+
+    def collect(self):
+        program = os.path.abspath(self.program)
+        files = sorted(os.path.basename(path) for path in
+            glob.glob(joinpath(self.directory, 'gmon.out.*')))
+        if not files:
+            return []
+        self.gprof('-s', program, *files)
+        flat = self.gprof('-b', '-p', program, 'gmon.sum')
+        with open(joinpath(self.directory, 'gprof.txt'), 'w') as afile:
+            afile.write(flat)
+        rows = []
+        for line in flat.splitlines():
+            match = GPROF_LINE.match(line)
+            if match is None:
+                continue
+            calls = total = None
+            if match.group('calls'):
+                calls = int(match.group('calls'))
+                total = float(match.group('total')) * calls / 1000
+            rows.append((float(match.group('self')), total, calls,
+                match.group('name').strip()))
+        rows.sort(key=lambda row: row[0], reverse=True)
+        return rows
+
+
+PROFILERS = {
+    'cprofile': PythonProfiler,
+    'gprof': GprofProfiler,
+}
@@ -0,0 +1,195 @@
+"""
+Machine readable reports of test runs (``--report FORMAT:PATH``).
+
+* ``jsonl`` - JSON object per test (written as soon as test finishes) and
+  summary object at the end,
+* ``junit`` - JUnit XML, understood by most CI servers,
+* ``trace`` - Chrome trace event file (open it with ``chrome://tracing`` or
+  https://ui.perfetto.dev) showing compilation, tests run by each worker and
+  workers' idle gaps.
+
+Report is started with a ``suite`` dictionary (``name``, ``lang``,
+``binary``, ``started`` - monotonic clock - and optional ``compile`` span,
+``(started, finished)``), then gets results of tests (as returned by
+``PorungaTestCommand.run_test``) and is closed once ``finished`` is added to
+the suite.
+"""
+import json
+import xml.etree.ElementTree as ElementTree
+from porunga.verdicts import VERDICT_WRONG_ANSWER
+
+
+class Report(object):
+
+    def __init__(self, path):
+        self.path = path
+        self.suite = None
+        self.results = []
+
+    def start(self, suite):
+        self.suite = suite
+
+    def add(self, info):
+        self.results.append(info)
+
+    def close(self, suite):
+        raise NotImplementedError
+
+
+class JsonLinesReport(Report):
+
+    def __init__(self, path):
+        super(JsonLinesReport, self).__init__(path)
+        self.file = open(path, 'w')
+
+    def get_record(self, info):
+        return {
+            'type': 'test',
+            'name': info['fin'],
+            'verdict': info['verdict'],
+            'success': info['success'],
+            'wall': info['time'],
+            'utime': info['utime'],
+            'stime': info['stime'],
+            'maxrss': info['maxrss'],
+            'returncode': info['returncode'],
+            'worker': info['worker'],
+            'started': info['started'] - self.suite['started'],
+        }
+
+    def add(self, info):
+        super(JsonLinesReport, self).add(info)
+        self.file.write(json.dumps(self.get_record(info)) + '\n')
+        self.file.flush()
+
+    def close(self, suite):
+        fails = sum(1 for info in self.results if not info['success'])
+        self.file.write(json.dumps({
+            'type': 'summary',
+            'name': suite['name'],
+            'lang': suite['lang'],
+            'tests': len(self.results),
+            'failures': fails,
+            'wall': suite['finished'] - suite['started'],
+        }) + '\n')
+        self.file.close()
+
+
+class JUnitReport(Report):
+    """
+    Wrong answers are reported as failures, other failed verdicts (runtime
+    errors, timeouts, exceeded memory limit) as errors.
+    """
+
+    def close(self, suite):
+        failures = errors = 0
+        testsuite = ElementTree.Element('testsuite', name=suite['name'])
+        for info in self.results:
+            testcase = ElementTree.SubElement(testsuite, 'testcase',
+                classname=suite['name'], name=info['fin'],
+                time='%.6f' % info['time'])
+            if info['success']:
+                continue
+            if info['verdict'] == VERDICT_WRONG_ANSWER:
+                failures += 1
+                tag = 'failure'
+            else:
+                errors += 1
+                tag = 'error'
+            problem = ElementTree.SubElement(testcase, tag,
+                message=info['verdict'], type=info['verdict'])
+            problem.text = info['output']
+            if info['errors']:
+                stderr = ElementTree.SubElement(testcase, 'system-err')
+                stderr.text = info['errors']
+        testsuite.set('tests', str(len(self.results)))
+        testsuite.set('failures', str(failures))
+        testsuite.set('errors', str(errors))
+        testsuite.set('time', '%.6f' % (suite['finished'] - suite['started']))
+        testsuites = ElementTree.Element('testsuites')
+        testsuites.append(testsuite)
+        ElementTree.ElementTree(testsuites).write(self.path, encoding='utf-8',
+            xml_declaration=True)
+
+
+class TraceReport(Report):
+    """
+    Compilation is shown on the ``main`` lane, tests on lanes of workers
+    which run them, with gaps between tests shown as ``idle`` spans.
+    """
+    pid = 1
+
+    def get_span(self, name, category, tid, started, finished, origin,
+            args=None):
+        return {
+            'name': name,
+            'cat': category,
+            'ph': 'X',
+            'pid': self.pid,
+            'tid': tid,
+            'ts': (started - origin) * 1e6,
+            'dur': (finished - started) * 1e6,
+            'args': args or {},
+        }
+
+    def get_lane(self, tid, name):
+        return {'name': 'thread_name', 'ph': 'M', 'pid': self.pid, 'tid': tid,
+                'args': {'name': name}}
+
+    def close(self, suite):
+        origin = suite['started']
+        events = [
+            {'name': 'process_name', 'ph': 'M', 'pid': self.pid,
+             'args': {'name': 'porunga test %s' % suite['name']}},
+            self.get_lane(0, 'main'),
+        ]
+        if suite.get('compile'):
+            started, finished = suite['compile']
+            events.append(self.get_span('compile', 'compile', 0, started,
+                finished, origin, {'binary': suite['binary']}))
+        lanes = {}
+        for info in sorted(self.results, key=lambda info: info['started']):
+            if info['worker'] not in lanes:
+                lanes[info['worker']] = [len(lanes) + 1, None]
+                events.append(self.get_lane(len(lanes), info['worker']))
+            lane = lanes[info['worker']]
+            if lane[1] is not None and info['started'] > lane[1]:
+                events.append(self.get_span('idle', 'idle', lane[0], lane[1],
+                    info['started'], origin))
+            events.append(self.get_span(info['fin'], 'test', lane[0],
+                info['started'], info['finished'], origin, {
+                    'verdict': info['verdict'],
+                    'utime': info['utime'],
+                    'stime': info['stime'],
+                    'maxrss': info['maxrss'],
+                }))
+            lane[1] = info['finished']
+        with open(self.path, 'w') as afile:
+            json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'}, afile)
+
+
+REPORTS = {
+    'jsonl': JsonLinesReport,
+    'junit': JUnitReport,
+    'trace': TraceReport,
+}
+
+
+def parse_report_option(value):
+    """
+    Returns ``(format, path)`` for ``FORMAT:PATH`` value of ``--report``.
+    Raises ``ValueError`` if it is invalid.
+    """
+    format, sep, path = value.partition(':')
+    if not sep or not path:
+        raise ValueError('Report should be given as FORMAT:PATH, got %r'
+            % value)
+    if format not in REPORTS:
+        raise ValueError('Unknown report format %r (available: %s)' % (
+            format, ', '.join(sorted(REPORTS))))
+    return format, path
+
+
+def open_report(value):
+    format, path = parse_report_option(value)
+    return REPORTS[format](path)
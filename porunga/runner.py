@@ -0,0 +1,225 @@
+"""
+Programmatic API of porunga.
+
+``run_suite`` tests solution of a problem just like ``porunga test`` does and
+returns ``SuiteResult``, using ``porunga.engine`` directly: nothing is printed
+and errors are raised as ``RunnerError`` instead of exiting. Options are the ones of ``porunga test``,
+with dashes replaced by underscores::
+
+    >>> suite = run_suite('foobar', 'cpp', timeout=2.0, memory_limit=256)
+    >>> suite.success
+    True
+    >>> [(result.name, result.verdict, result.time) for result in suite]
+    [('testdata/test1.in', 'ok', 0.012), ...]
+
+Unlike the command, runs are not recorded in problem's history unless
+``no_history=False`` is given. Options which only make sense on the terminal
+(``profile``, ``watch`` and ``verbose``) are rejected; reports given as
+``report`` are written as usual.
+
+``run_suite_async`` is a coroutine doing the same on an ``asyncio`` event
+loop: tests are run as ``aioprocme.AsyncCommand``, so a single loop (and
+thread) can test hundreds of solutions at once. Only compilation and
+calibration of the time limit are done on the loop's default executor. Concurrency is limited by ``jobs`` per suite
+and, across suites, by a shared ``asyncio.Semaphore`` given as ``limit``.
+"""
+import argparse
+import asyncio
+import os
+from porunga.commands.test import PorungaTestCommand
+from porunga.engine import Engine
+from porunga.engine import EngineError
+from porunga.verdicts import VERDICT_OK
+
+
+# kept for code catching errors of the runner by that name
+RunnerError = EngineError
+
+
+class TestResult(object):
+    """
+    Verdict and timings of a single test; ``name`` is path of the input
+    relative to problem's directory.
+    """
+    __slots__ = ('name', 'fin', 'fout', 'verdict', 'time', 'utime', 'stime',
+        'maxrss', 'returncode', 'mismatch', 'errors')
+
+    def __init__(self, name, fin, fout, verdict, time, utime, stime, maxrss,
+            returncode, mismatch=None, errors=''):
+        self.name = name
+        self.fin = fin
+        self.fout = fout
+        self.verdict = verdict
+        self.time = time
+        self.utime = utime
+        self.stime = stime
+        self.maxrss = maxrss
+        self.returncode = returncode
+        self.mismatch = mismatch
+        self.errors = errors
+
+    @classmethod
+    def from_info(cls, dirname, info):
+        """
+        Returns result made of information about a test, as returned by
+        ``PorungaTestCommand.run_test``.
+        """
+        return cls(os.path.relpath(info['fin'], dirname), info['fin'],
+            info['fout'], info['verdict'], info['time'], info['utime'],
+            info['stime'], info['maxrss'], info['returncode'],
+            info['mismatch'], info['errors'])
+
+    @property
+    def success(self):
+        return self.verdict == VERDICT_OK
+
+    def __repr__(self):
+        return '<TestResult: %s %s %.3fs>' % (self.name, self.verdict,
+            self.time)
+
+
+class SuiteResult(object):
+    """
+    Results of all tests of a problem, in order they were run.
+    """
+    __slots__ = ('problem', 'lang', 'results')
+
+    def __init__(self, problem, lang, results):
+        self.problem = problem
+        self.lang = lang
+        self.results = results
+
+    def __iter__(self):
+        return iter(self.results)
+
+    def __len__(self):
+        return len(self.results)
+
+    @property
+    def success(self):
+        return all(result.success for result in self.results)
+
+    @property
+    def fails(self):
+        return sum(1 for result in self.results if not result.success)
+
+    @property
+    def time(self):
+        return sum(result.time for result in self.results)
+
+    def __repr__(self):
+        return '<SuiteResult: %s (%s tests, %s failed)>' % (self.problem,
+            len(self.results), self.fails)
+
+
+def get_namespace(**options):
+    """
+    Returns namespace with options of ``porunga test`` set to their defaults
+    or given ``options``. Raises ``TypeError`` for unknown options.
+    """
+    parser = argparse.ArgumentParser(add_help=False)
+    for argument in PorungaTestCommand.args:
+        parser.add_argument(*argument.args, **argument.kwargs)
+    namespace = parser.parse_args([])
+    for name, value in options.items():
+        if not hasattr(namespace, name):
+            raise TypeError('Unknown option: %r' % name)
+        setattr(namespace, name, value)
+    return namespace
+
+
+# options of porunga test which results can not be returned
+UNSUPPORTED_OPTIONS = ('profile', 'profile_top', 'watch', 'verbose')
+
+
+class Runner(Engine):
+    """
+    Engine configured with options of ``porunga test``, returning results of
+    whole suites.
+    """
+
+    def __init__(self, lang='python', **options):
+        options.setdefault('no_history', True)
+        self.namespace = get_namespace(lang=lang, quiet=True, **options)
+        defaults = get_namespace()
+        for name in UNSUPPORTED_OPTIONS:
+            if getattr(self.namespace, name) != getattr(defaults, name):
+                raise TypeError('Option not supported by the API: %r' % name)
+
+    def prepare(self, dirname):
+        """
+        Compiles the solution and discovers test cases. Returns
+        ``(binary, cases)``.
+        """
+        lang = self.namespace.lang
+        if lang not in self.languages:
+            raise RunnerError('Wrong language specified: %s' % lang)
+        if not os.path.isdir(dirname):
+            raise RunnerError('No such problem directory: %s' % dirname)
+        self.set_problem(dirname)
+        return self.prepare_suite(dirname)
+
+    def finish(self, dirname, infos):
+        self.close_reports()
+        if not self.namespace.no_history:
+            self.record_history(dirname, infos)
+        return SuiteResult(dirname, self.namespace.lang,
+            [TestResult.from_info(dirname, info) for info in infos])
+
+    def run(self, dirname):
+        """
+        Runs all tests of the problem and returns ``SuiteResult``.
+        """
+        binary, cases = self.prepare(dirname)
+        try:
+            cases = self.start_suite(dirname, binary, cases)
+            infos = list(self.iter_suite(dirname, binary, cases))
+        finally:
+            self.stop_suite()
+        return self.finish(dirname, infos)
+
+    async def run_async(self, dirname, limit=None):
+        """
+        Coroutine running all tests of the problem on the current event loop
+        and returning ``SuiteResult``. At most ``jobs`` tests run at once and,
+        if ``limit`` semaphore is given, only while it is acquired.
+        """
+        if self.namespace.fork_server or self.namespace.pin:
+            raise RunnerError('fork_server and pin can not be used with '
+                'run_suite_async')
+
+        def prepare():
+            binary, cases = self.prepare(dirname)
+            cases = list(self.start_suite(dirname, binary, cases))
+            # calibration (if time limit needs it) blocks, so it is done
+            # here and only its cached result is used on the loop
+            self.get_timeout(dirname)
+            return binary, cases
+
+        loop = asyncio.get_running_loop()
+        binary, cases = await loop.run_in_executor(None, prepare)
+        infos = []
+        results = self.iter_suite_async(dirname, binary, cases, limit)
+        try:
+            async for info in results:
+                infos.append(info)
+        finally:
+            await results.aclose()
+        return self.finish(dirname, infos)
+
+
+def run_suite(problem_dir, lang='python', **options):
+    """
+    Tests solution of the problem in ``problem_dir`` (written in ``lang``)
+    and returns ``SuiteResult``. ``options`` are the ones of ``porunga
+    test``.
+    """
+    return Runner(lang, **options).run(problem_dir)
+
+
+async def run_suite_async(problem_dir, lang='python', limit=None, **options):
+    """
+    Coroutine testing solution of the problem in ``problem_dir`` on the
+    current event loop, see ``Runner.run_async``.
+    """
+    return await Runner(lang, **options).run_async(problem_dir, limit)
@@ -0,0 +1,28 @@
+"""
+Ordering of test cases before they are run.
+
+With many workers, suite finishes earliest if the longest tests are started
+first (longest processing time first rule) - otherwise a long test started
+at the end may run alone while other workers are idle. Expected durations are
+taken from previous runs; tests without known duration are treated as the
+longest ones. Previously failed tests may be moved to the front, so
+regressions are reported as soon as possible.
+"""
+
+
+def order_cases(cases, durations, failed=(), longest_first=True):
+    """
+    Returns list of ``(fin, fout)`` ``cases`` ordered by expected duration
+    (``durations`` maps inputs to seconds), longest first, with inputs from
+    ``failed`` before all others. Order of equal cases is kept.
+    """
+    def key(case):
+        fin = case[0]
+        rank = 0 if fin in failed else 1
+        if not longest_first:
+            return (rank,)
+        duration = durations.get(fin)
+        if duration is None:
+            return (rank, 0, 0.0)
+        return (rank, 1, -duration)
+    return sorted(cases, key=key)
@@ -0,0 +1,68 @@
+import os
+import shutil
+import sys
+import tempfile
+from porunga import calibration
+from porunga.calibration import Calibration
+from porunga.calibration import CalibrationCache
+from porunga.utils.compat import unittest
+from porunga.utils.paths import joinpath
+
+
+class TestCalibration(unittest.TestCase):
+
+    def test_scale(self):
+        cpu = calibration.REFERENCE_CPU_TIME * 1.5
+        startup = calibration.REFERENCE_STARTUP['c']
+        fast = Calibration('c', cpu, startup)
+        self.assertAlmostEqual(fast.cpu_factor, 1.5)
+        self.assertAlmostEqual(fast.scale(2 + startup), 3 + startup)
+        slow_start = Calibration('c', calibration.REFERENCE_CPU_TIME, 0.5)
+        self.assertAlmostEqual(slow_start.scale(1 + startup), 1.5)
+
+    def test_measure_startup(self):
+        self.assertLess(calibration.measure_startup([sys.executable, '-c',
+            'pass'], samples=2), 5.0)
+        with self.assertRaises(OSError):
+            calibration.measure_startup([sys.executable, '-c',
+                'raise SystemExit(1)'], samples=1)
+
+
+class TestCalibrationCache(unittest.TestCase):
+
+    def setUp(self):
+        self.tempdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tempdir)
+        self.cache = CalibrationCache(joinpath(self.tempdir, 'sub',
+            'calibration.json'))
+
+    def test_store_and_get(self):
+        self.assertIsNone(self.cache.get('python'))
+        self.cache.store(Calibration('python', 0.1, 0.02))
+        self.cache.store(Calibration('python', 0.2, 0.03), host='other')
+        cached = self.cache.get('python')
+        self.assertEqual((cached.lang, cached.cpu, cached.startup),
+            ('python', 0.1, 0.02))
+        self.assertIsNotNone(cached.measured)
+        self.assertEqual(self.cache.get('python', host='other').cpu, 0.2)
+        self.assertEqual(os.listdir(os.path.dirname(self.cache.path)),
+            ['calibration.json'])
+
+    def test_cpu_is_shared_and_startup_keyed_by_version(self):
+        self.cache.store(Calibration('python', 0.1, 0.02, version='3.8'))
+        self.assertIsNone(self.cache.get('c'))
+        self.assertIsNone(self.cache.get('python', '3.9'))
+        self.assertEqual(self.cache.get_cpu(), 0.1)
+        self.cache.store(Calibration('c', 0.2, 0.001, version='gcc 9'))
+        self.assertEqual(self.cache.get('python', '3.8').cpu, 0.2)
+        self.assertEqual(self.cache.get('python', '3.8').version, '3.8')
+        self.assertEqual(self.cache.get('c', 'gcc 9').startup, 0.001)
+        self.assertIsNone(self.cache.get_cpu(host='other'))
+
+    def test_invalid_file(self):
+        os.makedirs(os.path.dirname(self.cache.path))
+        with open(self.cache.path, 'w') as afile:
+            afile.write('{"')
+        self.assertIsNone(self.cache.get('python'))
+        self.cache.store(Calibration('python', 0.1, 0.02))
+        self.assertEqual(self.cache.get('python').cpu, 0.1)
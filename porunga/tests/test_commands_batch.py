@@ -0,0 +1,148 @@
+import os
+import shutil
+import tempfile
+import threading
+import time
+from argparse import Namespace
+from porunga.commands.batch import BuildError
+from porunga.commands.batch import PorungaBatchCommand
+from porunga.commands.batch import ProblemResult
+from porunga.utils.compat import unittest
+from porunga.utils.paths import joinpath
+from concurrent.futures import ThreadPoolExecutor
+from mock import Mock
+from mock import patch
+
+
+class TestPorungaBatchCommand(unittest.TestCase):
+
+    def setUp(self):
+        self.command = PorungaBatchCommand()
+        self.command.namespace = Namespace(quiet=True, verbose=False,
+            all=False, lang='python', timeout=0, case=None, jobs=2,
+            compile_jobs=2, no_history=True, no_cache=True)
+        self.tempdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tempdir)
+
+    def make_problem(self, name, solution=True, tests=()):
+        dirname = joinpath(self.tempdir, name)
+        os.makedirs(joinpath(dirname, 'testdata'))
+        if solution:
+            with open(joinpath(dirname, name + '.py'), 'w') as afile:
+                afile.write('print(input())\n')
+        for test, output in tests:
+            with open(joinpath(dirname, 'testdata', test + '.in'), 'w') as f:
+                f.write('foo\n')
+            with open(joinpath(dirname, 'testdata', test + '.out'), 'w') as f:
+                f.write(output)
+        return dirname
+
+    def test_problems_argument(self):
+        argument = self.command.get_label_arg()
+        self.assertEqual(argument.args, ('problems',))
+        self.assertEqual(argument.kwargs['nargs'], '+')
+
+    def test_get_problems(self):
+        for name in ('p10', 'p2', 'other'):
+            os.makedirs(joinpath(self.tempdir, name))
+        open(joinpath(self.tempdir, 'p3'), 'w').close()
+        pattern = joinpath(self.tempdir, 'p*')
+        self.assertEqual(self.command.get_problems([pattern,
+            joinpath(self.tempdir, 'p2/'), joinpath(self.tempdir, 'other')]), [
+                joinpath(self.tempdir, 'other'),
+                joinpath(self.tempdir, 'p2'),
+                joinpath(self.tempdir, 'p10'),
+            ])
+
+    def test_build_without_solution(self):
+        dirname = self.make_problem('foo', solution=False)
+        with self.assertRaises(BuildError):
+            self.command.build(dirname)
+
+    def test_compile_error(self):
+        with self.assertRaises(BuildError) as context:
+            self.command.compile('echo "bad thing" >&2; exit 1')
+        self.assertEqual(str(context.exception),
+            'compilation error: bad thing')
+
+    def test_run_batch(self):
+        first = self.make_problem('first', tests=[('t1', 'foo\n'),
+            ('t2', 'bar\n')])
+        second = self.make_problem('second', tests=[('t1', 'foo\n')])
+        missing = self.make_problem('missing', solution=False)
+        empty = self.make_problem('empty')
+        self.command.finish_problem = Mock()
+        problems = self.command.run_batch([first, second, missing, empty])
+
+        self.assertEqual([problem.status for problem in problems],
+            ['1 failed', 'ok', 'no solution', 'no tests'])
+        self.assertEqual([len(problem.results) for problem in problems],
+            [2, 1, 0, 0])
+        self.assertEqual(self.command.finish_problem.call_count, 4)
+
+    def test_run_batch_reports_exit_as_failed_build(self):
+        first = self.make_problem('first', tests=[('t1', 'foo\n')])
+        second = self.make_problem('second', tests=[('t1', 'foo\n')])
+        get_timeout = self.command.get_timeout
+
+        def failing_get_timeout(dirname=None):
+            if dirname == first:
+                self.command.exit('Could not calibrate python: boom')
+            return get_timeout(dirname)
+
+        self.command.get_timeout = failing_get_timeout
+        self.command.finish_problem = Mock()
+        problems = self.command.run_batch([first, second])
+
+        self.assertEqual([problem.status for problem in problems],
+            ['Could not calibrate python: boom', 'ok'])
+        with self.assertRaises(SystemExit):
+            self.command.exit('Wrong language specified')
+
+    def test_run_batch_bounds_submitted_work(self):
+        lock = threading.Lock()
+        outstanding = [0, 0]
+
+        def track(delta):
+            with lock:
+                outstanding[0] += delta
+                outstanding[1] = max(outstanding)
+
+        original_submit = ThreadPoolExecutor.submit
+
+        def submit(pool, *args):
+            future = original_submit(pool, *args)
+            track(1)
+            future.add_done_callback(lambda future: track(-1))
+            return future
+
+        def build(dirname):
+            return 'bin', [(dirname + '/t%d.in' % x, None) for x in range(3)]
+
+        def run_test(dirname, binary, fin, fout):
+            time.sleep(0.001)
+            return {'fin': fin, 'success': True, 'time': 0.0, 'maxrss': 0}
+
+        self.command.build = build
+        self.command.run_test = run_test
+        self.command.finish_problem = Mock()
+        with patch.object(ThreadPoolExecutor, 'submit', submit):
+            problems = self.command.run_batch(['p%d' % x for x in range(200)])
+
+        self.assertEqual([len(problem.results) for problem in problems],
+            [3] * 200)
+        self.assertEqual(self.command.finish_problem.call_count, 200)
+        # two builds and two test cases per worker (of each pool)
+        self.assertLessEqual(outstanding[1], 2 * 2 + 2 * 2)
+
+    def test_problem_result(self):
+        problem = ProblemResult('foo')
+        problem.results = [
+            {'success': True, 'time': 0.5, 'maxrss': 10},
+            {'success': False, 'time': 1.5, 'maxrss': 20},
+        ]
+        self.assertEqual(problem.fails, 1)
+        self.assertEqual(problem.time, 2.0)
+        self.assertEqual(problem.max_time, 1.5)
+        self.assertEqual(problem.maxrss, 20)
+        self.assertEqual(problem.status, '1 failed')
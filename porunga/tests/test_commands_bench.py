@@ -0,0 +1,52 @@
+from argparse import Namespace
+from porunga.commands.bench import PorungaBenchCommand
+from porunga.utils.compat import unittest
+from mock import Mock
+
+
+class TestPorungaBenchCommand(unittest.TestCase):
+
+    def setUp(self):
+        self.command = PorungaBenchCommand()
+        self.command.namespace = Namespace(quiet=True, all=False,
+            lang='python', timeout=0, cpu_time=False, memory_limit=0,
+            warmup=1, repeat=3, fork_server=False)
+
+    def test_jobs_option_is_not_available(self):
+        options = [option for argument in self.command.get_args()
+                   for option in argument.args]
+        self.assertIn('--repeat', options)
+        self.assertNotIn('--jobs', options)
+
+    def test_bench(self):
+        timings = self.command.bench(['cat'], b'foo\n', b'foo')
+        self.assertEqual(len(timings), 3)
+        self.assertTrue(all(timing >= 0 for timing in timings))
+
+    def test_bench_wrong_output(self):
+        self.assertIsNone(self.command.bench(['cat'], b'foo\n', b'bar'))
+
+    def test_bench_missing_files(self):
+        self.assertIsNone(self.command.bench(['cat'], None, b'bar'))
+        self.assertIsNone(self.command.bench(['cat'], b'bar', None))
+
+    def test_cpu_time_measured(self):
+        self.command.namespace.cpu_time = True
+        self.assertEqual(self.command.get_measured_time(
+            {'utime': 1.0, 'stime': 0.5, 'wall': 3.0}), 1.5)
+
+    def test_handle_label_runs_each_case(self):
+        self.command.get_binary = Mock(return_value='cat')
+        self.command.get_binary_argv = Mock(return_value=['cat'])
+        self.command.get_test_cases = Mock(return_value=[
+            ('test1.in', 'test1.out'), ('test2.in', 'test2.out')])
+        self.command.preload = Mock(return_value=b'foo')
+        self.command.bench = Mock(return_value=[0.1, 0.2, 0.3])
+        self.command.success = Mock()
+
+        self.command.handle_label('foobar', self.command.namespace)
+
+        self.assertEqual(self.command.bench.call_count, 2)
+        message = self.command.success.call_args[0][0]
+        self.assertIn('min 0.200s', message)
+        self.assertIn('median 0.400s', message)
@@ -0,0 +1,76 @@
+import os
+import shutil
+import sys
+import tempfile
+from argparse import Namespace
+from porunga.commands.compare import OutputDigest
+from porunga.commands.compare import PorungaCompareCommand
+from porunga.commands.compare import get_expected_digest
+from porunga.utils.compat import unittest
+from porunga.utils.paths import joinpath
+from mock import Mock
+
+
+class TestPorungaCompareCommand(unittest.TestCase):
+
+    def setUp(self):
+        self.command = PorungaCompareCommand()
+        self.command.namespace = Namespace(quiet=True, all=False,
+            lang='python', timeout=0, cpu_time=False, memory_limit=0,
+            fork_server=False, warmup=0, repeat=3, confidence=0.95)
+        self.tempdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tempdir)
+
+    def make_case(self, input, expected):
+        testdir = joinpath(self.tempdir, 'testdata')
+        os.makedirs(testdir)
+        with open(joinpath(testdir, 't1.in'), 'wb') as afile:
+            afile.write(input)
+        with open(joinpath(testdir, 't1.out'), 'wb') as afile:
+            afile.write(expected)
+
+    def test_output_digest_ignores_surrounding_whitespace(self):
+        first = OutputDigest()
+        first.feed(b'\n foo\n')
+        second = OutputDigest()
+        second.feed(b'fo')
+        second.feed(b'o  \n\n')
+        self.assertEqual(first.hexdigest(), second.hexdigest())
+        path = joinpath(self.tempdir, 'expected')
+        with open(path, 'wb') as afile:
+            afile.write(b'foo\n')
+        self.assertEqual(get_expected_digest(path), first.hexdigest())
+
+    def test_solutions_argument(self):
+        argument = self.command.get_label_arg()
+        self.assertEqual(argument.args, ('solutions',))
+        self.assertEqual(argument.kwargs['nargs'], '+')
+
+    def test_run_comparison(self):
+        self.make_case(b'foo\n', b'foo\n')
+        upper = [sys.executable, '-c', 'print(input().upper())']
+        results = self.command.run_comparison(self.tempdir,
+            [['cat'], upper, ['false']], [None] * 3)
+
+        name, timings, digests, expected = results[0]
+        self.assertEqual(name, joinpath('testdata', 't1.in'))
+        self.assertEqual(len(timings[0]), 3)
+        self.assertEqual(len(timings[1]), 3)
+        self.assertIsNone(timings[2])
+        self.assertEqual(digests[0], set([expected]))
+        self.assertEqual(self.command.get_flags(digests, expected),
+            ['outputs differ', 'B wrong'])
+
+    def test_get_flags(self):
+        self.assertEqual(self.command.get_flags([set('a'), set('a')], 'a'),
+            [])
+        self.assertEqual(self.command.get_flags([set('a'), set('ab')], None),
+            ['outputs differ', 'B nondeterministic'])
+
+    def test_report(self):
+        self.command.success_continuation = Mock()
+        self.command.report([('t1.in', [[2.0, 2.0, 2.1], [1.0, 1.1, 1.0]],
+            [set('a'), set('a')], 'a')], 2)
+        line = self.command.success_continuation.call_args[0][0]
+        self.assertTrue(line.startswith('suite'))
+        self.assertIn('x2.00', line)
@@ -0,0 +1,110 @@
+import os
+import shutil
+import sys
+import tempfile
+from argparse import Namespace
+from porunga.commands.complexity import PorungaComplexityCommand
+from porunga.utils.compat import unittest
+from mock import Mock
+
+
+class TestPorungaComplexityCommand(unittest.TestCase):
+
+    def setUp(self):
+        self.command = PorungaComplexityCommand()
+        self.command.namespace = Namespace(quiet=True, all=False,
+            lang='python', timeout=0, cpu_time=False, memory_limit=0,
+            fork_server=False, generator=None, sizes=None, min_size=1000,
+            max_size=100000, steps=3, repeat=2, table=None)
+        self.tempdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tempdir)
+
+    def test_get_sizes(self):
+        self.assertEqual(self.command.get_sizes(), [1000, 10000, 100000])
+        self.command.namespace.sizes = '5,10,20'
+        self.assertEqual(self.command.get_sizes(), [5, 10, 20])
+
+    def test_iter_generated_inputs(self):
+        self.command.namespace.sizes = '2,3'
+        generator = [sys.executable, '-c',
+            'import sys; print(" ".join(sys.argv[1:]))']
+        self.assertEqual(list(self.command.iter_generated_inputs(generator)),
+            [(2, b'2 0\n'), (3, b'3 1\n')])
+
+    def test_generator_times_out(self):
+        self.command.namespace.sizes = '2,3'
+        self.command.namespace.helper_timeout = 0.2
+        self.command.exit = Mock(side_effect=SystemExit)
+        generator = [sys.executable, '-c',
+            'import sys, time; time.sleep(int(sys.argv[1]) - 2)']
+        inputs = self.command.iter_generated_inputs(generator)
+        self.assertEqual(next(inputs), (2, b''))
+        self.assertRaises(SystemExit, next, inputs)
+        self.command.exit.assert_called_once_with(
+            'Generator timed out after 0.2s for size 3')
+
+    def test_iter_test_inputs_ordered_by_size(self):
+        cases = []
+        for name, content in (('a', b'xxx'), ('b', b'x'), ('c', b'')):
+            path = os.path.join(self.tempdir, name + '.in')
+            with open(path, 'wb') as afile:
+                afile.write(content)
+            cases.append((path, None))
+        self.command.get_test_cases = Mock(return_value=cases)
+        self.assertEqual(list(self.command.iter_test_inputs(self.tempdir)),
+            [(1, b'x'), (3, b'xxx')])
+
+    def test_measure(self):
+        sizes, times = self.command.measure(['cat'],
+            [(1, b'x'), (2, b'xx')])
+        self.assertEqual(sizes, [1, 2])
+        self.assertEqual(len(times), 2)
+
+    def test_measure_skips_failed_runs(self):
+        sizes, times = self.command.measure(['false'], [(1, b'x')])
+        self.assertEqual(sizes, [])
+
+    def test_handle_label(self):
+        table = os.path.join(self.tempdir, 'table.csv')
+        self.command.namespace.table = table
+        self.command.get_binary = Mock(return_value='cat')
+        self.command.get_binary_argv = Mock(return_value=['cat'])
+        self.command.iter_test_inputs = Mock(return_value=iter([]))
+        self.command.measure = Mock(return_value=([1000, 2000, 4000],
+            [0.1, 0.2, 0.4]))
+        self.command.success = Mock()
+
+        self.command.handle_label('foobar', self.command.namespace)
+
+        message = self.command.success.call_args[0][0]
+        self.assertIn('Best fit: O(n)', message)
+        with open(table) as afile:
+            self.assertEqual(afile.readline().split(',')[:2], ['n', 'time'])
+
+    def test_handle_label_needs_three_points(self):
+        self.command.get_binary = Mock(return_value='cat')
+        self.command.get_binary_argv = Mock(return_value=['cat'])
+        self.command.iter_test_inputs = Mock(return_value=iter([]))
+        self.command.measure = Mock(return_value=([1, 2], [0.1, 0.2]))
+        self.command.exit = Mock(side_effect=SystemExit)
+        self.assertRaises(SystemExit, self.command.handle_label, 'foobar',
+            self.command.namespace)
+
+    def test_handle_label_uses_problem_config(self):
+        with open(os.path.join(self.tempdir, 'porunga.cfg'), 'w') as afile:
+            afile.write('[problem]\ncomparator = foo\n')
+        self.command.get_binary = Mock(return_value='cat')
+        self.command.exit = Mock(side_effect=SystemExit)
+        self.assertRaises(SystemExit, self.command.handle_label, self.tempdir,
+            self.command.namespace)
+        self.assertIn('Unknown comparator', self.command.exit.call_args[0][0])
+        self.assertFalse(self.command.get_binary.called)
+
+        with open(os.path.join(self.tempdir, 'porunga.cfg'), 'w') as afile:
+            afile.write('[problem]\ntime_limit = 2.5\n')
+        self.command.namespace.timeout = 0
+        self.command.get_binary_argv = Mock(return_value=['cat'])
+        self.command.iter_test_inputs = Mock(return_value=iter([]))
+        self.command.measure = Mock(return_value=([1, 2, 4], [0.1, 0.2, 0.4]))
+        self.command.handle_label(self.tempdir, self.command.namespace)
+        self.assertEqual(self.command.problem, self.tempdir)
@@ -0,0 +1,92 @@
+import os
+import shutil
+import sys
+import tempfile
+from argparse import Namespace
+from porunga.commands.stress import PorungaStressCommand
+from porunga.commands.stress import StressError
+from porunga.verdicts import VERDICT_WRONG_ANSWER
+from porunga.utils.compat import unittest
+from mock import Mock
+
+
+GENERATOR = [sys.executable, '-c', 'import sys; print(sys.argv[1])']
+
+
+class TestPorungaStressCommand(unittest.TestCase):
+
+    def setUp(self):
+        self.command = PorungaStressCommand()
+        self.command.namespace = Namespace(quiet=True, all=False,
+            lang='python', timeout=0, cpu_time=False, memory_limit=0,
+            fork_server=False, generator='gen.py', brute='brute.py',
+            count=0, seed=1, jobs=2)
+        self.tempdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tempdir)
+
+    def test_run_case_passes(self):
+        self.assertIsNone(self.command.run_case(['cat'], GENERATOR, ['cat'],
+            5))
+
+    def test_run_case_fails(self):
+        binary = [sys.executable, '-c', 'print(int(input()) + 1)']
+        failure = self.command.run_case(binary, GENERATOR, ['cat'], 5)
+        self.assertEqual(failure['verdict'], VERDICT_WRONG_ANSWER)
+        self.assertEqual(failure['input'], b'5\n')
+        self.assertEqual(failure['expected'], b'5\n')
+        self.assertEqual(failure['output'], '6')
+
+    def test_run_case_generator_fails(self):
+        self.assertRaises(StressError, self.command.run_case, ['cat'],
+            ['false'], ['cat'], 1)
+
+    def test_run_case_helper_times_out(self):
+        self.command.namespace.helper_timeout = 0.2
+        sleep = [sys.executable, '-c', 'import time; time.sleep(5)']
+        with self.assertRaises(StressError) as err:
+            self.command.run_case(['cat'], sleep, ['cat'], 3)
+        self.assertEqual(str(err.exception),
+            'Generator timed out after 0.2s for seed 3')
+        with self.assertRaises(StressError) as err:
+            self.command.run_case(['cat'], GENERATOR, sleep, 4)
+        self.assertEqual(str(err.exception),
+            'Reference solution timed out after 0.2s for seed 4')
+
+    def test_stress_count(self):
+        self.command.namespace.count = 7
+        count, failure = self.command.stress(['cat'], GENERATOR, ['cat'])
+        self.assertEqual(count, 7)
+        self.assertIsNone(failure)
+
+    def test_stress_returns_lowest_failing_seed(self):
+        binary = [sys.executable, '-c', 'n = int(input()); '
+            'print(n + 1 if n % 3 == 0 else n)']
+        self.command.namespace.count = 20
+        count, failure = self.command.stress(binary, GENERATOR, ['cat'])
+        self.assertEqual(failure['seed'], 3)
+        self.assertLess(count, 20)
+
+    def test_save_case(self):
+        fin, fout = self.command.save_case(self.tempdir, b'1', b'2')
+        self.assertEqual(fin, os.path.join(self.tempdir, 'testdata',
+            'stress001.in'))
+        fin, fout = self.command.save_case(self.tempdir, b'3', b'4')
+        self.assertEqual(fout, os.path.join(self.tempdir, 'testdata',
+            'stress002.out'))
+        with open(fout, 'rb') as afile:
+            self.assertEqual(afile.read(), b'4')
+
+    def test_handle_label_saves_failure(self):
+        self.command.get_binary = Mock(return_value='cat')
+        self.command.get_binary_argv = Mock(return_value=['cat'])
+        self.command.get_program = Mock(return_value=['cat'])
+        self.command.stress = Mock(return_value=(10, {'seed': 4,
+            'verdict': VERDICT_WRONG_ANSWER, 'input': b'1', 'expected': b'2',
+            'output': '3'}))
+        self.command.exit = Mock(side_effect=SystemExit)
+
+        self.assertRaises(SystemExit, self.command.handle_label, self.tempdir,
+            self.command.namespace)
+
+        self.assertTrue(os.path.exists(os.path.join(self.tempdir, 'testdata',
+            'stress001.in')))
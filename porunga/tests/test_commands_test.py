@@ -1,16 +1,27 @@
+import gzip
 import os
 import shutil
 import sys
 import tempfile
+import zipfile
 from argparse import Namespace
+from porunga.calibration import Calibration
+from porunga.calibration import CalibrationCache
+from porunga.calibration import REFERENCE_CPU_TIME
+from porunga.commands.test import LANGUAGES
 from porunga.commands.test import curdir
 from porunga.commands.test import PorungaTestCommand
+from porunga.comparators import NumericComparator
+from porunga.comparators import TokenComparator
+from porunga.engine import WINDOW_FACTOR
+from porunga.pch import HeaderCache
+from porunga.pinning import CpuPool
 from porunga.utils.compat import unittest
 from porunga.utils.paths import abspath
+from porunga.utils.paths import joinpath
 from mock import call
 from mock import Mock
 from mock import patch
-from subprocess import PIPE
 from termcolor import colored
 
 
@@ -66,13 +77,52 @@ class TestPorungaTestCommand(unittest.TestCase):
         self.command.compile.assert_called_once_with(
             'g++ -O2 foobar/foobar.cpp -o foobar/foobar.cpp.out')
 
+    def test_get_binary_cpp_cache_hit(self):
+        self.command.compile = Mock()
+        self.command.namespace.no_cache = False
+        self.command.namespace.cache_size = 1
+        cache = self.command.get_compile_cache = Mock()
+        cache.return_value.get_key.return_value = 'key'
+        cache.return_value.restore.return_value = True
+        self.assertEqual(self.command.get_binary('foobar/', 'cpp'),
+            'foobar/foobar.cpp.out')
+        cache.return_value.get_key.assert_called_once_with(
+            'foobar/foobar.cpp', 'g++ -O2 foobar.cpp -o foobar.cpp.out')
+        self.assertFalse(self.command.compile.called)
+        self.assertEqual(self.command.cache_status, 'hit')
+
+    def test_get_binary_cpp_cache_miss(self):
+        self.command.compile = Mock()
+        self.command.namespace.no_cache = False
+        cache = self.command.get_compile_cache = Mock()
+        cache.return_value.get_key.return_value = 'key'
+        cache.return_value.restore.return_value = False
+        self.command.get_binary('foobar/', 'cpp')
+        self.command.compile.assert_called_once_with(
+            'g++ -O2 foobar/foobar.cpp -o foobar/foobar.cpp.out')
+        cache.return_value.store.assert_called_once_with('key',
+            ['foobar/foobar.cpp.out'])
+        self.assertEqual(self.command.cache_status, 'miss')
+
     # compile tests
 
+    def test_get_binary_c_profile(self):
+        self.command.compile = Mock()
+        self.command.namespace.profile = True
+        self.command.get_binary('foobar/', 'c')
+        self.command.compile.assert_called_once_with(
+            'gcc -O2 foobar/foobar.c -o foobar/foobar.c.out -pg')
+
+    def test_profile_not_supported(self):
+        self.command.exit = Mock(side_effect=SystemExit)
+        self.assertRaises(SystemExit, self.command.start_profiler, 'foobar',
+            'ruby')
+
     def test_compile_went_wrong(self):
 
         with patch('porunga.commands.test.Popen') as PopenMock:
             PopenMock.return_value = mock = Mock()
-            mock.communicate = lambda: ('out', 'err')
+            mock.communicate = lambda: (b'out', b'err')
             mock.returncode = 102
             with self.assertRaises(SystemExit) as err:
                 self.command.compile('some prog')
@@ -96,48 +146,155 @@ class TestPorungaTestCommand(unittest.TestCase):
                     call('\n'),
                 ])
 
-    def test_get_test_cases_for_suffix(self):
-        with patch('porunga.commands.test.glob') as mglob:
-            mglob.return_value = ['foobar/test01.in', 'foobar/test02.in']
-            cases = self.command.get_test_cases_for_suffix('foobar', 'in')
-            self.assertItemsEqual(cases, [
-                'foobar/test01.in',
-                'foobar/test02.in',
-            ])
-            self.assertEqual(mglob.call_args, call('foobar/testdata/*.in'))
-
-    def test_get_test_cases_for_suffix_all_flag(self):
-        with patch('porunga.commands.test.walk') as walkmock:
-            walkmock.return_value = [
-                ('foobar/testdata', ['bigtests'], ['test01.in', 'test01.out', 'test02.in']),
-                ('foobar/testdata/bigtests', [], ['test-big-01.in', 'test02.out']),
-            ]
-            self.command.namespace.all = True
-            test_cases = self.command.get_test_cases_for_suffix('foobar/', 'in')
-
-            walkmock.assert_called_once_with('foobar/testdata')
-            self.assertEqual(test_cases, [
-                'foobar/testdata/test01.in',
-                'foobar/testdata/test02.in',
-                'foobar/testdata/bigtests/test-big-01.in',
-            ])
+    def make_testdata(self, *names):
+        tempdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tempdir)
+        for name in names:
+            path = abspath(tempdir, 'testdata', name)
+            if not os.path.isdir(os.path.dirname(path)):
+                os.makedirs(os.path.dirname(path))
+            open(path, 'w').close()
+        return tempdir
+
+    def test_get_test_inputs(self):
+        dirname = self.make_testdata('test10.in', 'test2.in', 'test2.out',
+            'big/test1.in')
+        self.assertEqual(list(self.command.get_test_inputs(dirname)), [
+            joinpath(dirname, 'testdata', 'test2.in'),
+            joinpath(dirname, 'testdata', 'test10.in'),
+        ])
+
+    def test_get_test_inputs_all_flag(self):
+        dirname = self.make_testdata('test01.in', 'test01.out', 'test02.IN',
+            'bigtests/test-big-01.in', 'bigtests/test02.out')
+        self.command.namespace.all = True
+        self.assertEqual(list(self.command.get_test_inputs(dirname)), [
+            joinpath(dirname, 'testdata', 'test01.in'),
+            joinpath(dirname, 'testdata', 'test02.IN'),
+            joinpath(dirname, 'testdata', 'bigtests', 'test-big-01.in'),
+        ])
 
     def test_get_test_cases_with_case_option(self):
         self.command.namespace.case = '/foo/some.in'
         self.command.get_fout_name = Mock(return_value='/foo/some.out')
         cases = self.command.get_test_cases('foobar')
-        self.assertEqual(cases, [('/foo/some.in', '/foo/some.out')])
+        self.assertEqual(list(cases), [('/foo/some.in', '/foo/some.out')])
 
     def test_get_test_cases(self):
-        self.command.get_test_cases_for_suffix = Mock()
-        self.command.get_test_cases_for_suffix.return_value = ['foo.in']
-        self.command.get_fout_name = Mock(return_value='foo.out')
+        self.command.get_test_inputs = Mock(return_value=iter(['foo.in',
+            'bar.IN']))
         result = self.command.get_test_cases('foobar')
-        self.assertEqual(self.command.get_test_cases_for_suffix.call_args_list, [
-            call('foobar', 'in'),
-            call('foobar', 'IN'),
-        ])
-        self.assertEqual(result, [('foo.in', 'foo.out')])
+        self.assertEqual(list(result), [('foo.in', 'foo.out'),
+            ('bar.IN', 'bar.OUT')])
+        self.command.get_test_inputs.assert_called_once_with('foobar')
+
+    def test_get_watched_cases_testdata_changed(self):
+        self.command.get_test_cases = Mock(return_value=iter([
+            ('a.in', 'a.out'), ('b.in', 'b.out'), ('c.in', 'c.out')]))
+        previous = {
+            'a.in': {'success': True, 'time': 0.1},
+            'c.in': {'success': True, 'time': 0.2},
+            'gone.in': {'success': True, 'time': 0.1},
+        }
+        rebuild, cases, removed = self.command.get_watched_cases('foo',
+            set(['b.in', 'c.out', 'foo/notes.txt']), previous)
+        self.assertFalse(rebuild)
+        self.assertEqual(cases, [('b.in', 'b.out'), ('c.in', 'c.out')])
+        self.assertEqual(removed, ['gone.in'])
+
+    def test_get_watched_cases_source_changed(self):
+        self.command.get_test_cases = Mock(return_value=iter([
+            ('a.in', 'a.out'), ('b.in', 'b.out'), ('c.in', 'c.out')]))
+        previous = {
+            'a.in': {'success': True, 'time': 0.1},
+            'b.in': {'success': True, 'time': 0.3},
+            'c.in': {'success': False, 'time': 0.2},
+        }
+        rebuild, cases, removed = self.command.get_watched_cases('foo',
+            set(['foo/foo.py']), previous)
+        self.assertTrue(rebuild)
+        self.assertEqual(cases, [('c.in', 'c.out'), ('b.in', 'b.out'),
+            ('a.in', 'a.out')])
+        self.assertEqual(removed, [])
+
+    def test_get_comparator(self):
+        dirname = self.make_testdata()
+        with open(joinpath(dirname, 'porunga.cfg'), 'w') as afile:
+            afile.write('[problem]\ncomparator = numeric\n'
+                'absolute_error = 0.5\n')
+        self.command.namespace.absolute_error = None
+        self.command.namespace.relative_error = 0.0
+        self.command.namespace.comparator = None
+        comparator = self.command.get_comparator(None, dirname)
+        self.assertIsInstance(comparator, NumericComparator)
+        self.assertEqual((comparator.absolute, comparator.relative),
+            (0.5, 0.0))
+        self.command.namespace.comparator = 'tokens'
+        self.assertIsInstance(self.command.get_comparator(None, dirname),
+            TokenComparator)
+        self.assertIsInstance(self.command.get_comparator(None),
+            TokenComparator)
+
+    def test_set_problem_with_invalid_config(self):
+        dirname = self.make_testdata()
+        with open(joinpath(dirname, 'porunga.cfg'), 'w') as afile:
+            afile.write('[problem]\ncomparator = fuzzy\n')
+        with self.assertRaises(SystemExit):
+            self.command.set_problem(dirname)
+
+    def test_use_precompiled_header(self):
+        dirname = self.make_testdata()
+        source = joinpath(dirname, 'a.cpp')
+        with open(source, 'w') as afile:
+            afile.write('#include <bits/stdc++.h>\nint main() {}\n')
+        info = LANGUAGES['cpp']
+        data = {'fin': source}
+        with patch.object(HeaderCache, 'get_include_dir',
+                return_value='/pch dir') as get_include_dir:
+            self.assertEqual(self.command.use_precompiled_header('g++ a.cpp',
+                info, data), "g++ a.cpp -I '/pch dir'")
+        get_include_dir.assert_called_once_with(info['compiler'],
+            'bits/stdc++.h', 'c++-header')
+        self.assertEqual(self.command.use_precompiled_header('java A.java',
+            LANGUAGES['java'], data), 'java A.java')
+
+    def test_compile_and_discover(self):
+        dirname = self.make_testdata('t1.in', 't1.out', 't2.in', 't2.out')
+        self.command.namespace.case = None
+        self.command.get_binary = Mock(return_value='foo')
+        binary, compiled, cases = self.command.compile_and_discover(dirname,
+            'python')
+        self.assertEqual(binary, 'foo')
+        self.command.get_binary.assert_called_once_with(dirname, 'python')
+        self.assertEqual([os.path.basename(fin) for fin, fout in cases],
+            ['t1.in', 't2.in'])
+
+    def test_get_timeout_scales_time_limit(self):
+        dirname = self.make_testdata()
+        with open(joinpath(dirname, 'porunga.cfg'), 'w') as afile:
+            afile.write('[problem]\ntime_limit = 1.02\n')
+        self.command.calibrations = {'python': Calibration('python',
+            REFERENCE_CPU_TIME * 2, 0.05)}
+        self.assertAlmostEqual(self.command.get_timeout(dirname), 2.05)
+        self.assertEqual(self.command.get_timeout(), None)
+        self.command.namespace.timeout = 3.0
+        self.assertEqual(self.command.get_timeout(dirname), 3.0)
+
+    def test_get_calibration_is_cached(self):
+        calibration = Calibration('python', 0.1, 0.01)
+        with patch.object(CalibrationCache, 'get', return_value=calibration):
+            with patch.object(self.command, 'measure_calibration') as measure:
+                self.assertIs(self.command.get_calibration('python'),
+                    calibration)
+                self.assertIs(self.command.get_calibration('python'),
+                    calibration)
+        self.assertFalse(measure.called)
+
+    def test_run_test_with_tokens_comparator(self):
+        self.command.namespace.comparator = 'tokens'
+        fin, fout = self.make_case('1 2\n3\n', '1\n2 3')
+        info = self.command.run_test('foobar', 'cat', fin, fout)
+        self.assertEqual(info['verdict'], 'ok')
 
     def test_get_test_cases_dupes_if_case_given(self):
         tempdir = tempfile.mkdtemp()
@@ -150,7 +307,7 @@ class TestPorungaTestCommand(unittest.TestCase):
         self.command.namespace.case = fin
         cases = self.command.get_test_cases(tempdir)
         try:
-            self.assertEqual(cases, [(fin, fout)])
+            self.assertEqual(list(cases), [(fin, fout)])
         finally:
             shutil.rmtree(tempdir)
 
@@ -180,40 +337,311 @@ class TestPorungaTestCommand(unittest.TestCase):
                 self.assertEqual(self.command.get_binary.call_args,
                     call('/foo/bar', 'python'))
 
+    def test_run_suite_writes_reports(self):
+        report = Mock()
+        info = {'success': True, 'time': 1.0, 'utime': 0.5, 'stime': 0.0,
+            'maxrss': 0}
+        self.command.reports = [report]
+        self.command.suite = {'name': 'foobar', 'started': 0.0}
+        self.command.get_test_cases = Mock(return_value=[])
+        self.command.iter_test_results = Mock(return_value=[info])
+        self.command.record_history = Mock()
+        self.command.run_suite('foobar', ['cat'])
+
+        report.start.assert_called_once_with(self.command.suite)
+        report.add.assert_called_once_with(info)
+        report.close.assert_called_once_with(self.command.suite)
+        self.assertIn('finished', self.command.suite)
+
+    def test_run_suite_fail_fast(self):
+        self.command.namespace.fail_fast = True
+        self.command.suite = {'name': 'foobar', 'started': 0.0}
+        infos = [{'fin': name, 'success': name != 'b.in', 'time': 1.0,
+                  'utime': 0.5, 'stime': 0.0, 'maxrss': 0}
+                 for name in ('a.in', 'b.in', 'c.in')]
+        self.command.iter_test_results = Mock(return_value=iter(infos))
+        self.command.record_history = Mock()
+        results = self.command.run_suite('foobar', ['cat'], cases=[])
+        self.assertEqual([info['fin'] for info in results], ['a.in', 'b.in'])
+
+    def test_schedule_cases(self):
+        self.command.namespace.jobs = 2
+        self.command.namespace.failed_first = True
+        self.command.get_previous_results = Mock(return_value={
+            'testdata/a.in': {'verdict': 'ok', 'wall': 0.1, 'cpu': 0.1},
+            'testdata/b.in': {'verdict': 'ok', 'wall': 0.9, 'cpu': 0.9},
+            'testdata/c.in': {'verdict': 'timeout', 'wall': 0.5, 'cpu': 0.5},
+        })
+        cases = [('foobar/testdata/%s.in' % name, None)
+                 for name in ('a', 'b', 'c', 'd')]
+        self.assertEqual([fin for fin, fout in
+            self.command.schedule_cases('foobar', iter(cases))], [
+                'foobar/testdata/c.in', 'foobar/testdata/d.in',
+                'foobar/testdata/b.in', 'foobar/testdata/a.in'])
+        self.command.get_previous_results.assert_called_once_with('foobar')
+
+    def test_schedule_cases_without_history_is_lazy(self):
+        self.command.namespace.jobs = 2
+        self.command.get_previous_results = Mock(return_value={})
+        cases = iter([('a.in', 'a.out')])
+        self.assertIs(self.command.schedule_cases('foobar', cases), cases)
+
+    def test_schedule_cases_single_job(self):
+        self.command.namespace.jobs = 1
+        self.command.get_previous_results = Mock()
+        cases = iter([('a.in', 'a.out')])
+        self.assertIs(self.command.schedule_cases('foobar', cases), cases)
+        self.assertFalse(self.command.get_previous_results.called)
+
+    def test_run_test_confirms_timeout_when_pinned(self):
+        self.command.cpu_pool = CpuPool([0])
+        timeout = {'output': '', 'errors': '', 'returncode': -9,
+            'timeouted': True, 'aborted': False, 'memory_exceeded': False,
+            'wall': 1.0, 'utime': 1.0, 'stime': 0.0, 'maxrss': 0}
+        passed = dict(timeout, returncode=0, timeouted=False, wall=0.9)
+        self.command.run_test_once = Mock(side_effect=[
+            (timeout, True, False, None), (passed, True, True, None)])
+        info = self.command.run_test('foobar', 'cat', 'a.in', 'a.out')
+        self.assertEqual(info['verdict'], 'ok')
+        self.assertTrue(info['retried'])
+        self.assertEqual(self.command.run_test_once.call_args_list, [
+            call('foobar', ['cat'], 'a.in', 'a.out', set([0]))] * 2)
+
+    def test_run_test_records_span(self):
+        self.command.log = Mock()
+        fin, fout = self.make_case('foo', 'foo')
+        info = self.command.run_test('foobar', 'cat', fin, fout)
+        self.assertLessEqual(info['started'], info['finished'])
+        self.assertEqual(info['worker'], 'MainThread')
+
+    def test_compare_with_baseline(self):
+        self.command.namespace.threshold = 0.1
+        self.command.namespace.noise = 0.01
+        baseline = {'a.in': {'verdict': 'ok', 'wall': 1.0},
+                    'b.in': {'verdict': 'ok', 'wall': 1.0}}
+        current = {'a.in': {'verdict': 'ok', 'wall': 1.0},
+                   'b.in': {'verdict': 'ok', 'wall': 2.0}}
+        with self.assertRaises(SystemExit):
+            self.command.compare_with_baseline('base', baseline, current)
+        current['b.in']['verdict'] = 'timeout'
+        self.command.compare_with_baseline('base', baseline, current)
+
+    def test_compare_without_baseline(self):
+        with self.assertRaises(SystemExit):
+            self.command.compare_with_baseline('base', None, {})
+
+    def test_iter_test_results_keeps_order_with_many_jobs(self):
+        import time
+        self.command.namespace.jobs = 4
+        self.command.report_test = Mock()
+
+        def run_test(dirname, binary, fin, fout):
+            # first cases finish last
+            time.sleep(0.01 * (4 - int(fin[-4])))
+            return {'fin': fin, 'success': True, 'time': 0.5}
+        self.command.run_test = run_test
+
+        cases = [('test%d.in' % x, 'test%d.out' % x) for x in range(1, 4)]
+        results = list(self.command.iter_test_results('foobar', 'bin', cases))
+
+        self.assertEqual([info['fin'] for info in results],
+            ['test1.in', 'test2.in', 'test3.in'])
+        self.assertEqual([c[0][0]['fin'] for c in
+            self.command.report_test.call_args_list],
+            ['test1.in', 'test2.in', 'test3.in'])
+
+    def test_iter_test_results_cancels_pending_tests(self):
+        import time
+        self.command.namespace.jobs = 2
+        self.command.report_test = Mock()
+        started = []
+
+        def run_test(dirname, binary, fin, fout):
+            started.append(fin)
+            time.sleep(0.01)
+            return {'fin': fin, 'success': True, 'time': 0.01}
+        self.command.run_test = run_test
+
+        cases = [('test%d.in' % x, 'test%d.out' % x) for x in range(20)]
+        results = self.command.iter_test_results('foobar', 'bin', cases)
+        self.assertEqual(next(results)['fin'], 'test0.in')
+        results.close()
+        self.assertLess(len(started), 20)
+
+    def test_iter_test_results_submits_bounded_window(self):
+        self.command.namespace.jobs = 2
+        self.command.report_test = Mock()
+        self.command.run_test = lambda dirname, binary, fin, fout: {
+            'fin': fin, 'success': True, 'time': 0.0}
+        discovered = []
+
+        def get_cases():
+            for x in range(100):
+                discovered.append(x)
+                yield ('test%d.in' % x, 'test%d.out' % x)
+
+        results = self.command.iter_test_results('foobar', 'bin',
+            get_cases())
+        self.assertEqual(next(results)['fin'], 'test0.in')
+        self.assertEqual(len(discovered), 2 * WINDOW_FACTOR)
+        self.assertEqual(next(results)['fin'], 'test1.in')
+        self.assertEqual(len(discovered), 2 * WINDOW_FACTOR + 1)
+        self.assertEqual([info['fin'] for info in results],
+            ['test%d.in' % x for x in range(2, 100)])
+
+    def make_case(self, input, expected):
+        tempdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tempdir)
+        fin = abspath(tempdir, 'test01.in')
+        fout = abspath(tempdir, 'test01.out')
+        with open(fin, 'w') as afile:
+            afile.write(input)
+        with open(fout, 'w') as afile:
+            afile.write(expected)
+        return fin, fout
+
     def test_test_program(self):
-        with patch('porunga.commands.test.Popen') as PopenMock:
-            with tempfile.NamedTemporaryFile() as fout:
-                fout.write(b'out')
-                fout.flush()
-                mock = PopenMock.return_value = Mock()
-                mock.communicate = lambda: ('out', '')
-                mock.returncode = 0
-                info = self.command.test('foobar', 'foobar/foobar.out', 'fin', fout.name)
-
-                self.assertEqual(PopenMock.call_args_list, [
-                    call('cat fin | foobar/foobar.out', stdout=PIPE, stderr=PIPE,
-                        shell=True),
-                ])
+        fin, fout = self.make_case('out\n', 'out')
+        info = self.command.test('foobar', 'cat', fin, fout)
 
-                self.assertTrue(info['success'])
-                self.assertIn('time', info)
+        self.assertTrue(info['success'])
+        self.assertIn('time', info)
+        self.assertGreater(info['maxrss'], 0)
+        self.assertGreaterEqual(info['utime'], 0)
+        self.assertGreaterEqual(info['stime'], 0)
 
     def test_test_program_fails(self):
-        with patch('porunga.commands.test.Popen') as PopenMock:
-            self.command.log = Mock()
-            self.command.namespace.verbose = True
-            mock = PopenMock.return_value = Mock()
-            mock.communicate = lambda: ('out', 'err')
-            mock.returncode = 1
-            info = self.command.test('foobar', 'foobar/foobar.out', 'fin', 'fout')
+        self.command.log = Mock()
+        self.command.namespace.verbose = True
+        fin, fout = self.make_case('out\n', 'out')
+        info = self.command.test('foobar', ['sh', '-c', 'cat; exit 1'], fin,
+            fout)
+
+        self.assertFalse(info['success'])
+        self.assertEqual(info['returncode'], 1)
+        self.assertIn('time', info)
 
-            self.assertEqual(PopenMock.call_args_list, [
-                call('cat fin | foobar/foobar.out', stdout=PIPE, stderr=PIPE,
-                     shell=True),
-            ])
+    def test_test_program_stopped_on_wrong_output(self):
+        fin, fout = self.make_case('', 'foo\nbar\n')
+        binary = ['sh', '-c', 'echo foo; echo baz; sleep 5']
+        info = self.command.test('foobar', binary, fin, fout)
+
+        self.assertFalse(info['success'])
+        self.assertTrue(info['aborted'])
+        self.assertLess(info['time'], 4)
+        self.assertEqual(info['mismatch'].line, 2)
+
+    def test_test_program_memory_limit(self):
+        self.command.log = Mock()
+        self.command.namespace.memory_limit = 128
+        fin, fout = self.make_case('', '')
+        binary = [sys.executable, '-c', 'x = bytearray(256 * 1024 * 1024)']
+        info = self.command.test('foobar', binary, fin, fout)
+
+        self.assertFalse(info['success'])
+        self.assertEqual(info['verdict'], 'memory limit exceeded')
+
+    def test_test_program_memory_limit_below_porunga_peak(self):
+        # make sure peak of this process is well above the limit
+        ballast = bytearray(64 * 1024 * 1024)
+        for index in range(0, len(ballast), 4096):
+            ballast[index] = 1
+        self.command.log = Mock()
+        self.command.namespace.memory_limit = 16
+        fin, fout = self.make_case('out\n', 'out')
+        info = self.command.test('foobar', 'cat', fin, fout)
+
+        self.assertTrue(info['success'])
+        self.assertLess(info['maxrss'], 16 * 1024 * 1024)
+
+    def test_get_command_runinfo_uses_cgroup_peak(self):
+        command = Mock(memory_limit=1024 * 1024, max_rss=4 * 1024 * 1024,
+            returncode=0, error_output=b'')
+        runinfo = self.command.get_command_runinfo(command, b'', False, False,
+            False, 512 * 1024)
+        self.assertFalse(runinfo['memory_exceeded'])
+        self.assertEqual(runinfo['maxrss'], 512 * 1024)
+        runinfo = self.command.get_command_runinfo(command, b'', False, False,
+            True, 512 * 1024)
+        self.assertTrue(runinfo['memory_exceeded'])
+
+    def test_test_program_compressed_case(self):
+        self.command.log = Mock()
+        fin, fout = self.make_case('', '')
+        with gzip.open(fin + '.gz', 'wb') as afile:
+            afile.write(b'foo\n' * 10000)
+        with open(fout, 'w') as afile:
+            afile.write('foo\n' * 10000)
+        self.assertEqual(self.command.get_fout_name(fin + '.gz'), fout)
+        info = self.command.test('foobar', 'cat', fin + '.gz', fout)
+
+        self.assertTrue(info['success'])
+
+    def test_get_test_cases_from_archive(self):
+        dirname = self.make_testdata()
+        archive = abspath(dirname, 'testdata.zip')
+        with zipfile.ZipFile(archive, 'w') as azip:
+            azip.writestr('t1.in', b'foo')
+            azip.writestr('t1.out', b'foo')
+        cases = list(self.command.get_test_cases(dirname))
+        self.assertEqual(cases, [(archive + '/t1.in', archive + '/t1.out')])
+        self.command.log = Mock()
+        self.assertTrue(self.command.test('foobar', 'cat', *cases[0])['success'])
+
+    def test_test_program_path_with_spaces(self):
+        fin, fout = self.make_case('out\n', 'out')
+        dirname = os.path.dirname(fin)
+        script = abspath(dirname, 'with space.py')
+        with open(script, 'w') as afile:
+            afile.write('import sys\nsys.stdout.write(sys.stdin.read())')
+        info = self.command.test('foobar', [sys.executable, script], fin, fout)
+
+        self.assertTrue(info['success'])
+
+    def test_test_program_missing_input(self):
+        fin, fout = self.make_case('out\n', 'out')
+        info = self.command.test('foobar', 'cat', fin + '.missing', fout)
+
+        self.assertFalse(info['success'])
+        self.assertIn('in file could not be read', info['output'])
+
+    def test_get_binary_argv_does_not_split_paths(self):
+        self.assertEqual(self.command.get_binary_argv('foo bar/baz', 'python'),
+            ['python', 'foo bar/baz/baz.py'])
+        self.assertEqual(self.command.get_binary_argv('foo bar/', 'java'),
+            ['java', '-cp', 'foo bar', 'foo bar'])
+
+    def test_get_language_for_file(self):
+        self.assertEqual(self.command.get_language_for_file('foo/gen.cpp'),
+            ('cpp', 'gen'))
+        self.assertEqual(self.command.get_language_for_file('gen.py'),
+            ('python', 'gen'))
+        self.assertEqual(self.command.get_language_for_file('gen.txt'),
+            (None, None))
+
+    def test_get_program(self):
+        self.command.compile = Mock()
+        self.assertEqual(self.command.get_program('foo/gen.c'),
+            ['foo/gen.c.out'])
+        self.command.compile.assert_called_once_with(
+            'gcc -O2 foo/gen.c -o foo/gen.c.out')
+
+    def test_get_program_unknown_language(self):
+        self.command.exit = Mock(side_effect=SystemExit)
+        self.assertRaises(SystemExit, self.command.get_program, 'gen.txt')
+
+    def test_test_program_cpu_time_limit(self):
+        self.command.log = Mock()
+        self.command.namespace.timeout = 0.1
+        self.command.namespace.cpu_time = True
+        fin, fout = self.make_case('', '')
+        binary = "%s -c 'import time\nwhile time.process_time() < 0.3: pass'" % (
+            sys.executable)
+        info = self.command.test('foobar', binary, fin, fout)
 
-            self.assertFalse(info['success'])
-            self.assertIn('time', info)
+        self.assertFalse(info['success'])
+        self.assertTrue(info['timeouted'])
+        self.assertGreater(info['utime'] + info['stime'], 0.1)
 
     def test_logs(self):
         self.command.log = Mock()
@@ -243,7 +671,7 @@ class TestPorungaTestCommand(unittest.TestCase):
             call(colored('foo', 'red'), False))
 
     def test_curdir(self):
-        with patch('porunga.commands.test.os') as osmock:
+        with patch('porunga.engine.os') as osmock:
             osmock.path.curdir = '/foo/bar/baz'
             self.assertEqual(curdir(), '/foo/bar/baz')
 
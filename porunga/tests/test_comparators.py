@@ -0,0 +1,187 @@
+import io
+from porunga import comparators
+from porunga.comparators import ExactComparator
+from porunga.comparators import NumericComparator
+from porunga.comparators import Stripper
+from porunga.comparators import TokenComparator
+from porunga.comparators import split_tokens
+from porunga.utils.compat import unittest
+from mock import patch
+
+
+class TestStripper(unittest.TestCase):
+
+    def test_strips_stream(self):
+        stripper = Stripper()
+        chunks = [b'  \n', b' foo ', b' ', b'bar\n', b'\n  ']
+        self.assertEqual(b''.join(stripper.feed(c) for c in chunks),
+            b'foo  bar')
+        self.assertEqual(stripper.skipped, b'  \n ')
+
+
+class TestExactComparator(unittest.TestCase):
+
+    def compare(self, chunks, expected, chunk_size=3):
+        comparator = ExactComparator(io.BytesIO(expected), chunk_size)
+        for chunk in chunks:
+            if not comparator.feed(chunk):
+                break
+        comparator.finish()
+        return comparator
+
+    def test_same_output(self):
+        comparator = self.compare([b'1 2', b' 3\n4', b'\n\n'], b'\n1 2 3\n4\n')
+        self.assertFalse(comparator.failed)
+
+    def test_output_differs(self):
+        comparator = self.compare([b'1 2\n3', b' 5 6\n'], b'1 2\n3 4 5\n')
+        self.assertTrue(comparator.failed)
+        mismatch = comparator.mismatch
+        self.assertEqual((mismatch.offset, mismatch.line, mismatch.column),
+            (6, 2, 3))
+        self.assertEqual(mismatch.output, b'5 6')
+        self.assertEqual(mismatch.expected[:1], b'4')
+
+    def test_position_includes_leading_whitespace(self):
+        comparator = self.compare([b'foo'], b'\n\n  fox\n')
+        mismatch = comparator.mismatch
+        self.assertEqual((mismatch.offset, mismatch.line, mismatch.column),
+            (6, 3, 5))
+
+    def test_output_too_long(self):
+        comparator = self.compare([b'1 2', b' 3'], b'1 2\n')
+        self.assertTrue(comparator.failed)
+        self.assertEqual(comparator.mismatch.output, b' 3')
+        self.assertEqual(comparator.mismatch.expected, b'')
+
+    def test_output_too_short(self):
+        comparator = self.compare([b'1 2  \n'], b'1 2 3\n')
+        self.assertTrue(comparator.failed)
+        self.assertEqual(comparator.mismatch.offset, 3)
+        self.assertEqual(comparator.mismatch.output, b'')
+
+    def test_stops_reading_expected_at_first_difference(self):
+        expected = io.BytesIO(b'a' * 1000)
+        comparator = ExactComparator(expected, chunk_size=10)
+        self.assertFalse(comparator.feed(b'b'))
+        self.assertEqual(expected.tell(), 10)
+
+
+class TestTokenComparator(unittest.TestCase):
+
+    def compare(self, chunks, expected, cls=TokenComparator, chunk_size=4,
+            **kwargs):
+        comparator = cls(io.BytesIO(expected), chunk_size, **kwargs)
+        for chunk in chunks:
+            if not comparator.feed(chunk):
+                break
+        comparator.finish()
+        return comparator
+
+    def test_split_tokens(self):
+        self.assertEqual(split_tokens(b' 12 34\n5'), ([b'12', b'34'], b'5'))
+        self.assertEqual(split_tokens(b' 12 34\n'), ([b'12', b'34'], b''))
+        self.assertEqual(split_tokens(b'12 5', final=True), ([b'12', b'5'],
+            b''))
+
+    def test_whitespace_is_ignored(self):
+        comparator = self.compare([b'1  2', b'3 4', b'\t5\n'],
+            b'1 23\n4\n5')
+        self.assertFalse(comparator.failed)
+
+    def test_token_split_between_chunks(self):
+        comparator = self.compare([b'12', b'34'], b'1234')
+        self.assertFalse(comparator.failed)
+        comparator = self.compare([b'12', b' 34'], b'1234')
+        self.assertTrue(comparator.failed)
+
+    def test_mismatch_position(self):
+        comparator = self.compare([b'foo bar baz'], b'foo\n  bar\nbax\n')
+        mismatch = comparator.mismatch
+        self.assertEqual((mismatch.offset, mismatch.line, mismatch.column),
+            (10, 3, 1))
+        self.assertEqual((mismatch.output, mismatch.expected), (b'baz',
+            b'bax'))
+
+    def test_output_too_long(self):
+        comparator = self.compare([b'1 2 3'], b'1 2\n')
+        self.assertTrue(comparator.failed)
+        self.assertEqual(comparator.mismatch.output, b'3')
+        self.assertEqual(comparator.mismatch.expected, b'')
+        self.assertEqual(comparator.mismatch.offset, 4)
+
+    def test_output_too_short(self):
+        comparator = self.compare([b'1 2'], b'1 2 3\n')
+        self.assertTrue(comparator.failed)
+        self.assertEqual(comparator.mismatch.output, b'')
+        self.assertEqual(comparator.mismatch.expected, b'3')
+
+
+class TestNumericComparator(TestTokenComparator):
+
+    def compare(self, chunks, expected, cls=NumericComparator, chunk_size=4,
+            **kwargs):
+        return super(TestNumericComparator, self).compare(chunks, expected,
+            cls, chunk_size, **kwargs)
+
+    def test_numbers_within_error(self):
+        comparator = self.compare([b'0.3333333 1e3 -0 ', b'yes 1000001'],
+            b'0.333333333 1000 0 yes 1000000', relative=1e-6)
+        self.assertFalse(comparator.failed)
+
+    def test_numbers_out_of_error(self):
+        comparator = self.compare([b'1.5 2.01'], b'1.5 2', absolute=1e-3,
+            relative=1e-3)
+        self.assertTrue(comparator.failed)
+        self.assertEqual(comparator.mismatch.output, b'2.01')
+
+    def test_words_must_be_same(self):
+        comparator = self.compare([b'1.0 no'], b'1 yes')
+        self.assertTrue(comparator.failed)
+        self.assertEqual(comparator.mismatch.output, b'no')
+
+    def check_large_output(self):
+        expected = b' '.join(b'%.9f' % (x / 7.0) for x in range(200))
+        output = b' '.join(b'%.7f' % (x / 7.0) for x in range(200))
+        comparator = self.compare([output], expected, chunk_size=4096)
+        self.assertFalse(comparator.failed)
+        wrong = output.replace(b'14.2857143', b'14.2', 1)
+        comparator = self.compare([wrong], expected, chunk_size=4096)
+        self.assertEqual(comparator.mismatch.output, b'14.2')
+        words = output.replace(b'14.2857143', b'inf inf', 1)
+        comparator = self.compare([words], expected + b' inf',
+            chunk_size=4096)
+        self.assertEqual(comparator.mismatch.output, b'inf')
+
+    @unittest.skipIf(comparators.numpy is None, 'numpy is not installed')
+    def test_large_output_with_words_with_numpy(self):
+        expected = b' '.join(b'%.9f' % (x / 7.0) for x in range(200))
+        output = b' '.join(b'%.7f' % (x / 7.0) for x in range(200))
+        is_close = NumericComparator.is_close
+        with patch.object(NumericComparator, 'is_close', autospec=True,
+                side_effect=is_close) as mock:
+            comparator = self.compare([b'yes ' + output], b'yes ' + expected,
+                chunk_size=4096)
+        self.assertFalse(comparator.failed)
+        # the word (and short tail of the block) is compared one by one
+        self.assertLess(mock.call_count, 5)
+        wrong = output.replace(b'14.2857143', b'14.2', 1)
+        comparator = self.compare([b'yes ' + wrong], b'yes ' + expected,
+            chunk_size=4096)
+        self.assertEqual(comparator.mismatch.output, b'14.2')
+        comparator = self.compare([b'no ' + output], b'yes ' + expected,
+            chunk_size=4096)
+        self.assertEqual(comparator.mismatch.output, b'no')
+
+    def test_parse_floats(self):
+        values = comparators.parse_floats([b'1.5', b'-inf', b'yes'])
+        self.assertEqual(values[:2].tolist(), [1.5, float('-inf')])
+        self.assertTrue(comparators.numpy.isnan(values[2]))
+
+    def test_large_output_without_numpy(self):
+        with patch.object(comparators, 'numpy', None):
+            self.check_large_output()
+
+    @unittest.skipIf(comparators.numpy is None, 'numpy is not installed')
+    def test_large_output_with_numpy(self):
+        self.check_large_output()
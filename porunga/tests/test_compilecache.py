@@ -0,0 +1,97 @@
+import os
+import shutil
+import tempfile
+import threading
+import time
+from porunga.compilecache import CompileCache
+from porunga.compilecache import TMP_GRACE_PERIOD
+from porunga.compilecache import TMP_SUFFIX
+from porunga.utils.compat import unittest
+from porunga.utils.paths import abspath
+from mock import patch
+
+
+class TestCompileCache(unittest.TestCase):
+
+    def setUp(self):
+        self.tempdir = tempfile.mkdtemp()
+        self.cache = CompileCache(abspath(self.tempdir, 'cache'))
+        self.source = abspath(self.tempdir, 'foo.c')
+        self.write(self.source, 'int main() {}')
+        patcher = patch('porunga.compilecache.get_compiler_version',
+            return_value='gcc 4.2')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        shutil.rmtree(self.tempdir)
+
+    def write(self, path, content):
+        with open(path, 'w') as afile:
+            afile.write(content)
+
+    def test_get_key_depends_on_source_and_program(self):
+        key = self.cache.get_key(self.source, 'gcc foo.c')
+        self.assertEqual(key, self.cache.get_key(self.source, 'gcc foo.c'))
+        self.assertNotEqual(key, self.cache.get_key(self.source, 'gcc -O2 foo.c'))
+        self.write(self.source, 'int main() { return 1; }')
+        self.assertNotEqual(key, self.cache.get_key(self.source, 'gcc foo.c'))
+
+    def test_get_key_for_missing_source(self):
+        self.assertIsNone(self.cache.get_key('/no/such/file.c', 'gcc'))
+
+    def test_store_and_restore(self):
+        binary = abspath(self.tempdir, 'foo.c.out')
+        self.write(binary, 'binary')
+        key = self.cache.get_key(self.source, 'gcc foo.c')
+        self.assertFalse(self.cache.restore(key, self.tempdir))
+
+        self.cache.store(key, [binary])
+        os.remove(binary)
+        self.assertTrue(self.cache.restore(key, self.tempdir))
+        self.assertEqual(open(binary).read(), 'binary')
+
+    def test_evict_removes_least_recently_used(self):
+        for name, mtime in (('old', 100), ('new', 200)):
+            path = abspath(self.tempdir, name)
+            self.write(path, '123456')
+            self.cache.store(name, [path])
+            os.utime(self.cache.get_entry_path(name), (mtime, mtime))
+        self.cache.max_size = 10
+        self.cache.evict()
+        self.assertEqual(os.listdir(self.cache.directory), ['new'])
+
+    def test_store_from_many_threads(self):
+        binary = abspath(self.tempdir, 'foo.c.out')
+        self.write(binary, 'binary')
+        key = self.cache.get_key(self.source, 'gcc foo.c')
+        threads = [threading.Thread(target=self.cache.store, args=(key,
+            [binary])) for index in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(os.listdir(self.cache.directory), [key])
+        self.assertEqual(os.listdir(self.cache.get_entry_path(key)),
+            ['foo.c.out'])
+
+    def test_evict_skips_entries_being_stored(self):
+        tmp = abspath(self.cache.directory, 'foo-123' + TMP_SUFFIX)
+        os.makedirs(tmp)
+        self.write(abspath(tmp, 'foo.c.out'), '123456')
+        self.cache.max_size = 0
+        self.cache.evict()
+        self.assertEqual(self.cache.get_entries(), [])
+        self.assertTrue(os.path.isdir(tmp))
+
+    def test_evict_removes_stale_entries_being_stored(self):
+        stale = abspath(self.cache.directory, 'foo-123' + TMP_SUFFIX)
+        fresh = abspath(self.cache.directory, 'foo-456' + TMP_SUFFIX)
+        for path in (stale, fresh):
+            os.makedirs(path)
+            self.write(abspath(path, 'foo.c.out'), '123456')
+        mtime = time.time() - TMP_GRACE_PERIOD - 1
+        os.utime(stale, (mtime, mtime))
+        self.cache.evict()
+        self.assertEqual(os.listdir(self.cache.directory),
+            ['foo-456' + TMP_SUFFIX])
@@ -0,0 +1,45 @@
+import shutil
+import tempfile
+from porunga.config import ConfigError
+from porunga.config import get_config_path
+from porunga.config import load_config
+from porunga.utils.compat import unittest
+
+
+class TestLoadConfig(unittest.TestCase):
+
+    def setUp(self):
+        self.tempdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tempdir)
+
+    def write(self, content):
+        with open(get_config_path(self.tempdir), 'w') as afile:
+            afile.write(content)
+
+    def test_missing_config(self):
+        self.assertEqual(load_config(self.tempdir), {})
+
+    def test_load_config(self):
+        self.write('[problem]\ncomparator = numeric\nabsolute_error = 1e-4\n'
+            '\n[other]\nfoo = bar\n')
+        self.assertEqual(load_config(self.tempdir), {'comparator': 'numeric',
+            'absolute_error': 1e-4})
+
+    def test_time_limit(self):
+        self.write('[problem]\ntime_limit = 1.5\n')
+        self.assertEqual(load_config(self.tempdir), {'time_limit': 1.5})
+
+    def test_unknown_option(self):
+        self.write('[problem]\nfoo = bar\n')
+        with self.assertRaises(ConfigError):
+            load_config(self.tempdir)
+
+    def test_invalid_value(self):
+        self.write('[problem]\nrelative_error = small\n')
+        with self.assertRaises(ConfigError):
+            load_config(self.tempdir)
+
+    def test_invalid_file(self):
+        self.write('comparator = numeric\n')
+        with self.assertRaises(ConfigError):
+            load_config(self.tempdir)
@@ -0,0 +1,128 @@
+import gzip
+import lzma
+import os
+import shutil
+import tarfile
+import tempfile
+import zipfile
+from porunga import containers
+from porunga.utils.compat import unittest
+from porunga.utils.paths import joinpath
+from mock import patch
+
+
+class TestContainers(unittest.TestCase):
+
+    def setUp(self):
+        self.tempdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tempdir)
+
+    def write(self, name, data, opener=open):
+        path = joinpath(self.tempdir, name)
+        with opener(path, 'wb') as afile:
+            afile.write(data)
+        return path
+
+    def read(self, path):
+        with containers.open_test_file(path) as afile:
+            return afile.read()
+
+    def test_split_compression(self):
+        self.assertEqual(containers.split_compression('a/t1.in.gz'),
+            ('a/t1.in', '.gz'))
+        self.assertEqual(containers.split_compression('a/t1.in'),
+            ('a/t1.in', ''))
+
+    def test_plain_file(self):
+        path = self.write('t1.in', b'foo')
+        self.assertTrue(containers.is_plain(path))
+        self.assertEqual(self.read(path), b'foo')
+
+    def test_empty_plain_file(self):
+        self.assertEqual(self.read(self.write('t1.in', b'')), b'')
+
+    def test_compressed_files(self):
+        for suffix, opener in (('.gz', gzip.open), ('.xz', lzma.open)):
+            path = self.write('t1.in' + suffix, b'foo' * 1000, opener)
+            self.assertFalse(containers.is_plain(path))
+            self.assertEqual(self.read(path), b'foo' * 1000)
+
+    def test_zip_archive(self):
+        archive = joinpath(self.tempdir, 'testdata.zip')
+        with zipfile.ZipFile(archive, 'w', zipfile.ZIP_DEFLATED) as azip:
+            azip.writestr('t10.in', b'10')
+            azip.writestr('t2.in', b'2')
+            azip.writestr('t2.out', b'4')
+            azip.writestr('big/t3.in', b'3')
+            azip.writestr('t4.in.gz', gzip.compress(b'4'))
+        self.assertEqual(list(containers.iter_archive_inputs(self.tempdir)), [
+            archive + '/t2.in', archive + '/t4.in.gz', archive + '/t10.in'])
+        self.assertEqual(len(list(containers.iter_archive_inputs(self.tempdir,
+            recursive=True))), 4)
+        self.assertEqual(self.read(archive + '/t2.out'), b'4')
+        self.assertEqual(self.read(archive + '/big/t3.in'), b'3')
+        self.assertEqual(self.read(archive + '/t4.in.gz'), b'4')
+        self.assertTrue(containers.exists(archive + '/t2.out'))
+        self.assertFalse(containers.exists(archive + '/t10.out'))
+        self.assertRaises(IOError, self.read, archive + '/t10.out')
+
+    def test_tar_archive(self):
+        source = self.write('t1.in', b'foo')
+        archive = joinpath(self.tempdir, 'testdata.tar.gz')
+        with tarfile.open(archive, 'w:gz') as atar:
+            atar.add(source, 'testdata/t1.in')
+        os.remove(source)
+        self.assertEqual(list(containers.iter_archive_inputs(self.tempdir)),
+            [archive + '/testdata/t1.in'])
+        self.assertEqual(self.read(archive + '/testdata/t1.in'), b'foo')
+
+    def test_tar_archive_is_read_once(self):
+        archive = joinpath(self.tempdir, 'testdata.tar.gz')
+        with tarfile.open(archive, 'w:gz') as atar:
+            for index in range(20):
+                source = self.write('t%d.in' % index, b'%d' % index)
+                atar.add(source, 't%d.in' % index)
+        opened = []
+        tarfile_open = tarfile.open
+
+        def open_tar(*args, **kwargs):
+            opened.append(args)
+            return tarfile_open(*args, **kwargs)
+
+        with patch('porunga.containers.tarfile.open', open_tar):
+            tar = containers.TarArchive(archive)
+            try:
+                for index in reversed(range(20)):
+                    with tar.open('t%d.in' % index) as afile:
+                        self.assertEqual(afile.read(), b'%d' % index)
+                directory = tar.directory
+                self.assertTrue(os.path.isdir(directory))
+            finally:
+                tar.close()
+        self.assertEqual(len(opened), 1)
+        self.assertTrue(tar.tarfile.closed)
+        self.assertFalse(os.path.exists(directory))
+        self.assertRaises(KeyError, tar.open, 'missing.in')
+
+    def test_plain_tar_archive_is_read_in_place(self):
+        archive = joinpath(self.tempdir, 'testdata.tar')
+        with tarfile.open(archive, 'w') as atar:
+            for index in range(3):
+                source = self.write('t%d.in' % index, b'%d' % index * 5000)
+                atar.add(source, 't%d.in' % index)
+        for index in reversed(range(3)):
+            self.assertEqual(self.read('%s/t%d.in' % (archive, index)),
+                b'%d' % index * 5000)
+        with containers.open_test_file(archive + '/t1.in') as afile:
+            self.assertEqual(afile.read(3), b'111')
+            self.assertEqual(len(afile.read()), 4997)
+        self.assertIsNone(containers.get_archive(archive).directory)
+
+    def test_missing_file(self):
+        self.assertRaises(IOError, self.read, joinpath(self.tempdir, 'x.in'))
+
+    def test_preload(self):
+        path = self.write('t1.in', b'foo')
+        containers.preload(path)
+        containers.preload(joinpath(self.tempdir, 'testdata.zip', 't2.in'))
+        self.assertEqual(self.read(path), b'foo')
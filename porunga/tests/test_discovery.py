@@ -0,0 +1,78 @@
+import os
+import shutil
+import tempfile
+from porunga import discovery
+from porunga.utils.compat import unittest
+from porunga.utils.paths import joinpath
+from mock import patch
+
+
+class TestDiscovery(unittest.TestCase):
+
+    def setUp(self):
+        self.tempdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tempdir)
+        self.testdir = joinpath(self.tempdir, 'testdata')
+        self.cachedir = joinpath(self.tempdir, 'cache')
+
+    def touch(self, *names):
+        for name in names:
+            path = joinpath(self.testdir, name)
+            if not os.path.isdir(os.path.dirname(path)):
+                os.makedirs(os.path.dirname(path))
+            open(path, 'w').close()
+
+    def test_natural_key(self):
+        names = ['test10.in', 'test2.in', 'a1b10', 'a1b9', 'test1.in']
+        self.assertEqual(sorted(names, key=discovery.natural_key),
+            ['a1b9', 'a1b10', 'test1.in', 'test2.in', 'test10.in'])
+
+    def test_iter_test_inputs(self):
+        self.touch('t10.in', 't9.in', 't9.out', 'sub/t1.in')
+        inputs = discovery.iter_test_inputs(self.testdir)
+        self.assertEqual([os.path.basename(fin) for fin in inputs],
+            ['t9.in', 't10.in'])
+
+    def test_iter_test_inputs_recursive(self):
+        self.touch('t1.in', 'b10/t1.in', 'b2/t2.IN', 'b2/deep/t3.in')
+        inputs = discovery.iter_test_inputs(self.testdir, recursive=True)
+        self.assertEqual([os.path.relpath(fin, self.testdir) for fin in inputs],
+            ['t1.in', 'b2/t2.IN', 'b2/deep/t3.in', 'b10/t1.in'])
+
+    def test_directories_are_not_inputs(self):
+        self.touch('t1.in', 'group.in/t2.in')
+        self.assertEqual(discovery.scan_directory(self.testdir),
+            (['t1.in'], ['group.in']))
+        inputs = discovery.iter_test_inputs(self.testdir, recursive=True)
+        self.assertEqual([os.path.relpath(fin, self.testdir) for fin in inputs],
+            ['t1.in', 'group.in/t2.in'])
+
+    def test_iter_test_inputs_missing_directory(self):
+        self.assertEqual(list(discovery.iter_test_inputs(self.testdir)), [])
+
+    def test_iter_test_inputs_is_lazy(self):
+        self.touch('t1.in', 'sub/t2.in')
+        with patch('porunga.discovery.scan_directory',
+                wraps=discovery.scan_directory) as scan:
+            inputs = discovery.iter_test_inputs(self.testdir, recursive=True)
+            next(inputs)
+            self.assertEqual(scan.call_count, 1)
+
+    def test_index_reused_until_directory_changes(self):
+        self.touch('t1.in')
+        index = discovery.DirectoryIndex(self.cachedir, self.testdir)
+        self.assertEqual(len(list(discovery.iter_test_inputs(self.testdir,
+            index=index))), 1)
+
+        index = discovery.DirectoryIndex(self.cachedir, self.testdir)
+        with patch('porunga.discovery.scan_directory') as scan:
+            inputs = list(discovery.iter_test_inputs(self.testdir, index=index))
+        self.assertFalse(scan.called)
+        self.assertEqual(len(inputs), 1)
+
+        self.touch('t2.in')
+        stat = os.stat(self.testdir)
+        os.utime(self.testdir, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1))
+        index = discovery.DirectoryIndex(self.cachedir, self.testdir)
+        inputs = list(discovery.iter_test_inputs(self.testdir, index=index))
+        self.assertEqual(len(inputs), 2)
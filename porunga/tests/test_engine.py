@@ -0,0 +1,79 @@
+import os
+import shutil
+import tempfile
+from argparse import Namespace
+from porunga.calibration import CalibrationCache
+from porunga.engine import Engine
+from porunga.engine import EngineError
+from porunga.engine import LANGUAGES
+from porunga.utils.compat import unittest
+from porunga.utils.paths import joinpath
+from mock import call
+from mock import patch
+
+
+class TestEngine(unittest.TestCase):
+
+    def setUp(self):
+        self.engine = Engine()
+        self.engine.namespace = Namespace(lang='python', all=False,
+            case=None, no_cache=True, report=None, timeout=0.0,
+            memory_limit=0.0, jobs=1)
+        self.tempdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tempdir)
+
+    def test_errors_are_raised(self):
+        with self.assertRaises(EngineError) as err:
+            self.engine.compile('echo message >&2; false')
+        self.assertEqual(str(err.exception), 'Compilation error: message')
+        with self.assertRaises(EngineError):
+            self.engine.get_binary(self.tempdir, 'foolang')
+
+    def test_pinning_not_supported(self):
+        self.engine.namespace.pin = True
+        with patch('porunga.pinning.is_supported', return_value=False):
+            self.assertRaises(EngineError, self.engine.start_pinning)
+        self.assertIsNone(self.engine.cpu_pool)
+
+    def test_stop_pinning_restores_affinity(self):
+        self.engine.namespace.pin = True
+        with patch('porunga.pinning.get_available_cpus',
+                return_value=[0, 1, 2]), \
+                patch('porunga.engine.os.sched_getaffinity',
+                    return_value=set([0, 1, 2])), \
+                patch('porunga.engine.os.sched_setaffinity') as setaffinity:
+            self.engine.start_pinning()
+            self.assertEqual(self.engine.cpu_pool.cpus, [1, 2])
+            self.engine.stop_suite()
+        self.assertEqual(setaffinity.call_args_list, [call(0, [0]),
+            call(0, set([0, 1, 2]))])
+        self.assertIsNone(self.engine.cpu_pool)
+
+    def test_cpu_is_calibrated_once(self):
+        cache = CalibrationCache(joinpath(self.tempdir, 'calibration.json'))
+        with patch('porunga.engine.CalibrationCache', return_value=cache), \
+                patch('porunga.engine.measure_cpu',
+                    return_value=0.1) as measure_cpu, \
+                patch('porunga.engine.measure_startup', return_value=0.01):
+            python = self.engine.get_calibration('python')
+            ruby = self.engine.get_calibration('ruby')
+        self.assertEqual(measure_cpu.call_count, 1)
+        self.assertEqual((python.cpu, ruby.cpu), (0.1, 0.1))
+        self.assertEqual(cache.get_cpu(), 0.1)
+        self.assertEqual(cache.get('ruby', ruby.version).startup, 0.01)
+        self.assertEqual(python.version,
+            self.engine.get_language_version('python'))
+
+    def test_prepare_suite(self):
+        dirname = joinpath(self.tempdir, 'foo')
+        os.makedirs(joinpath(dirname, 'testdata'))
+        for name in ('t1.in', 't1.out'):
+            open(joinpath(dirname, 'testdata', name), 'w').close()
+        binary, cases = self.engine.prepare_suite(dirname)
+        self.assertEqual(binary, ['python', joinpath(dirname, 'foo.py')])
+        self.assertEqual(list(cases), [(joinpath(dirname, 'testdata',
+            't1.in'), joinpath(dirname, 'testdata', 't1.out'))])
+        self.assertEqual(self.engine.suite['lang'], 'python')
+        self.assertEqual(self.engine.suite['binary'],
+            LANGUAGES['python']['prog'].format(fout=joinpath(dirname,
+            'foo.py')))
@@ -0,0 +1,102 @@
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from porunga import procme
+from porunga.forkserver import ForkServer
+from porunga.forkserver import ForkServerCommand
+from porunga.utils.compat import unittest
+from porunga.utils.paths import abspath
+
+
+class TestForkServer(unittest.TestCase):
+
+    def setUp(self):
+        self.tempdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tempdir)
+
+    def get_server(self, code):
+        solution = abspath(self.tempdir, 'solution.py')
+        with open(solution, 'w') as afile:
+            afile.write(code)
+        server = ForkServer(sys.executable, solution).start()
+        self.addCleanup(server.stop)
+        return server
+
+    def test_run(self):
+        server = self.get_server('import sys\n'
+            'if __name__ == "__main__":\n'
+            '    sys.stdout.write(sys.stdin.read().upper())\n'
+            '    sys.stderr.write("err")\n')
+        for data in (b'foo', b'bar'):
+            command = ForkServerCommand(server, None, input=data,
+                stderr=subprocess.PIPE)
+            self.assertEqual(b''.join(command.iter_raw_output()), data.upper())
+            self.assertEqual(command.returncode, 0)
+            self.assertEqual(command.error_output, b'err')
+            self.assertIsNotNone(command.max_rss)
+            self.assertIsNotNone(command.user_time)
+
+    def test_stdin_file(self):
+        server = self.get_server('print(input())')
+        fin = abspath(self.tempdir, 'test.in')
+        with open(fin, 'w') as afile:
+            afile.write('foo\n')
+        with open(fin, 'rb') as stdin:
+            command = ForkServerCommand(server, None, stdin=stdin)
+            command.run()
+        self.assertEqual(command.output, 'foo\n')
+
+    def test_argv(self):
+        server = self.get_server('import sys\nprint(sys.argv[1:])')
+        command = ForkServerCommand(server, None, argv=['1', '2'])
+        command.run()
+        self.assertEqual(command.output, "['1', '2']\n")
+
+    def test_cpus_and_nice(self):
+        server = self.get_server('import os\n'
+            'print(sorted(os.sched_getaffinity(0)), os.nice(0))')
+        cpu = max(os.sched_getaffinity(0))
+        command = ForkServerCommand(server, None, cpus=set([cpu]), nice=2)
+        command.run()
+        self.assertEqual(command.output, '[%d] %d\n' % (cpu, os.nice(0) + 2))
+
+    def test_returncode(self):
+        server = self.get_server('import sys\nsys.exit(3)')
+        command = ForkServerCommand(server, None)
+        self.assertEqual(command.run(), 3)
+
+    def test_exception(self):
+        server = self.get_server('1 / 0')
+        command = ForkServerCommand(server, None)
+        self.assertEqual(command.run(), 1)
+        self.assertIn('ZeroDivisionError', command.output)
+
+    def test_timeout(self):
+        server = self.get_server('import time\ntime.sleep(5)')
+        command = ForkServerCommand(server, None, timeout=0.2)
+        with self.assertRaises(procme.TimeoutExceeded):
+            command.run()
+        self.assertTrue(command.returncode < 0)
+
+    def test_start_waits_until_ready(self):
+        server = self.get_server('print(1)')
+        self.assertIsNone(server.process.poll())
+        self.assertTrue(server.process.stdout.closed)
+        self.assertRaises(OSError, ForkServer('false', 'foo.py').start)
+
+    def test_wall_time_starts_at_fork(self):
+        server = self.get_server('print(1)')
+        connect = server.connect
+
+        def slow_connect():
+            time.sleep(0.3)
+            return connect()
+
+        server.connect = slow_connect
+        command = ForkServerCommand(server, None, timeout=0.25)
+        command.run()
+        self.assertEqual(command.output, '1\n')
+        self.assertLess(command.wall_time, 0.25)
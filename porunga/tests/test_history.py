@@ -0,0 +1,71 @@
+import shutil
+import tempfile
+from porunga.history import History
+from porunga.history import PREVIOUS_RUN
+from porunga.history import find_regressions
+from porunga.history import get_history_path
+from porunga.utils.compat import unittest
+
+
+def result(name, wall, verdict='ok'):
+    return {'name': name, 'verdict': verdict, 'wall': wall, 'cpu': wall,
+            'maxrss': 1024}
+
+
+class TestHistory(unittest.TestCase):
+
+    def setUp(self):
+        tempdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tempdir)
+        self.history = History(get_history_path(tempdir))
+        self.addCleanup(self.history.close)
+
+    def test_find_run(self):
+        self.assertIsNone(self.history.find_run(PREVIOUS_RUN, 'python'))
+        first = self.history.add_run('python', 'abc', [], tag='base')
+        second = self.history.add_run('python', 'abc', [])
+        self.history.add_run('cpp', 'def', [], tag='base')
+        self.assertEqual(self.history.find_run(PREVIOUS_RUN, 'python'),
+            second)
+        self.assertEqual(self.history.find_run('base', 'python'), first)
+        self.assertIsNone(self.history.find_run('foo', 'python'))
+        self.assertIsNone(self.history.find_run(PREVIOUS_RUN, 'ruby'))
+
+    def test_get_results(self):
+        run_id = self.history.add_run('python', 'abc', [result('a.in', 0.5),
+            result('b.in', 1.5, 'timeout')])
+        results = self.history.get_results(run_id)
+        self.assertEqual(results['a.in'], result('a.in', 0.5))
+        self.assertEqual(results['b.in']['verdict'], 'timeout')
+
+    def test_get_latest_results(self):
+        self.history.add_run('python', 'abc', [result('a.in', 0.5),
+            result('b.in', 1.5)])
+        self.history.add_run('python', 'abc', [result('a.in', 0.7,
+            'wrong answer')])
+        self.history.add_run('cpp', 'def', [result('a.in', 0.1)])
+        results = self.history.get_latest_results('python')
+        self.assertEqual(results, {
+            'a.in': result('a.in', 0.7, 'wrong answer'),
+            'b.in': result('b.in', 1.5),
+        })
+        self.assertEqual(self.history.get_latest_results('ruby'), {})
+
+
+class TestFindRegressions(unittest.TestCase):
+
+    def test_find_regressions(self):
+        baseline = {
+            'a.in': result('a.in', 1.0),
+            'b.in': result('b.in', 1.0),
+            'c.in': result('c.in', 0.001),
+            'd.in': result('d.in', 1.0),
+        }
+        results = {
+            'a.in': result('a.in', 1.05),
+            'b.in': result('b.in', 1.5),
+            'c.in': result('c.in', 0.005),
+            'new.in': result('new.in', 3.0),
+        }
+        self.assertEqual(find_regressions(baseline, results, threshold=0.1,
+            noise=0.01), [('b.in', 1.0, 1.5)])
@@ -0,0 +1,43 @@
+import os
+import shutil
+import tempfile
+from porunga import limits
+from porunga.utils.compat import unittest
+from porunga.utils.paths import abspath
+from mock import patch
+
+
+class TestMemoryCgroup(unittest.TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root)
+
+    def test_get_cgroup_root(self):
+        with patch.dict(os.environ, {limits.CGROUP_ENV_VAR: self.root}):
+            self.assertIsNone(limits.get_cgroup_root())
+            limits.write_file(abspath(self.root, 'cgroup.subtree_control'),
+                'cpu memory\n')
+            self.assertEqual(limits.get_cgroup_root(), self.root)
+
+    def test_get_cgroup_root_without_env_var(self):
+        with patch.dict(os.environ, clear=True):
+            self.assertIsNone(limits.get_cgroup_root())
+
+    def test_cgroup(self):
+        cgroup = limits.MemoryCgroup(self.root, 1024)
+        self.assertEqual(limits.read_file(abspath(cgroup.path, 'memory.max')),
+            '1024')
+        self.assertIsNone(cgroup.get_peak())
+        self.assertFalse(cgroup.was_oom_killed())
+
+        limits.write_file(abspath(cgroup.path, 'memory.peak'), '2048\n')
+        limits.write_file(abspath(cgroup.path, 'memory.events'),
+            'low 0\nhigh 0\nmax 3\noom 1\noom_kill 1\n')
+        self.assertEqual(cgroup.get_peak(), 2048)
+        self.assertTrue(cgroup.was_oom_killed())
+
+    def test_is_out_of_memory_message(self):
+        self.assertTrue(limits.is_out_of_memory_message(
+            "terminate called after throwing an instance of 'std::bad_alloc'"))
+        self.assertFalse(limits.is_out_of_memory_message('ZeroDivisionError'))
@@ -1,5 +1,11 @@
 import unittest
 from porunga import get_manager
+from porunga.commands.batch import PorungaBatchCommand
+from porunga.commands.bench import PorungaBenchCommand
+from porunga.commands.calibrate import PorungaCalibrateCommand
+from porunga.commands.compare import PorungaCompareCommand
+from porunga.commands.complexity import PorungaComplexityCommand
+from porunga.commands.stress import PorungaStressCommand
 from porunga.commands.test import PorungaTestCommand
 
 
@@ -13,3 +19,29 @@ class TestManager(unittest.TestCase):
         test_command = commands['test']
         self.assertTrue(isinstance(test_command, PorungaTestCommand))
 
+
+    def test_manager_has_bench_command(self):
+        commands = get_manager().get_commands()
+        self.assertTrue(isinstance(commands['bench'], PorungaBenchCommand))
+
+    def test_manager_has_complexity_command(self):
+        commands = get_manager().get_commands()
+        self.assertTrue(isinstance(commands['complexity'],
+            PorungaComplexityCommand))
+
+    def test_manager_has_stress_command(self):
+        commands = get_manager().get_commands()
+        self.assertTrue(isinstance(commands['stress'], PorungaStressCommand))
+
+    def test_manager_has_compare_command(self):
+        commands = get_manager().get_commands()
+        self.assertTrue(isinstance(commands['compare'], PorungaCompareCommand))
+
+    def test_manager_has_batch_command(self):
+        commands = get_manager().get_commands()
+        self.assertTrue(isinstance(commands['batch'], PorungaBatchCommand))
+
+    def test_manager_has_calibrate_command(self):
+        commands = get_manager().get_commands()
+        self.assertTrue(isinstance(commands['calibrate'],
+            PorungaCalibrateCommand))
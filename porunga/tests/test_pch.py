@@ -0,0 +1,69 @@
+import os
+import shutil
+import tempfile
+from porunga.pch import HeaderCache
+from porunga.pch import get_first_include
+from porunga.utils.compat import unittest
+from porunga.utils.paths import joinpath
+from mock import patch
+
+
+class TestGetFirstInclude(unittest.TestCase):
+
+    def setUp(self):
+        self.tempdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tempdir)
+
+    def get(self, source):
+        path = joinpath(self.tempdir, 'a.cpp')
+        with open(path, 'w') as afile:
+            afile.write(source)
+        return get_first_include(path)
+
+    def test_first_include(self):
+        self.assertEqual(self.get('/* solution\n * of a */\n// foo\n\n'
+            '#pragma GCC optimize("O3")\n#  include <bits/stdc++.h>\n'
+            '#include <vector>\n'), 'bits/stdc++.h')
+
+    def test_code_before_include(self):
+        self.assertEqual(self.get('int x;\n#include <vector>\n'), None)
+        self.assertEqual(self.get('#include "local.h"\n#include <vector>\n'),
+            None)
+
+    def test_missing_file(self):
+        self.assertEqual(get_first_include(joinpath(self.tempdir, 'x.c')),
+            None)
+
+
+@patch('porunga.pch.get_compiler_version', lambda program: '1.0')
+class TestHeaderCache(unittest.TestCase):
+
+    def setUp(self):
+        self.tempdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tempdir)
+        self.cache = HeaderCache(joinpath(self.tempdir, 'pch'))
+
+    def test_get_include_dir(self):
+        log = joinpath(self.tempdir, 'log')
+        compiler = 'echo {fin} >> %s; touch {fout}' % log
+        include_dir = self.cache.get_include_dir(compiler, 'bits/stdc++.h',
+            'c++-header')
+        self.assertEqual(os.listdir(joinpath(include_dir, 'bits')),
+            ['stdc++.h.gch'])
+        self.assertEqual(self.cache.get_include_dir(compiler,
+            'bits/stdc++.h', 'c++-header'), include_dir)
+        with open(log) as afile:
+            lines = afile.read().splitlines()
+        self.assertEqual(len(lines), 1)
+        self.assertTrue(lines[0].startswith('-x c++-header '))
+        self.assertEqual(os.listdir(self.cache.directory),
+            [os.path.basename(include_dir)])
+
+    def test_failure_is_cached(self):
+        log = joinpath(self.tempdir, 'log')
+        compiler = 'echo {fin} >> %s; touch {fout}; false' % log
+        for attempt in range(2):
+            self.assertEqual(self.cache.get_include_dir(compiler, 'vector',
+                'c++-header'), None)
+        with open(log) as afile:
+            self.assertEqual(len(afile.read().splitlines()), 1)
@@ -0,0 +1,58 @@
+import argparse
+import os
+import threading
+import time
+from porunga import pinning
+from porunga.utils.compat import unittest
+from mock import patch
+
+
+class TestPinning(unittest.TestCase):
+
+    def test_split_cpus(self):
+        self.assertEqual(pinning.split_cpus([0, 1, 2, 3]), ([0], [1, 2, 3]))
+        self.assertEqual(pinning.split_cpus([5]), ([], [5]))
+
+    def test_cpu_pool_hands_out_distinct_cpus(self):
+        pool = pinning.CpuPool([1, 2])
+        used = []
+        lock = threading.Lock()
+
+        def run():
+            with pool.pinned() as cpus:
+                with lock:
+                    used.append(cpus)
+                    self.assertEqual(len([each for each in used
+                        if each == cpus]), 1)
+                time.sleep(0.01)
+                with lock:
+                    used.remove(cpus)
+
+        threads = [threading.Thread(target=run) for index in range(6)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(sorted(pool.free.queue), [1, 2])
+
+    def test_estimate_noise(self):
+        affinity = os.sched_getaffinity(0)
+        cpus = sorted(affinity)[:2]
+        timings = pinning.estimate_noise(cpus, samples=2)
+        self.assertEqual(len(timings), 2 * len(cpus))
+        self.assertEqual(os.sched_getaffinity(0), affinity)
+
+    def test_get_noise(self):
+        self.assertEqual(pinning.get_noise([1.0]), 0.0)
+        self.assertAlmostEqual(pinning.get_noise([0.9, 1.0, 1.1]), 0.1)
+
+    def test_pin_action(self):
+        parser = argparse.ArgumentParser()
+        parser.add_argument('--pin', default=False, action=pinning.PinAction)
+        self.assertFalse(parser.parse_args([]).pin)
+        with patch('porunga.pinning.is_supported', return_value=True):
+            self.assertTrue(parser.parse_args(['--pin']).pin)
+        with patch('porunga.pinning.is_supported', return_value=False):
+            with patch.object(parser, 'exit', side_effect=SystemExit) as exit:
+                self.assertRaises(SystemExit, parser.parse_args, ['--pin'])
+        self.assertIn('--pin is not supported', exit.call_args[0][1])
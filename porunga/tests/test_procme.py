@@ -0,0 +1,158 @@
+import io
+import os
+import shutil
+import sys
+import tempfile
+from porunga import limits
+from porunga import procme
+from porunga.utils.compat import unittest
+from mock import patch
+
+
+class TestCommand(unittest.TestCase):
+
+    def test_run_collects_output(self):
+        command = procme.Command('echo foo; echo bar >&2', shell=True)
+        self.assertEqual(command.run(), 0)
+        self.assertEqual(command.output, 'foo\nbar\n')
+
+    def test_run_returns_returncode(self):
+        command = procme.Command([sys.executable, '-c', 'exit(3)'])
+        self.assertEqual(command.run(), 3)
+        self.assertFalse(command.timeouted)
+
+    def test_iter_raw_output_yields_bytes(self):
+        command = procme.Command(['echo', 'foo'])
+        self.assertEqual(b''.join(command.iter_raw_output()), b'foo\n')
+
+    def test_timeout_kills_process_group(self):
+        command = procme.Command('sleep 5 | sleep 5', shell=True,
+            timeout=0.2)
+        start = procme.monotonic()
+        with self.assertRaises(procme.TimeoutExceeded):
+            command.run()
+        self.assertLess(procme.monotonic() - start, 2)
+        self.assertTrue(command.timeouted)
+        self.assertIsNotNone(command.returncode)
+
+    def test_closing_iterator_kills_command(self):
+        command = procme.Command('echo foo; sleep 5', shell=True)
+        iterator = command.iter_raw_output()
+        self.assertEqual(next(iterator), b'foo\n')
+        iterator.close()
+        self.assertIsNotNone(command.returncode)
+
+    def test_separate_stderr(self):
+        command = procme.Command('echo foo; echo bar >&2', shell=True,
+            stderr=procme.subprocess.PIPE)
+        command.run()
+        self.assertEqual(command.output, 'foo\n')
+        self.assertEqual(command.error_output, b'bar\n')
+
+    def test_resource_usage(self):
+        command = procme.Command([sys.executable, '-c',
+            'x = bytearray(50 * 1024 * 1024); sum(range(10 ** 6))'])
+        command.run()
+        self.assertGreater(command.max_rss, 50 * 1024 * 1024)
+        self.assertGreater(command.user_time, 0)
+        self.assertGreaterEqual(command.system_time, 0)
+        self.assertGreaterEqual(command.wall_time, command.cpu_time * 0.5)
+
+    def test_cpu_timeout(self):
+        command = procme.Command([sys.executable, '-c',
+            'import time\nwhile time.process_time() < 0.3: pass'],
+            cpu_timeout=0.1, timeout=5)
+        with self.assertRaises(procme.TimeoutExceeded):
+            command.run()
+        self.assertTrue(command.timeouted)
+
+    def test_memory_limit(self):
+        command = procme.Command([sys.executable, '-c',
+            'x = bytearray(512 * 1024 * 1024)'], memory_limit=256 * 1024 * 1024,
+            stderr=procme.subprocess.PIPE)
+        command.run()
+        self.assertNotEqual(command.returncode, 0)
+        self.assertIn(b'MemoryError', command.error_output)
+
+    def test_input(self):
+        data = b'foo\n' * 100000
+        command = procme.Command(['cat'], input=data)
+        self.assertEqual(b''.join(command.iter_raw_output()), data)
+        self.assertEqual(command.returncode, 0)
+
+    def test_input_stream(self):
+        data = b'foo\n' * 100000
+        command = procme.Command(['cat'], input=io.BytesIO(data))
+        self.assertEqual(b''.join(command.iter_raw_output()), data)
+        self.assertEqual(command.returncode, 0)
+
+    def test_input_not_read(self):
+        command = procme.Command(['true'], input=b'x' * 10 ** 6)
+        command.run()
+        self.assertEqual(command.returncode, 0)
+
+    def test_cpus_and_nice(self):
+        cpu = max(os.sched_getaffinity(0))
+        command = procme.Command([sys.executable, '-c', 'import os; '
+            'print(sorted(os.sched_getaffinity(0)), os.nice(0))'],
+            cpus=set([cpu]), nice=3)
+        self.assertEqual(b''.join(command.iter_raw_output()).decode(),
+            '[%d] %d\n' % (cpu, os.nice(0) + 3))
+
+    def test_started_without_preexec_fn(self):
+        command = procme.Command(['true'], memory_limit=256 * 1024 * 1024,
+            cpu_timeout=1, nice=3)
+        with patch('porunga.procme.subprocess.Popen') as Popen:
+            command.start()
+        args, kwargs = Popen.call_args
+        self.assertNotIn('preexec_fn', kwargs)
+        self.assertTrue(kwargs['start_new_session'])
+        self.assertEqual(args[0][:2], ['/bin/sh', '-c'])
+        self.assertEqual(args[0][2], 'ulimit -S -t 2 && ulimit -H -t 3 && '
+            'ulimit -S -v 262144 && ulimit -H -v 262144 && '
+            'exec nice -n 3 "$@"')
+        self.assertEqual(args[0][4:], ['true'])
+
+    def test_started_directly_without_setup(self):
+        command = procme.Command(['true'], timeout=1)
+        self.assertIsNone(command.get_setup_script())
+        self.assertEqual(command.get_argv(), ['true'])
+        command = procme.Command('echo foo', shell=True)
+        self.assertEqual(command.get_argv(), ['/bin/sh', '-c', 'echo foo'])
+
+    def test_missing_program_with_setup(self):
+        command = procme.Command(['./no-such-program'], cpu_timeout=1)
+        with self.assertRaises(OSError):
+            command.run()
+
+    def test_cgroup_attached_before_exec(self):
+        root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, root)
+        cgroup = limits.MemoryCgroup(root, 1024 * 1024)
+        command = procme.Command('echo $$', shell=True, cgroup=cgroup,
+            memory_limit=1024 * 1024)
+        command.run()
+        self.assertEqual(limits.read_file(cgroup.get_procs_path()),
+            command.output)
+
+    def test_max_rss_does_not_include_parent(self):
+        # make sure peak of this process is well above the one of cat
+        ballast = bytearray(64 * 1024 * 1024)
+        for index in range(0, len(ballast), 4096):
+            ballast[index] = 1
+        command = procme.Command(['cat'], input=b'foo\n')
+        command.run()
+        parent_rss = procme.read_peak_rss()
+        self.assertGreater(parent_rss, 64 * 1024 * 1024)
+        self.assertGreater(command.max_rss, 0)
+        self.assertLess(command.max_rss, 16 * 1024 * 1024)
+        self.assertLess(command.max_rss, parent_rss / 4)
+
+    def test_max_rss_above_parent(self):
+        command = procme.Command(['true'])
+        command.run()
+        command.rss_floor = command.rusage.ru_maxrss * procme.MAXRSS_UNIT - 1
+        self.assertEqual(command.max_rss,
+            command.rusage.ru_maxrss * procme.MAXRSS_UNIT)
+        command.rss_floor += 1
+        self.assertEqual(command.max_rss, command.sampled_rss or 0)
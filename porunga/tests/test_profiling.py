@@ -0,0 +1,65 @@
+import os
+import shutil
+import sys
+import tempfile
+from porunga import procme
+from porunga import profiling
+from porunga.utils.compat import unittest
+from porunga.utils.paths import joinpath
+from mock import patch
+
+
+GPROF_OUTPUT = """Flat profile:
+
+Each sample counts as 0.01 seconds.
+  %   cumulative   self              self     total
+ time   seconds   seconds    calls  ms/call  ms/call  name
+ 75.00      0.03     0.03        2    15.00    20.00  slow
+ 25.00      0.04     0.01                             main
+"""
+
+
+class TestProfiling(unittest.TestCase):
+
+    def setUp(self):
+        self.tempdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tempdir)
+        self.directory = joinpath(self.tempdir, 'profile')
+
+    def test_python_profiler(self):
+        solution = joinpath(self.tempdir, 'solution.py')
+        with open(solution, 'w') as afile:
+            afile.write('def hot():\n    return sum(range(1000))\n'
+                'hot()\n')
+        profiler = profiling.PythonProfiler(self.directory, solution)
+        for run in range(2):
+            cmd, env = profiler.prepare([sys.executable, solution])
+            self.assertIsNone(env)
+            self.assertEqual(procme.Command(cmd).run(), 0)
+
+        rows = profiler.collect()
+        hot = [row for row in rows if row[3].endswith('(hot)')]
+        self.assertEqual(hot[0][2], 2)
+        self.assertTrue(os.path.exists(joinpath(self.directory,
+            'suite.prof')))
+
+    def test_python_profiler_without_data(self):
+        profiler = profiling.PythonProfiler(self.directory, 'solution.py')
+        self.assertEqual(profiler.collect(), [])
+
+    def test_profile_directory_is_emptied(self):
+        os.makedirs(self.directory)
+        open(joinpath(self.directory, 'case-1.prof'), 'w').close()
+        profiling.PythonProfiler(self.directory, 'solution.py')
+        self.assertEqual(os.listdir(self.directory), [])
+
+    def test_gprof_profiler(self):
+        profiler = profiling.GprofProfiler(self.directory, 'solution')
+        cmd, env = profiler.prepare(['solution'])
+        self.assertEqual(env['GMON_OUT_PREFIX'],
+            joinpath(self.directory, 'gmon.out'))
+        open(joinpath(self.directory, 'gmon.out.1'), 'w').close()
+        with patch.object(profiler, 'gprof', return_value=GPROF_OUTPUT):
+            rows = profiler.collect()
+        self.assertEqual(rows, [(0.03, 0.04, 2, 'slow'),
+            (0.01, None, None, 'main')])
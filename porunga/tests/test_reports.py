@@ -0,0 +1,94 @@
+import json
+import shutil
+import tempfile
+import xml.etree.ElementTree as ElementTree
+from porunga import reports
+from porunga.utils.compat import unittest
+from porunga.utils.paths import joinpath
+from porunga.verdicts import VERDICT_OK
+from porunga.verdicts import VERDICT_TIMEOUT
+from porunga.verdicts import VERDICT_WRONG_ANSWER
+
+
+def make_info(fin, verdict, started, finished, worker='worker_0'):
+    return {
+        'fin': fin,
+        'verdict': verdict,
+        'success': verdict == VERDICT_OK,
+        'time': finished - started,
+        'utime': 0.1,
+        'stime': 0.0,
+        'maxrss': 1024,
+        'returncode': 0,
+        'output': 'out',
+        'errors': '',
+        'started': started,
+        'finished': finished,
+        'worker': worker,
+    }
+
+
+class TestReports(unittest.TestCase):
+
+    def setUp(self):
+        self.tempdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tempdir)
+        self.suite = {'name': 'foobar', 'lang': 'python', 'binary': 'foobar',
+            'started': 10.0, 'compile': (10.0, 11.0)}
+        self.results = [
+            make_info('t1.in', VERDICT_OK, 11.0, 12.0),
+            make_info('t2.in', VERDICT_WRONG_ANSWER, 11.0, 11.5, 'worker_1'),
+            make_info('t3.in', VERDICT_TIMEOUT, 13.0, 14.0),
+        ]
+
+    def write(self, value):
+        report = reports.open_report(value)
+        report.start(self.suite)
+        for info in self.results:
+            report.add(info)
+        self.suite['finished'] = 15.0
+        report.close(self.suite)
+
+    def test_parse_report_option(self):
+        self.assertEqual(reports.parse_report_option('junit:a:b.xml'),
+            ('junit', 'a:b.xml'))
+        self.assertRaises(ValueError, reports.parse_report_option, 'junit')
+        self.assertRaises(ValueError, reports.parse_report_option, 'foo:a')
+
+    def test_jsonl(self):
+        path = joinpath(self.tempdir, 'report.jsonl')
+        self.write('jsonl:' + path)
+        with open(path) as afile:
+            records = [json.loads(line) for line in afile]
+        self.assertEqual([record['type'] for record in records],
+            ['test'] * 3 + ['summary'])
+        self.assertEqual(records[1]['verdict'], VERDICT_WRONG_ANSWER)
+        self.assertEqual(records[2]['started'], 3.0)
+        self.assertEqual(records[3]['failures'], 2)
+
+    def test_junit(self):
+        path = joinpath(self.tempdir, 'report.xml')
+        self.write('junit:' + path)
+        testsuite = ElementTree.parse(path).getroot().find('testsuite')
+        self.assertEqual(testsuite.get('tests'), '3')
+        self.assertEqual(testsuite.get('failures'), '1')
+        self.assertEqual(testsuite.get('errors'), '1')
+        testcases = testsuite.findall('testcase')
+        self.assertIsNotNone(testcases[1].find('failure'))
+        self.assertEqual(testcases[2].find('error').get('type'),
+            VERDICT_TIMEOUT)
+
+    def test_trace(self):
+        path = joinpath(self.tempdir, 'trace.json')
+        self.write('trace:' + path)
+        with open(path) as afile:
+            events = json.load(afile)['traceEvents']
+        spans = [(event['name'], event['tid'], event['ts'], event['dur'])
+                 for event in events if event['ph'] == 'X']
+        self.assertEqual(spans, [
+            ('compile', 0, 0.0, 1e6),
+            ('t1.in', 1, 1e6, 1e6),
+            ('t2.in', 2, 1e6, 0.5e6),
+            ('idle', 1, 2e6, 1e6),
+            ('t3.in', 1, 3e6, 1e6),
+        ])
@@ -0,0 +1,163 @@
+import asyncio
+import gzip
+import os
+import shutil
+import sys
+import tempfile
+import threading
+from porunga import run_suite
+from porunga import run_suite_async
+from porunga import runner
+from porunga.aioprocme import AsyncCommand
+from porunga.calibration import Calibration
+from porunga.calibration import CalibrationCache
+from porunga.commands.test import PorungaTestCommand
+from porunga.procme import TimeoutExceeded
+from porunga.utils.compat import unittest
+from porunga.utils.paths import joinpath
+from mock import patch
+
+
+def run(coroutine):
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(coroutine)
+    finally:
+        loop.close()
+
+
+class TestAsyncCommand(unittest.TestCase):
+
+    def test_output_and_usage(self):
+        command = AsyncCommand([sys.executable, '-c', 'import sys; '
+            'data = sys.stdin.read(); print(len(data)); '
+            'sys.stderr.write("err")'], input=b'x' * 300000, stderr=-1)
+        self.assertEqual(run(command.run_async()), 0)
+        self.assertEqual(command.output, '300000\n')
+        self.assertEqual(command.error_output, b'err')
+        self.assertGreater(command.max_rss, 0)
+        self.assertIsNotNone(command.user_time)
+
+    def test_timeout(self):
+        command = AsyncCommand(['sleep', '5'], timeout=0.2)
+        with self.assertRaises(TimeoutExceeded):
+            run(command.run_async())
+        self.assertTrue(command.timeouted)
+        self.assertEqual(command.returncode, -9)
+
+    def test_many_commands(self):
+        async def run_all():
+            commands = [AsyncCommand([sys.executable, '-c',
+                'print(%d)' % index]) for index in range(20)]
+            await asyncio.gather(*[command.run_async() for command in
+                commands])
+            return [command.output for command in commands]
+
+        self.assertEqual(run(run_all()), ['%d\n' % index for index in
+            range(20)])
+
+
+class TestRunSuite(unittest.TestCase):
+
+    def setUp(self):
+        self.tempdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tempdir)
+        self.dirname = joinpath(self.tempdir, 'foo')
+        os.makedirs(joinpath(self.dirname, 'testdata'))
+        with open(joinpath(self.dirname, 'foo.py'), 'w') as afile:
+            afile.write('import time\nvalue = input()\n'
+                'time.sleep(float(value))\nprint(value)\n')
+        self.write('t1.in', '0\n')
+        self.write('t1.out', '0\n')
+        with gzip.open(joinpath(self.dirname, 'testdata', 't2.in.gz'),
+                'wb') as afile:
+            afile.write(b'0.0\n')
+        self.write('t2.out', '1\n')
+        self.write('t3.in', '5\n')
+        self.write('t3.out', '5\n')
+
+    def write(self, name, data):
+        with open(joinpath(self.dirname, 'testdata', name), 'w') as afile:
+            afile.write(data)
+
+    def check(self, suite):
+        self.assertIsInstance(suite, runner.SuiteResult)
+        self.assertFalse(suite.success)
+        self.assertEqual(suite.fails, 2)
+        self.assertEqual(sorted((result.name, result.verdict) for result in
+            suite), [
+                (joinpath('testdata', 't1.in'), 'ok'),
+                (joinpath('testdata', 't2.in.gz'), 'wrong answer'),
+                (joinpath('testdata', 't3.in'), 'timeout'),
+            ])
+        with self.assertRaises(AttributeError):
+            suite.results[0].foo = 1
+        self.assertFalse(os.path.exists(joinpath(self.dirname,
+            '.porunga-history.sqlite')))
+
+    def test_run_suite(self):
+        self.check(run_suite(self.dirname, 'python', timeout=0.5, jobs=2))
+
+    def test_run_suite_async(self):
+        self.check(run(run_suite_async(self.dirname, timeout=0.5,
+            limit=asyncio.Semaphore(2))))
+
+    def test_errors(self):
+        with self.assertRaises(runner.RunnerError):
+            run_suite(joinpath(self.tempdir, 'bar'))
+        with self.assertRaises(runner.RunnerError):
+            run_suite(self.dirname, 'fortran')
+        with self.assertRaises(TypeError):
+            run_suite(self.dirname, foo=1)
+
+    def test_runner_is_not_a_command(self):
+        self.assertFalse(issubclass(runner.Runner, PorungaTestCommand))
+
+    def test_run_suite_async_fail_fast_awaits_cancelled_tests(self):
+        async def run_and_list_tasks():
+            suite = await run_suite_async(self.dirname, timeout=10.0, jobs=3,
+                fail_fast=True)
+            current = asyncio.current_task()
+            return suite, [task for task in asyncio.all_tasks()
+                           if task is not current]
+
+        suite, pending = run(run_and_list_tasks())
+        self.assertEqual([result.verdict for result in suite],
+            ['ok', 'wrong answer'])
+        self.assertEqual(pending, [])
+
+    def test_run_suite_async_calibrates_off_the_loop(self):
+        with open(joinpath(self.dirname, 'porunga.cfg'), 'w') as afile:
+            afile.write('[problem]\ntime_limit = 0.5\n')
+        threads = []
+
+        def measure_calibration(self, lang, cpu=None):
+            threads.append(threading.current_thread())
+            return Calibration(lang, 0.1, 0.0)
+
+        with patch.object(CalibrationCache, 'get', return_value=None), \
+                patch.object(CalibrationCache, 'get_cpu', return_value=None), \
+                patch.object(CalibrationCache, 'store'), \
+                patch.object(runner.Runner, 'measure_calibration',
+                    measure_calibration):
+            self.check(run(run_suite_async(self.dirname)))
+        self.assertEqual(len(threads), 1)
+        self.assertIsNot(threads[0], threading.main_thread())
+
+    def test_run_suite_restores_affinity(self):
+        affinity = os.sched_getaffinity(0)
+        self.check(run_suite(self.dirname, timeout=0.5, jobs=2, pin=True))
+        self.assertEqual(os.sched_getaffinity(0), affinity)
+
+    def test_unsupported_options(self):
+        for name, value in (('profile', True), ('watch', True),
+                ('verbose', True), ('profile_top', 5)):
+            with self.assertRaises(TypeError):
+                run_suite(self.dirname, **{name: value})
+
+    def test_run_suite_writes_reports(self):
+        path = joinpath(self.tempdir, 'report.jsonl')
+        self.check(run_suite(self.dirname, timeout=0.5, jobs=2,
+            report=['jsonl:%s' % path]))
+        with open(path) as afile:
+            self.assertEqual(afile.read().count('"type": "test"'), 3)
@@ -0,0 +1,25 @@
+from porunga.scheduling import order_cases
+from porunga.utils.compat import unittest
+
+
+CASES = [('a.in', 'a.out'), ('b.in', 'b.out'), ('c.in', 'c.out'),
+         ('d.in', 'd.out')]
+
+
+class TestOrderCases(unittest.TestCase):
+
+    def test_longest_first(self):
+        durations = {'a.in': 0.1, 'b.in': 2.0, 'c.in': 0.5}
+        self.assertEqual([fin for fin, fout in order_cases(CASES, durations)],
+            ['d.in', 'b.in', 'c.in', 'a.in'])
+
+    def test_failed_first(self):
+        durations = {'a.in': 0.1, 'b.in': 2.0, 'c.in': 0.5, 'd.in': 0.3}
+        self.assertEqual([fin for fin, fout in order_cases(CASES, durations,
+            failed=set(['a.in', 'c.in']))], ['c.in', 'a.in', 'b.in', 'd.in'])
+
+    def test_failed_first_keeps_order(self):
+        durations = {'a.in': 0.1, 'b.in': 2.0}
+        self.assertEqual(order_cases(CASES, durations, failed=set(['c.in']),
+            longest_first=False), [('c.in', 'c.out'), ('a.in', 'a.out'),
+            ('b.in', 'b.out'), ('d.in', 'd.out')])
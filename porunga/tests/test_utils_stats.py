@@ -0,0 +1,72 @@
+from porunga.utils import stats
+from porunga.utils.compat import unittest
+
+
+class TestStats(unittest.TestCase):
+
+    def test_percentile(self):
+        values = [4, 1, 3, 2]
+        self.assertEqual(stats.percentile(values, 0), 1)
+        self.assertEqual(stats.percentile(values, 100), 4)
+        self.assertEqual(stats.percentile(values, 50), 2.5)
+        self.assertAlmostEqual(stats.percentile(values, 95), 3.85)
+
+    def test_stddev(self):
+        self.assertEqual(stats.stddev([1]), 0.0)
+        self.assertAlmostEqual(stats.stddev([2, 4, 4, 4, 5, 5, 7, 9]), 2.138,
+            places=3)
+
+    def test_summarize(self):
+        summary = stats.summarize([3, 1, 2])
+        self.assertEqual(summary['min'], 1)
+        self.assertEqual(summary['max'], 3)
+        self.assertEqual(summary['median'], 2)
+        self.assertEqual(summary['mean'], 2)
+        self.assertEqual(summary['stddev'], 1)
+
+    def test_fit_linear(self):
+        a, b = stats.fit_linear([1, 2, 3], [3, 5, 7], [1, 1, 1])
+        self.assertAlmostEqual(a, 1)
+        self.assertAlmostEqual(b, 2)
+
+    def test_fit_complexity_finds_quadratic(self):
+        sizes = [1000, 2000, 4000, 8000, 16000]
+        times = [0.01 + 1e-9 * n * n for n in sizes]
+        fits = stats.fit_complexity(sizes, times)
+        self.assertEqual(fits[0]['name'], 'O(n^2)')
+        self.assertGreater(fits[0]['confidence'], 0.5)
+        self.assertAlmostEqual(sum(fit['confidence'] for fit in fits), 1)
+
+    def test_fit_complexity_finds_linear(self):
+        sizes = [1000, 3000, 10000, 30000, 100000]
+        times = [0.02 + 1e-6 * n for n in sizes]
+        self.assertEqual(stats.fit_complexity(sizes, times)[0]['name'], 'O(n)')
+
+    def test_ranks(self):
+        self.assertEqual(stats.ranks([10, 30, 20, 20]), [1, 4, 2.5, 2.5])
+
+    def test_mann_whitney_distribution(self):
+        self.assertEqual(stats.mann_whitney_distribution(3, 2),
+            [1, 1, 2, 2, 2, 1, 1])
+
+    def test_mann_whitney_u_exact(self):
+        u, p = stats.mann_whitney_u([1, 2, 3, 4, 5], [6, 7, 8, 9, 10])
+        self.assertEqual(u, 0)
+        self.assertAlmostEqual(p, 2 / 252.0)
+        u, p = stats.mann_whitney_u([1, 3, 5, 7, 9], [2, 4, 6, 8, 10])
+        self.assertEqual(u, 10)
+        self.assertAlmostEqual(p, 0.6905, places=4)
+
+    def test_mann_whitney_u_approximation(self):
+        u, p = stats.mann_whitney_u([1, 1, 2, 3] * 10, [2, 3, 4, 4] * 10)
+        self.assertLess(p, 0.001)
+        u, p = stats.mann_whitney_u([1, 2] * 30, [2, 1] * 30)
+        self.assertEqual(p, 1.0)
+
+    def test_bootstrap_ratio(self):
+        ratio, low, high = stats.bootstrap_ratio([2.0, 2.1, 1.9, 2.0],
+            [1.0, 1.05, 0.95, 1.0])
+        self.assertAlmostEqual(ratio, 2.0)
+        self.assertLessEqual(low, ratio)
+        self.assertGreaterEqual(high, ratio)
+        self.assertGreater(low, 1.5)
@@ -0,0 +1,89 @@
+import os
+import shutil
+import tempfile
+from porunga import watch
+from porunga.utils.compat import unittest
+from porunga.utils.paths import joinpath
+
+
+def result(fin, verdict='ok', time=0.1, success=None):
+    if success is None:
+        success = verdict == 'ok'
+    return {'fin': fin, 'verdict': verdict, 'time': time, 'success': success}
+
+
+class TestWatchers(unittest.TestCase):
+
+    def setUp(self):
+        self.tempdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tempdir)
+        self.testdir = joinpath(self.tempdir, 'testdata')
+        os.makedirs(joinpath(self.testdir, 'sub'))
+        self.write('foo.py', 't1.in', 'sub/t2.in')
+
+    def write(self, *names):
+        for name in names:
+            path = joinpath(self.tempdir, name)
+            if name != 'foo.py':
+                path = joinpath(self.testdir, name)
+            if not os.path.isdir(os.path.dirname(path)):
+                os.makedirs(os.path.dirname(path))
+            with open(path, 'a') as afile:
+                afile.write('x')
+
+    def check_watcher(self, watcher):
+        self.addCleanup(watcher.close)
+        self.assertEqual(watcher.wait(timeout=0), set())
+        self.write('foo.py', 'sub/t2.in', 'new/t3.in')
+        os.remove(joinpath(self.testdir, 't1.in'))
+        self.assertEqual(watcher.wait(timeout=2), set([
+            joinpath(self.tempdir, 'foo.py'),
+            joinpath(self.testdir, 't1.in'),
+            joinpath(self.testdir, 'sub', 't2.in'),
+            joinpath(self.testdir, 'new', 't3.in'),
+        ]))
+
+    def test_polling_watcher(self):
+        self.check_watcher(watch.PollingWatcher({self.tempdir: False,
+            self.testdir: True}, interval=0.01))
+
+    def test_inotify_watcher(self):
+        try:
+            watcher = watch.InotifyWatcher({self.tempdir: False,
+                self.testdir: True})
+        except OSError:
+            self.skipTest('inotify is not available')
+        self.check_watcher(watcher)
+
+
+class TestOrderAndDiff(unittest.TestCase):
+
+    def test_order_cases(self):
+        previous = {
+            'a.in': result('a.in', time=0.1),
+            'b.in': result('b.in', time=0.5),
+            'c.in': result('c.in', 'wrong answer', time=0.2),
+        }
+        cases = [(name, name[0] + '.out') for name in
+                 ('a.in', 'b.in', 'c.in', 'd.in')]
+        self.assertEqual([fin for fin, fout in
+            watch.order_cases(cases, previous)],
+            ['c.in', 'd.in', 'b.in', 'a.in'])
+
+    def test_diff_results(self):
+        previous = {
+            'a.in': result('a.in', time=0.1),
+            'b.in': result('b.in', time=0.5),
+            'c.in': result('c.in', 'wrong answer', time=0.2),
+        }
+        results = [
+            result('a.in', time=0.105),
+            result('b.in', time=0.25),
+            result('c.in', time=0.2),
+            result('d.in', 'timeout', time=1.0),
+        ]
+        self.assertEqual(watch.diff_results(previous, results), [
+            'b.in: 0.500s -> 0.250s (-50%)',
+            'c.in: wrong answer -> ok',
+            'd.in: new, timeout (1.000s)',
+        ])
@@ -0,0 +1,23 @@
+import hashlib
+
+
+def file_digest(path, algorithm='sha1', chunk_size=64 * 1024):
+    """
+    Returns hex digest of the contents of file at given ``path``.
+    """
+    digest = hashlib.new(algorithm)
+    with open(path, 'rb') as afile:
+        for chunk in iter(lambda: afile.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def text_digest(*parts, **kwargs):
+    """
+    Returns hex digest computed from given text ``parts``.
+    """
+    digest = hashlib.new(kwargs.get('algorithm', 'sha1'))
+    for part in parts:
+        digest.update(part.encode('utf-8'))
+        digest.update(b'\0')
+    return digest.hexdigest()
@@ -4,3 +4,15 @@ import os
 joinpath = lambda *p: os.path.join(*p)
 abspath = lambda *p: os.path.abspath(joinpath(*p))
 
+
+
+def get_cache_dir(*p):
+    """
+    Returns per-user cache directory of porunga (``PORUNGA_CACHE_DIR``
+    environment variable, if set, takes precedence).
+    """
+    cachedir = os.environ.get('PORUNGA_CACHE_DIR')
+    if not cachedir:
+        cachedir = joinpath(os.environ.get('XDG_CACHE_HOME') or
+            os.path.expanduser(joinpath('~', '.cache')), 'porunga')
+    return joinpath(cachedir, *p)
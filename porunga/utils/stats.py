@@ -0,0 +1,200 @@
+"""
+Basic statistics used to summarize repeated timings.
+"""
+import math
+from random import Random
+
+
+def mean(values):
+    return sum(values) / float(len(values))
+
+
+def median(values):
+    return percentile(values, 50)
+
+
+def percentile(values, percent):
+    """
+    Returns given ``percent`` percentile of ``values`` (computed with linear
+    interpolation between closest ranks).
+    """
+    ordered = sorted(values)
+    rank = (len(ordered) - 1) * percent / 100.0
+    lower = int(math.floor(rank))
+    upper = int(math.ceil(rank))
+    if lower == upper:
+        return ordered[lower]
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (rank - lower)
+
+
+def stddev(values):
+    """
+    Returns sample standard deviation of ``values`` (0 for single value).
+    """
+    if len(values) < 2:
+        return 0.0
+    avg = mean(values)
+    return math.sqrt(sum((x - avg) ** 2 for x in values) / (len(values) - 1))
+
+
+def summarize(values):
+    """
+    Returns dictionary with ``min``, ``median``, ``mean``, ``p95``, ``max`` and
+    ``stddev`` of given ``values``.
+    """
+    return {
+        'min': min(values),
+        'median': median(values),
+        'mean': mean(values),
+        'p95': percentile(values, 95),
+        'max': max(values),
+        'stddev': stddev(values),
+    }
+
+
+# complexity classes as (name, function of input size)
+COMPLEXITY_CLASSES = [
+    ('O(1)', lambda n: 1.0),
+    ('O(log n)', lambda n: math.log(n)),
+    ('O(n)', lambda n: float(n)),
+    ('O(n log n)', lambda n: n * math.log(n)),
+    ('O(n^2)', lambda n: float(n) ** 2),
+    ('O(n^3)', lambda n: float(n) ** 3),
+]
+
+
+def fit_linear(xs, ys, weights):
+    """
+    Returns ``(a, b)`` minimizing weighted squared error of ``y = a + b * x``.
+    Slope is never negative (running time does not decrease with input size)
+    and is zero if all ``xs`` are the same.
+    """
+    total = sum(weights)
+    sx = sum(w * x for w, x in zip(weights, xs))
+    sy = sum(w * y for w, y in zip(weights, ys))
+    sxx = sum(w * x * x for w, x in zip(weights, xs))
+    sxy = sum(w * x * y for w, x, y in zip(weights, xs, ys))
+    det = total * sxx - sx * sx
+    b = 0.0
+    if det > 1e-12 * total * sxx:
+        b = max((total * sxy - sx * sy) / det, 0.0)
+    a = (sy - b * sx) / total
+    return a, b
+
+
+def fit_complexity(sizes, times):
+    """
+    Fits ``time = a + b * f(size)`` for each of ``COMPLEXITY_CLASSES``. Errors
+    are relative (each point is weighted by its time), so small inputs matter
+    as much as big ones.
+
+    Returns list of dictionaries (``name``, ``a``, ``b``, ``error`` - sum of
+    squared relative errors and ``confidence`` - Akaike weight of the class,
+    that is probability it is the best model among the candidates) sorted
+    from the best fit.
+    """
+    floor = max(max(times) * 1e-6, 1e-9)
+    weights = [1.0 / max(t, floor) ** 2 for t in times]
+    fits = []
+    for name, func in COMPLEXITY_CLASSES:
+        xs = [func(n) for n in sizes]
+        a, b = fit_linear(xs, times, weights)
+        error = sum(w * (a + b * x - t) ** 2
+            for w, x, t in zip(weights, xs, times))
+        fits.append({'name': name, 'a': a, 'b': b, 'func': func,
+            'error': error})
+    count = len(sizes)
+    aics = [count * math.log(max(fit['error'], 1e-12) / count) for fit in fits]
+    best = min(aics)
+    likelihoods = [math.exp(-0.5 * (aic - best)) for aic in aics]
+    for fit, likelihood in zip(fits, likelihoods):
+        fit['confidence'] = likelihood / sum(likelihoods)
+    return sorted(fits, key=lambda fit: -fit['confidence'])
+
+
+def ranks(values):
+    """
+    Returns ranks (starting from 1) of ``values``; tied values get the
+    average of their ranks.
+    """
+    order = sorted(range(len(values)), key=lambda index: values[index])
+    result = [0.0] * len(values)
+    start = 0
+    while start < len(order):
+        end = start
+        while (end + 1 < len(order) and
+                values[order[end + 1]] == values[order[start]]):
+            end += 1
+        for position in range(start, end + 1):
+            result[order[position]] = (start + end) / 2.0 + 1
+        start = end + 1
+    return result
+
+
+def mann_whitney_distribution(n1, n2):
+    """
+    Returns list of numbers of arrangements of two samples (of sizes ``n1``
+    and ``n2``, without ties) for which U statistic takes values 0, 1, ...,
+    ``n1 * n2`` (coefficients of Gaussian binomial coefficient).
+    """
+    counts = [1] + [0] * (n1 * n2)
+    for k in range(1, n1 + 1):
+        # multiply by (1 - q^(n2 + k)) ...
+        for u in range(len(counts) - 1, n2 + k - 1, -1):
+            counts[u] -= counts[u - n2 - k]
+        # ... and divide by (1 - q^k)
+        for u in range(k, len(counts)):
+            counts[u] += counts[u - k]
+    return counts
+
+
+def mann_whitney_u(xs, ys, exact_limit=400):
+    """
+    Returns ``(u, p)`` - Mann-Whitney U statistic of ``xs`` and two-sided
+    p-value of the hypothesis that both samples come from the same
+    distribution. P-value is exact for small samples without ties (up to
+    ``exact_limit`` pairs), otherwise normal approximation (with tie and
+    continuity corrections) is used.
+    """
+    n1 = len(xs)
+    n2 = len(ys)
+    combined = list(xs) + list(ys)
+    ranked = ranks(combined)
+    u = sum(ranked[:n1]) - n1 * (n1 + 1) / 2.0
+    ties = len(set(combined)) != len(combined)
+    if n1 * n2 <= exact_limit and not ties:
+        counts = mann_whitney_distribution(n1, n2)
+        total = float(sum(counts))
+        lower = sum(counts[:int(u) + 1]) / total
+        upper = sum(counts[int(u):]) / total
+        return u, min(1.0, 2 * min(lower, upper))
+    n = n1 + n2
+    groups = {}
+    for value in combined:
+        groups[value] = groups.get(value, 0) + 1
+    correction = sum(t ** 3 - t for t in groups.values()) / float(n * (n - 1))
+    sigma = math.sqrt(n1 * n2 / 12.0 * (n + 1 - correction))
+    if sigma == 0:
+        return u, 1.0
+    z = max(abs(u - n1 * n2 / 2.0) - 0.5, 0.0) / sigma
+    return u, min(1.0, math.erfc(z / math.sqrt(2)))
+
+
+def bootstrap_ratio(xs, ys, confidence=0.95, resamples=2000, seed=0):
+    """
+    Returns ``(ratio, low, high)`` - ratio of medians of ``xs`` and ``ys``
+    (i.e. speed-up of ``ys`` over ``xs`` if both are timings) and its
+    bootstrap percentile confidence interval.
+    """
+    random = Random(seed)
+    ratios = []
+    for resample in range(resamples):
+        x = median([random.choice(xs) for value in xs])
+        y = median([random.choice(ys) for value in ys])
+        if y > 0:
+            ratios.append(x / y)
+    ratio = median(xs) / median(ys) if median(ys) > 0 else float('inf')
+    if not ratios:
+        return ratio, ratio, ratio
+    tail = (1 - confidence) / 2 * 100
+    return ratio, percentile(ratios, tail), percentile(ratios, 100 - tail)
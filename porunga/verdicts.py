@@ -0,0 +1,9 @@
+"""
+Verdicts of test cases.
+"""
+VERDICT_OK = 'ok'
+VERDICT_WRONG_ANSWER = 'wrong answer'
+VERDICT_TIMEOUT = 'timeout'
+VERDICT_MEMORY_LIMIT = 'memory limit exceeded'
+VERDICT_RUNTIME_ERROR = 'runtime error'
+VERDICT_NO_OUTPUT_FILE = 'out file could not be read'
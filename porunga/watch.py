@@ -0,0 +1,237 @@
+"""
+Watching solution and test data for changes (``porunga test --watch``).
+
+On Linux changes are reported by inotify (used through ``ctypes``), elsewhere
+(or if inotify is not available) files are polled with ``os.stat``. Both
+watchers report paths of changed files, where directory paths are joined with
+names exactly as given, so they can be compared with paths of test cases.
+"""
+import ctypes
+import ctypes.util
+import errno
+import os
+import select
+import struct
+import time
+from porunga import scheduling
+from porunga.procme import monotonic
+from porunga.utils.paths import joinpath
+
+
+# events are collected until nothing changes for that long (in seconds)
+SETTLE_TIME = 0.1
+
+POLL_INTERVAL = 0.5
+
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_ONLYDIR = 0x01000000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = os.O_NONBLOCK
+IN_CLOEXEC = getattr(os, 'O_CLOEXEC', 0o2000000)
+
+WATCH_MASK = (IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE |
+    IN_DELETE | IN_DELETE_SELF | IN_ONLYDIR)
+
+EVENT_HEADER = struct.Struct('iIII')
+
+
+def iter_tree(path, recursive=True):
+    """
+    Yields ``(path, is_dir)`` for all entries within ``path``.
+    """
+    try:
+        entries = list(os.scandir(path))
+    except OSError:
+        return
+    for entry in entries:
+        is_dir = entry.is_dir()
+        yield joinpath(path, entry.name), is_dir
+        if is_dir and recursive:
+            for item in iter_tree(joinpath(path, entry.name)):
+                yield item
+
+
+class PollingWatcher(object):
+    """
+    Watches ``directories`` (mapping paths to flags telling if their
+    subdirectories should be watched too) by comparing their snapshots.
+    """
+
+    def __init__(self, directories, interval=POLL_INTERVAL):
+        self.directories = directories
+        self.interval = interval
+        self.snapshot = self.take_snapshot()
+
+    def take_snapshot(self):
+        snapshot = {}
+        for directory, recursive in self.directories.items():
+            for path, is_dir in iter_tree(directory, recursive):
+                if is_dir:
+                    continue
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                snapshot[path] = (stat.st_mtime_ns, stat.st_size)
+        return snapshot
+
+    def get_changes(self):
+        snapshot = self.take_snapshot()
+        changed = set(path for path in set(snapshot) | set(self.snapshot)
+                      if snapshot.get(path) != self.snapshot.get(path))
+        self.snapshot = snapshot
+        return changed
+
+    def wait(self, timeout=None):
+        """
+        Waits for changes and returns set of changed paths (empty if
+        ``timeout`` passed first).
+        """
+        deadline = None if timeout is None else monotonic() + timeout
+        while True:
+            changed = self.get_changes()
+            if changed:
+                time.sleep(SETTLE_TIME)
+                return changed | self.get_changes()
+            if deadline is not None and monotonic() >= deadline:
+                return set()
+            time.sleep(self.interval)
+
+    def close(self):
+        pass
+
+
+class InotifyWatcher(object):
+    """
+    Same as ``PollingWatcher`` but uses inotify. Raises ``OSError`` if
+    inotify is not available.
+    """
+
+    def __init__(self, directories):
+        name = ctypes.util.find_library('c')
+        libc = ctypes.CDLL(name, use_errno=True)
+        if not hasattr(libc, 'inotify_init1'):
+            raise OSError(errno.ENOSYS, 'inotify is not available')
+        self.libc = libc
+        self.fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), 'inotify_init1 failed')
+        self.watches = {}
+        self.recursive = {}
+        try:
+            for directory, recursive in directories.items():
+                self.add_watch(directory, recursive)
+        except OSError:
+            self.close()
+            raise
+
+    def add_watch(self, directory, recursive):
+        wd = self.libc.inotify_add_watch(self.fd,
+            os.fsencode(directory), WATCH_MASK)
+        if wd < 0:
+            error = ctypes.get_errno()
+            if error == errno.ENOENT:
+                return
+            raise OSError(error, 'Could not watch %s' % directory)
+        self.watches[wd] = directory
+        self.recursive[wd] = recursive
+        if recursive:
+            for path, is_dir in iter_tree(directory, recursive=False):
+                if is_dir:
+                    self.add_watch(path, True)
+
+    def read_events(self):
+        changed = set()
+        while True:
+            try:
+                data = os.read(self.fd, 64 * 1024)
+            except BlockingIOError:
+                return changed
+            offset = 0
+            while offset < len(data):
+                wd, mask, cookie, length = EVENT_HEADER.unpack_from(data,
+                    offset)
+                offset += EVENT_HEADER.size
+                name = data[offset:offset + length].rstrip(b'\0')
+                offset += length
+                directory = self.watches.get(wd)
+                if directory is None or not name:
+                    continue
+                path = joinpath(directory, os.fsdecode(name))
+                if mask & IN_ISDIR:
+                    if mask & (IN_CREATE | IN_MOVED_TO) and self.recursive[wd]:
+                        self.add_watch(path, True)
+                        changed.update(path for path, is_dir in
+                            iter_tree(path) if not is_dir)
+                    continue
+                changed.add(path)
+
+    def wait(self, timeout=None):
+        changed = set()
+        while True:
+            ready = select.select([self.fd], [], [],
+                SETTLE_TIME if changed else timeout)[0]
+            if not ready:
+                return changed
+            changed |= self.read_events()
+
+    def close(self):
+        if self.fd >= 0:
+            os.close(self.fd)
+            self.fd = -1
+
+
+def get_watcher(directories):
+    """
+    Returns inotify watcher if it is available or polling one otherwise.
+    """
+    try:
+        return InotifyWatcher(directories)
+    except (OSError, AttributeError):
+        return PollingWatcher(directories)
+
+
+def order_cases(cases, previous):
+    """
+    Returns ``cases`` ordered so that tests which failed in ``previous``
+    results (mapping names of inputs to results) come first, followed by
+    new tests and then by the slowest ones.
+    """
+    durations = dict((fin, info['time']) for fin, info in previous.items())
+    failed = set(fin for fin, info in previous.items() if not info['success'])
+    return scheduling.order_cases(cases, durations, failed)
+
+
+def diff_results(previous, results, threshold=0.1, noise=0.01):
+    """
+    Returns list of lines describing what changed between ``previous``
+    results (mapping names of inputs to results) and the new ``results``
+    (list): changed verdicts and timings which changed by more than
+    ``threshold`` (relative) and ``noise`` (absolute, in seconds).
+    """
+    lines = []
+    for info in results:
+        before = previous.get(info['fin'])
+        if before is None:
+            lines.append('%s: new, %s (%.3fs)' % (info['fin'], info['verdict'],
+                info['time']))
+            continue
+        change = ''
+        delta = info['time'] - before['time']
+        if (abs(delta) > noise and
+                abs(delta) > threshold * max(before['time'], 1e-9)):
+            change = '%.3fs -> %.3fs (%+.0f%%)' % (before['time'],
+                info['time'], 100.0 * delta / max(before['time'], 1e-9))
+        if before['verdict'] != info['verdict']:
+            verdict = '%s -> %s' % (before['verdict'], info['verdict'])
+            change = '%s, %s' % (verdict, change) if change else verdict
+        if change:
+            lines.append('%s: %s' % (info['fin'], change))
+    return lines
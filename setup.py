@@ -12,12 +12,6 @@ except IOError as err:
         "long_description (%s)\n" % readme_file)
     sys.exit(1)
 
-extra_kwargs = {'tests_require': ['mock']}
-if sys.version_info < (2, 7):
-    extra_kwargs['tests_require'].append('unittest2')
-if sys.version_info >= (3,):
-    extra_kwargs['use_2to3'] = True
-
 porunga = __import__('porunga')
 
 setup(
@@ -37,7 +31,9 @@ setup(
         ],
     },
     test_suite='porunga.tests.collector',
+    tests_require=['mock'],
     install_requires=['monolith', 'termcolor'],
+    python_requires='>=3.7',
     include_package_data=True,
     classifiers=[
         'Development Status :: 4 - Beta',
@@ -46,7 +42,7 @@ setup(
         'Operating System :: OS Independent',
         'Programming Language :: Python',
         'Programming Language :: Python :: 3',
+        'Programming Language :: Python :: 3 :: Only',
     ],
-    **extra_kwargs
 )
 